@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
+from django.http import JsonResponse
 from django.urls import path
 from django.db.models import Count, Avg, Q, F, IntegerField
 from django.db.models.functions import TruncMonth, Cast
@@ -11,6 +12,7 @@ import json
 
 from user.models import StudentProfile, TeacherProfile, Course
 from room.models import Room, Activity, Submission
+from .cache import get_cache_stats
 
 
 def get_analytics_data():
@@ -396,6 +398,11 @@ def analytics_dashboard_view(request):
 
 
 
+@staff_member_required
+def cache_stats_view(request):
+    return JsonResponse(get_cache_stats())
+
+
 _original_index = admin.site.index
 
 def custom_admin_index(request, extra_context=None):
@@ -414,6 +421,7 @@ def get_urls_with_analytics():
 
     urls = _original_get_urls()
     analytics_url = path('analytics/', admin.site.admin_view(analytics_dashboard_view), name='analytics_dashboard')
-    return [analytics_url] + urls
+    cache_stats_url = path('cache-stats/', admin.site.admin_view(cache_stats_view), name='cache_stats')
+    return [analytics_url, cache_stats_url] + urls
 
 admin.site.get_urls = get_urls_with_analytics
@@ -0,0 +1,248 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from django.utils.module_loading import import_string
+
+from .cache import LRUCache
+from .images import DERIVATIVE_SIZES, derivative_filename, derivative_media_name, ensure_derivative
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+BACKEND_ALIASES = {
+    'python': 'core.delivery.PythonDelivery',
+    'x-sendfile': 'core.delivery.XSendfileDelivery',
+    'x-accel-redirect': 'core.delivery.XAccelRedirectDelivery',
+}
+
+validator_cache = LRUCache(
+    'file_validators',
+    maxsize=getattr(settings, 'FILE_VALIDATOR_CACHE_SIZE', 2048),
+    ttl=getattr(settings, 'FILE_VALIDATOR_CACHE_TTL', 300),
+)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+        (start, end) for a single "bytes=" range, None when the header should be ignored
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def compute_validators(path, digest=None):
+    """
+        the etag is strong only when the storage already knows the content digest;
+        otherwise it is weak and built from size and mtime, so the file is never read here
+    """
+    stat = os.stat(path)
+    size, mtime = stat.st_size, int(stat.st_mtime)
+    return {
+        'size': size,
+        'mtime': mtime,
+        'etag': f'"{digest}"' if digest else f'W/"{size:x}-{mtime:x}"',
+    }
+
+
+def get_validators(name, path, digest=None):
+    """
+        size, mtime and etag of a media file; cached so revalidation skips the filesystem
+    """
+    validators = validator_cache.get(name)
+    if validators is None:
+        validators = compute_validators(path, digest)
+        validator_cache.set(name, validators)
+    return validators
+
+
+def forget_validators(name):
+    if name:
+        validator_cache.delete(name)
+
+
+class RangeFile:
+    """
+        read-only window over [start, start + length) of an open file
+    """
+
+    def __init__(self, fileobj, start, length):
+        self.fileobj = fileobj
+        self.remaining = length
+        fileobj.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+class FileDelivery:
+    """
+        hands an already authorised media file to the client
+    """
+
+    def __init__(self, request, name, filename=None, as_attachment=False, storage=None):
+        self.request = request
+        self.name = name
+        storage = storage or default_storage
+        self.path = storage.path(name)
+        self.filename = filename or os.path.basename(name)
+        self.as_attachment = as_attachment
+        try:
+            self.validators = get_validators(name, self.path, getattr(storage, 'content_digest', lambda name: None)(name))
+        except (FileNotFoundError, NotADirectoryError):
+            raise Http404("File not found")
+        content_type, _ = mimetypes.guess_type(self.filename)
+        self.content_type = content_type or 'application/octet-stream'
+
+    @property
+    def size(self):
+        return self.validators['size']
+
+    @property
+    def etag(self):
+        return self.validators['etag']
+
+    @property
+    def last_modified(self):
+        return http_date(self.validators['mtime'])
+
+    def set_validator_headers(self, response):
+        response['ETag'] = self.etag
+        response['Last-Modified'] = self.last_modified
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def set_headers(self, response):
+        response['Content-Disposition'] = content_disposition_header(self.as_attachment, self.filename)
+        response['Accept-Ranges'] = 'bytes'
+        return self.set_validator_headers(response)
+
+    def deliver(self):
+        conditional = get_conditional_response(
+            self.request, etag=self.etag, last_modified=self.validators['mtime']
+        )
+        if conditional is not None:
+            return self.set_validator_headers(conditional)
+        return self.response()
+
+    def response(self):
+        raise NotImplementedError
+
+
+class PythonDelivery(FileDelivery):
+
+    def if_range_matches(self):
+        if_range = self.request.headers.get('If-Range')
+        if not if_range:
+            return True
+        if if_range.startswith('"'):
+            return if_range == self.etag
+        if_range_date = parse_http_date_safe(if_range)
+        return if_range_date is not None and self.validators['mtime'] <= if_range_date
+
+    def response(self):
+        size = self.size
+        byte_range = None
+        if self.request.method == 'GET' and self.if_range_matches():
+            try:
+                byte_range = parse_range(self.request.headers.get('Range'), size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return self.set_headers(response)
+
+        try:
+            fileobj = open(self.path, 'rb')
+        except FileNotFoundError:
+            forget_validators(self.name)
+            raise Http404("File not found")
+        if byte_range is None:
+            response = FileResponse(fileobj, content_type=self.content_type)
+            response['Content-Length'] = size
+            return self.set_headers(response)
+
+        start, end = byte_range
+        response = FileResponse(RangeFile(fileobj, start, end - start + 1), status=206, content_type=self.content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return self.set_headers(response)
+
+
+class XSendfileDelivery(FileDelivery):
+
+    def response(self):
+        response = HttpResponse(content_type=self.content_type)
+        response['X-Sendfile'] = os.path.abspath(self.path)
+        return self.set_headers(response)
+
+
+class XAccelRedirectDelivery(FileDelivery):
+
+    def response(self):
+        response = HttpResponse(content_type=self.content_type)
+        internal_url = getattr(settings, 'FILE_DELIVERY_INTERNAL_URL', '/protected-media/')
+        relative_path = os.path.relpath(self.path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = internal_url.rstrip('/') + '/' + quote(relative_path)
+        return self.set_headers(response)
+
+
+def get_delivery_class():
+    backend = getattr(settings, 'FILE_DELIVERY_BACKEND', 'python')
+    return import_string(BACKEND_ALIASES.get(backend, backend))
+
+
+def serve_file(request, name, filename=None, as_attachment=False, storage=None):
+    """
+        permission checks stay in the view; this only decides who sends the bytes
+    """
+    return get_delivery_class()(request, name, filename, as_attachment, storage).deliver()
+
+
+def serve_image(request, name, filename=None, as_attachment=False, storage=None):
+    """
+        ?size=<avatar|thumb|preview> serves the resized copy, built on first request
+    """
+    size = request.GET.get('size')
+    if size in DERIVATIVE_SIZES:
+        derivative, rendered = ensure_derivative(storage or default_storage, name, size)
+        if derivative is not None:
+            derivative_name = derivative_media_name(derivative)
+            if rendered:
+                forget_validators(derivative_name)
+            return serve_file(request, derivative_name, derivative_filename(name, size))
+    return serve_file(request, name, filename, as_attachment, storage)
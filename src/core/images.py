@@ -0,0 +1,121 @@
+import glob
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .cache import LRUCache
+
+
+DERIVATIVE_SIZES = {
+    'avatar': 96,
+    'thumb': 320,
+    'preview': 1280,
+}
+RASTER_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
+
+derivative_url_cache = LRUCache(
+    'image_derivatives',
+    maxsize=getattr(settings, 'IMAGE_DERIVATIVE_URL_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'IMAGE_DERIVATIVE_URL_CACHE_TTL', 3600),
+)
+
+
+def is_raster_image(name):
+    return bool(name) and name.lower().endswith(RASTER_EXTENSIONS)
+
+
+def derivative_format():
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def derivative_path(source_path, size):
+    return f'{source_path}.{size}.{derivative_format()[1]}'
+
+
+def derivative_filename(name, size):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{stem}-{size}.{derivative_format()[1]}'
+
+
+def render_derivative(source_path, target_path, size):
+    image_format, _ = derivative_format()
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((DERIVATIVE_SIZES[size], DERIVATIVE_SIZES[size]))
+        if image_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image_format == 'WEBP' and 'A' in image.getbands() else 'RGB')
+
+        descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_path), suffix='.part')
+        try:
+            with os.fdopen(descriptor, 'wb') as fileobj:
+                image.save(fileobj, image_format, quality=80)
+            os.replace(temp_path, target_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def ensure_derivative(storage, name, size):
+    """
+        (path, rendered) for the resized copy stored next to the original, rebuilt
+        when the original is newer; path is None for files that are not raster images
+    """
+    if size not in DERIVATIVE_SIZES or not is_raster_image(name):
+        return None, False
+    source_path = storage.path(name)
+    try:
+        source_mtime = os.stat(source_path).st_mtime
+    except FileNotFoundError:
+        return None, False
+
+    target_path = derivative_path(source_path, size)
+    try:
+        if os.stat(target_path).st_mtime >= source_mtime:
+            return target_path, False
+    except FileNotFoundError:
+        pass
+
+    try:
+        render_derivative(source_path, target_path, size)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return None, False
+    return target_path, True
+
+
+def derivative_media_name(target_path):
+    return os.path.relpath(target_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+
+def delete_derivatives(source_path):
+    for size in DERIVATIVE_SIZES:
+        for path in glob.glob(glob.escape(f'{source_path}.{size}.') + '*'):
+            os.remove(path)
+
+
+def derivative_version(storage, name):
+    version = derivative_url_cache.get(name)
+    if version is None:
+        try:
+            mtime = int(os.stat(storage.path(name)).st_mtime)
+        except (FileNotFoundError, NotImplementedError):
+            mtime = 0
+        version = hashlib.sha1(f'{name}:{mtime}'.encode()).hexdigest()[:10]
+        derivative_url_cache.set(name, version)
+    return version
+
+
+def derivative_url(base_url, storage, name, size):
+    """
+        the version changes with the original, so browsers never keep a stale thumbnail
+    """
+    separator = '&' if '?' in base_url else '?'
+    return f'{base_url}{separator}size={size}&v={derivative_version(storage, name)}'
+
+
+def forget_derivative_urls(name):
+    if name:
+        derivative_url_cache.delete(name)
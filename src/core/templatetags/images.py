@@ -0,0 +1,14 @@
+from django import template
+
+from core.images import derivative_url, is_raster_image
+
+register = template.Library()
+
+
+@register.filter
+def avatar_url(field_file, size='avatar'):
+    if not field_file:
+        return ''
+    if not is_raster_image(field_file.name):
+        return field_file.url
+    return derivative_url(field_file.url, field_file.storage, field_file.name, size)
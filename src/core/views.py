@@ -1,12 +1,26 @@
+import posixpath
+
 from django.shortcuts import render
-from django.http import HttpResponseNotFound, HttpResponseServerError
+from django.http import Http404, HttpResponseNotFound, HttpResponseServerError
 from django.template import RequestContext
+from django.contrib.auth.decorators import login_required
+
+from .delivery import serve_image
 
 
 def homepage(request):
     return render(request, 'home.html')
 
 
+@login_required
+def serve_profile_picture(request, path):
+    # the path comes from the client, so it must not climb out of profile_pics/
+    name = posixpath.normpath(f'profile_pics/{path}')
+    if '..' in path.split('/') or '\\' in path or not name.startswith('profile_pics/'):
+        raise Http404("File not found")
+    return serve_image(request, name)
+
+
 def custom_404(request, exception=None):
     context = {
         'error_code': '404',
@@ -0,0 +1,135 @@
+import base64
+from collections import namedtuple
+
+from django.db.models import Case, CharField, Count, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from room.models import Activity, Submission
+
+
+PAGE_SIZE = 20
+STATUSES = {
+    'pending': "Pending",
+    'submitted': "Submitted",
+    'graded': "Graded",
+    'overdue': "Overdue",
+}
+
+AssignmentPage = namedtuple('AssignmentPage', ['assignments', 'next_cursor', 'stats'])
+
+
+def encode_cursor(activity):
+    due_date = activity.due_date.isoformat() if activity.due_date else ''
+    return base64.urlsafe_b64encode(f'{due_date}|{activity.id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+        (due_date or None, id) from an opaque cursor, or None for a missing or malformed one
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        due_date, activity_id = raw.split('|')
+        activity_id = int(activity_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not due_date:
+        return None, activity_id
+    due_date = parse_datetime(due_date)
+    if due_date is None:
+        return None
+    return due_date, activity_id
+
+
+def student_assignments(student_profile, rooms, now=None):
+    """
+        every activity in the student's rooms annotated with their submission and a status
+        of pending, submitted, graded or overdue, all worked out in one query
+    """
+    now = now or timezone.now()
+    submissions = Submission.objects.filter(activity=OuterRef('pk'), student=student_profile)
+    return (
+        Activity.objects
+        .filter(room__in=rooms)
+        .annotate(
+            submitted=Exists(submissions),
+            score=Subquery(submissions.filter(score__isnull=False).order_by('-id').values('score')[:1]),
+        )
+        .annotate(student_status=Case(
+            When(score__isnull=False, then=Value('graded')),
+            When(submitted=True, then=Value('submitted')),
+            When(due_date__lt=now, then=Value('overdue')),
+            default=Value('pending'),
+            output_field=CharField(),
+        ))
+    )
+
+
+def filter_assignments(assignments, q='', status='', course=''):
+    if q:
+        assignments = assignments.filter(
+            Q(title__icontains=q) | Q(room__name__icontains=q) | Q(room__room_code__icontains=q)
+        )
+    if status in STATUSES:
+        assignments = assignments.filter(student_status=status)
+    if course:
+        assignments = assignments.filter(room__name=course)
+    return assignments
+
+
+def assignment_stats(assignments):
+    return assignments.aggregate(
+        pending=Count('id', filter=Q(student_status='pending')),
+        submitted=Count('id', filter=Q(student_status__in=['submitted', 'graded'])),
+        overdue=Count('id', filter=Q(student_status='overdue')),
+        total=Count('id'),
+    )
+
+
+def assignment_row(activity):
+    grade = "—"
+    if activity.student_status == 'graded':
+        grade = f"{activity.score} / {activity.total_marks}"
+    elif activity.student_status == 'submitted':
+        grade = "Pending"
+    return {
+        "name": activity.title,
+        "course_code": activity.room.room_code,
+        "course_name": activity.room.name,
+        "due_date": activity.due_date,
+        "status": STATUSES[activity.student_status],
+        "status_class": activity.student_status,
+        "grade": grade,
+        "activity_id": activity.id,
+    }
+
+
+def assignment_page(student_profile, rooms, q='', status='', course='', cursor=None, limit=PAGE_SIZE):
+    """
+        one page of the student's assignments by due date, undated ones last, seeking past the
+        cursor's (due_date, id); the summary counts cover every assignment, not just the filtered ones
+    """
+    assignments = student_assignments(student_profile, rooms)
+    stats = assignment_stats(assignments)
+
+    assignments = filter_assignments(assignments, q, status, course)
+    position = decode_cursor(cursor)
+    if position is not None:
+        due_date, activity_id = position
+        if due_date is None:
+            assignments = assignments.filter(due_date__isnull=True, id__gt=activity_id)
+        else:
+            assignments = assignments.filter(
+                Q(due_date__gt=due_date) | Q(due_date=due_date, id__gt=activity_id) | Q(due_date__isnull=True)
+            )
+
+    rows = list(
+        assignments
+        .select_related('room')
+        .order_by(F('due_date').asc(nulls_last=True), 'id')[:limit + 1]
+    )
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return AssignmentPage([assignment_row(activity) for activity in rows[:limit]], next_cursor, stats)
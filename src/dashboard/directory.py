@@ -0,0 +1,204 @@
+from collections import namedtuple
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from room.models import Room
+from .models import StudentDirectoryEntry
+
+
+PAGE_SIZE = 50
+FTS_TABLE = 'dashboard_studentdirectoryentry_fts'
+# trigram search needs three characters; shorter words are checked against the candidates with LIKE
+TRIGRAM = 3
+ENTRY_FIELDS = ['name', 'initials', 'email', 'username', 'student_id', 'courses', 'room_ids', 'search_text']
+
+DirectoryPage = namedtuple('DirectoryPage', ['students', 'page', 'has_next'])
+
+
+def room_token(room_id):
+    return f'<{room_id}>'
+
+
+def entry_values(user, rooms):
+    """
+        the stored fields of an entry for a user row and their (room id, room name) pairs
+    """
+    rooms = sorted(rooms, key=lambda room: (room[1], room[0]))
+    name = f'{user["first_name"]} {user["student__middle_name"] or ""} {user["last_name"]}'
+    courses = ", ".join(room_name for _, room_name in rooms)
+    return {
+        'name': name,
+        'initials': (f'{user["first_name"][:1]}{user["last_name"][:1]}'.upper() or user['username'][:2].upper())[:4],
+        'email': user['email'],
+        'username': user['username'],
+        'student_id': user['student__student_id'] or '',
+        'courses': courses,
+        'room_ids': ' '.join(room_token(room_id) for room_id, _ in rooms),
+        'search_text': ' '.join([
+            ' '.join(name.split()), user['email'], user['username'], user['student__student_id'] or '', courses,
+        ]).lower(),
+    }
+
+
+def refresh_directory(teacher_ids=None, user_ids=None):
+    """
+        recomputes the entries of the given teachers and/or students from the enrollments,
+        creating, updating and deleting rows as needed
+    """
+    if (teacher_ids is not None and not teacher_ids) or (user_ids is not None and not user_ids):
+        return
+    scope = Q()
+    if teacher_ids is not None:
+        scope &= Q(room__teacher_id__in=teacher_ids)
+    if user_ids is not None:
+        scope &= Q(user_id__in=user_ids)
+
+    wanted = {}
+    enrollments = Room.students.through.objects.filter(scope).values_list('room__teacher_id', 'user_id', 'room_id', 'room__name')
+    for teacher_id, user_id, room_id, room_name in enrollments:
+        wanted.setdefault((teacher_id, user_id), []).append((room_id, room_name))
+
+    users = {
+        user['id']: user for user in User.objects.filter(id__in={user_id for _, user_id in wanted}).values(
+            'id', 'username', 'first_name', 'last_name', 'email', 'student__student_id', 'student__middle_name',
+        )
+    }
+
+    existing_scope = Q()
+    if teacher_ids is not None:
+        existing_scope &= Q(teacher_id__in=teacher_ids)
+    if user_ids is not None:
+        existing_scope &= Q(user_id__in=user_ids)
+    existing = {(entry.teacher_id, entry.user_id): entry for entry in StudentDirectoryEntry.objects.filter(existing_scope)}
+
+    created, updated = [], []
+    for key, rooms in wanted.items():
+        values = entry_values(users[key[1]], rooms)
+        entry = existing.pop(key, None)
+        if entry is None:
+            created.append(StudentDirectoryEntry(teacher_id=key[0], user_id=key[1], **values))
+        elif any(getattr(entry, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(entry, field, value)
+            updated.append(entry)
+
+    if existing:
+        StudentDirectoryEntry.objects.filter(id__in=[entry.id for entry in existing.values()]).delete()
+    StudentDirectoryEntry.objects.bulk_create(created, batch_size=1000)
+    StudentDirectoryEntry.objects.bulk_update(updated, ENTRY_FIELDS, batch_size=1000)
+
+
+def rebuild_directory(batch_size=1000):
+    StudentDirectoryEntry.objects.all().delete()
+    teacher_ids = list(Room.objects.values_list('teacher_id', flat=True).distinct())
+    for index in range(0, len(teacher_ids), batch_size):
+        refresh_directory(teacher_ids=teacher_ids[index:index + batch_size])
+    return StudentDirectoryEntry.objects.count()
+
+
+def _like(word):
+    return word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _phrase(word):
+    return '"%s"' % word.replace('"', '""')
+
+
+def _sqlite_lookup(teacher_id, words, room_ids, limit, offset):
+    long_words = [word for word in words if len(word) >= TRIGRAM]
+    short_words = [word for word in words if len(word) < TRIGRAM]
+    first = _like(words[0]) + '%'
+    prefix = "(e.name LIKE %s ESCAPE '\\' OR e.student_id LIKE %s ESCAPE '\\' OR e.email LIKE %s ESCAPE '\\' OR e.username LIKE %s ESCAPE '\\')"
+
+    params = [first] * 4
+    if long_words:
+        # the teacher and the room filter are tokens in the same index as the text
+        match = 'teacher : %s AND search_text : (%s)' % (_phrase(room_token(teacher_id)), ' '.join(map(_phrase, long_words)))
+        if room_ids:
+            match += ' AND rooms : (%s)' % ' OR '.join(_phrase(room_token(room_id)) for room_id in room_ids)
+        sql = (
+            f'SELECT e.*, u.last_login AS last_active, {prefix} AS is_prefix, bm25({FTS_TABLE}) AS score '
+            f'FROM {FTS_TABLE} JOIN dashboard_studentdirectoryentry e ON e.id = {FTS_TABLE}.rowid '
+            f'JOIN auth_user u ON u.id = e.user_id '
+            f'WHERE {FTS_TABLE} MATCH %s'
+        )
+        params.append(match)
+    else:
+        sql = (
+            f'SELECT e.*, u.last_login AS last_active, {prefix} AS is_prefix, 0 AS score '
+            f'FROM dashboard_studentdirectoryentry e JOIN auth_user u ON u.id = e.user_id '
+            f'WHERE e.teacher_id = %s'
+        )
+        params.append(teacher_id)
+        if room_ids:
+            sql += ' AND (%s)' % ' OR '.join(["e.room_ids LIKE %s"] * len(room_ids))
+            params += [f'%{room_token(room_id)}%' for room_id in room_ids]
+    for word in short_words:
+        sql += " AND e.search_text LIKE %s ESCAPE '\\'"
+        params.append(f'%{_like(word)}%')
+    sql += ' ORDER BY is_prefix DESC, score, e.name, e.id LIMIT %s OFFSET %s'
+    return StudentDirectoryEntry.objects.raw(sql, params + [limit, offset])
+
+
+def _postgres_lookup(teacher_id, words, room_ids, limit, offset):
+    prefix = '(e.name ILIKE %s OR e.student_id ILIKE %s OR e.email ILIKE %s OR e.username ILIKE %s)'
+    params = [_like(words[0]) + '%'] * 4 + [' '.join(words), teacher_id, [f'%{_like(word)}%' for word in words]]
+    sql = (
+        f'SELECT e.*, u.last_login AS last_active, {prefix} AS is_prefix, similarity(e.search_text, %s) AS score '
+        f'FROM dashboard_studentdirectoryentry e JOIN auth_user u ON u.id = e.user_id '
+        f'WHERE e.teacher_id = %s AND e.search_text ILIKE ALL(%s)'
+    )
+    if room_ids:
+        sql += ' AND e.room_ids ILIKE ANY(%s)'
+        params.append([f'%{room_token(room_id)}%' for room_id in room_ids])
+    sql += ' ORDER BY is_prefix DESC, score DESC, e.name, e.id LIMIT %s OFFSET %s'
+    return StudentDirectoryEntry.objects.raw(sql, params + [limit, offset])
+
+
+def directory_page(teacher_profile, q='', room_ids=None, page=1, limit=PAGE_SIZE):
+    """
+        one page of the teacher's students, with their rooms, in a single query: substring matches on
+        name, email, username, student id or course, ranked with prefix matches first
+    """
+    page = max(page, 1)
+    offset = (page - 1) * limit
+    words = q.lower().split()[:8]
+    if room_ids is not None and not room_ids:
+        return DirectoryPage([], page, False)
+
+    if words and connection.vendor == 'postgresql':
+        entries = list(_postgres_lookup(teacher_profile.id, words, room_ids, limit + 1, offset))
+    elif words:
+        entries = list(_sqlite_lookup(teacher_profile.id, words, room_ids, limit + 1, offset))
+        for entry in entries:
+            # raw columns come back from SQLite as naive UTC
+            if entry.last_active is not None and settings.USE_TZ and timezone.is_naive(entry.last_active):
+                entry.last_active = timezone.make_aware(entry.last_active, dt_timezone.utc)
+    else:
+        entries = StudentDirectoryEntry.objects.filter(teacher=teacher_profile)
+        if room_ids:
+            rooms = Q()
+            for room_id in room_ids:
+                rooms |= Q(room_ids__contains=room_token(room_id))
+            entries = entries.filter(rooms)
+        entries = list(
+            entries.select_related('user').order_by('name', 'id')[offset:offset + limit + 1]
+        )
+        for entry in entries:
+            entry.last_active = entry.user.last_login
+
+    students = [{
+        'id': entry.user_id,
+        'initials': entry.initials,
+        'name': entry.name,
+        'email': entry.email,
+        'student_id': entry.student_id,
+        'courses': entry.courses,
+        'last_active': entry.last_active,
+    } for entry in entries[:limit]]
+    return DirectoryPage(students, page, len(entries) > limit)
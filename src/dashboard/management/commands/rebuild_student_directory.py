@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.directory import rebuild_directory
+
+
+class Command(BaseCommand):
+    help = "Rebuild every teacher's student directory from the room enrollments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Teachers refreshed per batch")
+
+    def handle(self, *args, **options):
+        entries = rebuild_directory(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {entries} directory entries."))
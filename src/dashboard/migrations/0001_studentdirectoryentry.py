@@ -0,0 +1,92 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+        SQLite mirrors the entries into a trigram FTS5 table through triggers;
+        PostgreSQL indexes search_text with pg_trgm
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("""
+            CREATE VIRTUAL TABLE dashboard_studentdirectoryentry_fts USING fts5(
+                search_text, teacher, rooms, content='', tokenize='trigram'
+            )
+        """)
+        schema_editor.execute("""
+            CREATE TRIGGER dashboard_studentdirectoryentry_ai AFTER INSERT ON dashboard_studentdirectoryentry BEGIN
+                INSERT INTO dashboard_studentdirectoryentry_fts(rowid, search_text, teacher, rooms)
+                VALUES (new.id, new.search_text, '<' || new.teacher_id || '>', new.room_ids);
+            END
+        """)
+        schema_editor.execute("""
+            CREATE TRIGGER dashboard_studentdirectoryentry_ad AFTER DELETE ON dashboard_studentdirectoryentry BEGIN
+                INSERT INTO dashboard_studentdirectoryentry_fts(dashboard_studentdirectoryentry_fts, rowid, search_text, teacher, rooms)
+                VALUES ('delete', old.id, old.search_text, '<' || old.teacher_id || '>', old.room_ids);
+            END
+        """)
+        schema_editor.execute("""
+            CREATE TRIGGER dashboard_studentdirectoryentry_au AFTER UPDATE ON dashboard_studentdirectoryentry BEGIN
+                INSERT INTO dashboard_studentdirectoryentry_fts(dashboard_studentdirectoryentry_fts, rowid, search_text, teacher, rooms)
+                VALUES ('delete', old.id, old.search_text, '<' || old.teacher_id || '>', old.room_ids);
+                INSERT INTO dashboard_studentdirectoryentry_fts(rowid, search_text, teacher, rooms)
+                VALUES (new.id, new.search_text, '<' || new.teacher_id || '>', new.room_ids);
+            END
+        """)
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE INDEX dashboard_directory_trgm ON dashboard_studentdirectoryentry USING GIN (search_text gin_trgm_ops)'
+        )
+
+
+def drop_trigram_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for trigger in ['au', 'ad', 'ai']:
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS dashboard_studentdirectoryentry_{trigger}')
+        schema_editor.execute('DROP TABLE IF EXISTS dashboard_studentdirectoryentry_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS dashboard_directory_trgm')
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('user', '0002_alter_teacherprofile_department_delete_department'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentDirectoryEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('initials', models.CharField(max_length=4)),
+                ('email', models.CharField(blank=True, max_length=254)),
+                ('username', models.CharField(max_length=150)),
+                ('student_id', models.CharField(blank=True, max_length=15)),
+                ('courses', models.TextField(blank=True)),
+                ('room_ids', models.TextField(blank=True)),
+                ('search_text', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='directory_entries', to='user.teacherprofile')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='directory_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['teacher', 'name', 'id'], name='dashboard_s_teacher_19de23_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='studentdirectoryentry',
+            constraint=models.UniqueConstraint(fields=('teacher', 'user'), name='unique_directory_entry'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+
+
+def entry_fields(user, rooms):
+    """
+        a copy of dashboard.directory.entry_values as it stood when this migration was written
+    """
+    rooms = sorted(rooms, key=lambda room: (room[1], room[0]))
+    name = f'{user["first_name"]} {user["student__middle_name"] or ""} {user["last_name"]}'
+    courses = ", ".join(room_name for _, room_name in rooms)
+    student_id = user['student__student_id'] or ''
+    return {
+        'name': name,
+        'initials': (f'{user["first_name"][:1]}{user["last_name"][:1]}'.upper() or user['username'][:2].upper())[:4],
+        'email': user['email'],
+        'username': user['username'],
+        'student_id': student_id,
+        'courses': courses,
+        'room_ids': ' '.join(f'<{room_id}>' for room_id, _ in rooms),
+        'search_text': ' '.join([' '.join(name.split()), user['email'], user['username'], student_id, courses]).lower(),
+    }
+
+
+def backfill(apps, schema_editor):
+    Room = apps.get_model('room', 'Room')
+    User = apps.get_model('auth', 'User')
+    StudentDirectoryEntry = apps.get_model('dashboard', 'StudentDirectoryEntry')
+
+    teacher_ids = list(Room.objects.values_list('teacher_id', flat=True).distinct().order_by('teacher_id'))
+    for index in range(0, len(teacher_ids), BATCH_SIZE):
+        wanted = {}
+        enrollments = Room.students.through.objects.filter(
+            room__teacher_id__in=teacher_ids[index:index + BATCH_SIZE]
+        ).values_list('room__teacher_id', 'user_id', 'room_id', 'room__name')
+        for teacher_id, user_id, room_id, room_name in enrollments:
+            wanted.setdefault((teacher_id, user_id), []).append((room_id, room_name))
+
+        users = {
+            user['id']: user for user in User.objects.filter(id__in={user_id for _, user_id in wanted}).values(
+                'id', 'username', 'first_name', 'last_name', 'email', 'student__student_id', 'student__middle_name',
+            )
+        }
+        StudentDirectoryEntry.objects.bulk_create([
+            StudentDirectoryEntry(teacher_id=teacher_id, user_id=user_id, **entry_fields(users[user_id], rooms))
+            for (teacher_id, user_id), rooms in wanted.items()
+        ], batch_size=BATCH_SIZE)
+
+
+def clear(apps, schema_editor):
+    apps.get_model('dashboard', 'StudentDirectoryEntry').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_studentdirectoryentry'),
+        ('room', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, clear),
+    ]
@@ -1,2 +1,35 @@
 from django.db import models
+from django.contrib.auth.models import User
 
+from user.models import TeacherProfile
+
+
+class StudentDirectoryEntry(models.Model):
+    """
+        one row per (teacher, student) enrolled in any of the teacher's rooms, carrying what the
+        student directory shows and searches; dashboard.directory keeps it up to date
+    """
+    teacher = models.ForeignKey(TeacherProfile, on_delete=models.CASCADE, related_name='directory_entries')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='directory_entries')
+
+    name = models.CharField(max_length=255)
+    initials = models.CharField(max_length=4)
+    email = models.CharField(max_length=254, blank=True)
+    username = models.CharField(max_length=150)
+    student_id = models.CharField(max_length=15, blank=True)
+    courses = models.TextField(blank=True)
+    room_ids = models.TextField(blank=True)
+    search_text = models.TextField(blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['teacher', 'user'], name='unique_directory_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['teacher', 'name', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.teacher_id})"
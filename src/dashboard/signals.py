@@ -0,0 +1,86 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+
+from room.models import Room, Activity, Announcement, Submission
+from user.models import StudentProfile
+from .directory import refresh_directory
+from .snapshots import invalidate_dashboards
+
+
+def room_member_ids(room_ids):
+    teachers = Room.objects.filter(id__in=room_ids).values_list('teacher__user_id', flat=True)
+    students = Room.students.through.objects.filter(room_id__in=room_ids).values_list('user_id', flat=True)
+    return list(teachers) + list(students)
+
+
+@receiver([post_save, post_delete], sender=Activity)
+@receiver([post_save, post_delete], sender=Announcement)
+def invalidate_on_room_content_change(sender, instance, **kwargs):
+    invalidate_dashboards(room_member_ids([instance.room_id]))
+
+
+@receiver([post_save, post_delete], sender=Submission)
+def invalidate_on_submission_change(sender, instance, **kwargs):
+    teachers = Room.objects.filter(activities__id=instance.activity_id).values_list('teacher__user_id', flat=True)
+    students = StudentProfile.objects.filter(id=instance.student_id).values_list('user_id', flat=True)
+    invalidate_dashboards(list(teachers) + list(students))
+
+
+@receiver(m2m_changed, sender=Room.students.through)
+def invalidate_on_enrollment_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        teachers = Room.objects.filter(id__in=pk_set or []).values_list('teacher__user_id', flat=True)
+        invalidate_dashboards([instance.id, *teachers])
+    elif action == 'post_clear':
+        invalidate_dashboards([instance.teacher.user_id, *getattr(instance, '_cleared_student_ids', [])])
+    else:
+        invalidate_dashboards([instance.teacher.user_id, *(pk_set or [])])
+
+
+@receiver(post_save, sender=Room)
+def invalidate_on_room_change(sender, instance, created, **kwargs):
+    invalidate_dashboards([instance.teacher.user_id] if created else room_member_ids([instance.id]))
+
+
+@receiver(post_delete, sender=Room)
+def invalidate_on_room_delete(sender, instance, **kwargs):
+    invalidate_dashboards(getattr(instance, '_member_ids', []))
+
+
+@receiver(m2m_changed, sender=Room.students.through)
+def refresh_directory_on_enrollment_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        refresh_directory(user_ids=[instance.id])
+    elif action == 'post_clear':
+        refresh_directory(teacher_ids=[instance.teacher_id], user_ids=getattr(instance, '_cleared_student_ids', []))
+    else:
+        refresh_directory(teacher_ids=[instance.teacher_id], user_ids=list(pk_set or []))
+
+
+@receiver(post_save, sender=Room)
+def refresh_directory_on_room_rename(sender, instance, created, **kwargs):
+    if not created and instance.name != getattr(instance, '_loaded_name', instance.name):
+        refresh_directory(teacher_ids=[instance.teacher_id], user_ids=list(instance.students.values_list('id', flat=True)))
+    instance._loaded_name = instance.name
+
+
+@receiver(post_delete, sender=Room)
+def refresh_directory_on_room_delete(sender, instance, **kwargs):
+    refresh_directory(teacher_ids=[instance.teacher_id], user_ids=getattr(instance, '_member_ids', []))
+
+
+@receiver(post_save, sender=User)
+def refresh_directory_on_user_change(sender, instance, created, update_fields=None, **kwargs):
+    # logins only move last_login, which the directory reads live
+    if not created and set(update_fields or ()) != {'last_login'}:
+        refresh_directory(user_ids=[instance.id])
+
+
+@receiver(post_save, sender=StudentProfile)
+def refresh_directory_on_profile_change(sender, instance, **kwargs):
+    refresh_directory(user_ids=[instance.user_id])
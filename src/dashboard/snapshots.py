@@ -0,0 +1,54 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+IGNORED_PARAMS = {'section'}
+
+
+def version_key(user_id):
+    return f'dashboard:version:{user_id}'
+
+
+def snapshot_version(user_id):
+    return cache.get_or_set(version_key(user_id), time.time_ns, None)
+
+
+def snapshot_key(user_id, role, params):
+    """
+        one snapshot per user, role and filter set; bumping the user's version orphans them all
+    """
+    filters = sorted((name, values) for name, values in params.lists() if name not in IGNORED_PARAMS)
+    digest = hashlib.md5(repr(filters).encode()).hexdigest()
+    return f'dashboard:{user_id}:{role}:{snapshot_version(user_id)}:{digest}'
+
+
+def get_dashboard_snapshot(request, role, build):
+    """
+        (context, served_from_snapshot); build(request, user) only runs on a miss and the
+        result lives for at most DASHBOARD_SNAPSHOT_TTL seconds
+    """
+    key = snapshot_key(request.user.id, role, request.GET)
+    context = cache.get(key)
+    if context is not None:
+        return context, True
+    context = build(request, request.user)
+    cache.set(key, context, getattr(settings, 'DASHBOARD_SNAPSHOT_TTL', 60))
+    return context, False
+
+
+def invalidate_dashboards(user_ids):
+    """
+        the version keys must live in a cache every worker shares, or the other workers
+        keep serving their snapshots until DASHBOARD_SNAPSHOT_TTL runs out
+    """
+    keys = [version_key(user_id) for user_id in set(user_ids) if user_id is not None]
+    if not keys:
+        return
+    # now, so the rest of the writing transaction never reads a snapshot from before its own write
+    cache.delete_many(keys)
+    # and after commit, because another worker may have rebuilt from the old rows in between
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1 +1,422 @@
-from django.test import TestCase
+import os
+import time
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+
+from room.models import Room, Activity, Announcement, Submission
+from user.models import StudentProfile, TeacherProfile
+from .directory import PAGE_SIZE, directory_page, rebuild_directory
+from .models import StudentDirectoryEntry
+
+
+def make_teacher(username='teacher'):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com')
+    TeacherProfile.objects.create(user=user, years_of_exp='5')
+    return user
+
+
+def make_students(count, prefix='student'):
+    users = User.objects.bulk_create([
+        User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', first_name='Stu', last_name=f'Dent {i}')
+        for i in range(count)
+    ])
+    profiles = StudentProfile.objects.bulk_create([
+        StudentProfile(user=user, student_id=f'S{i:05d}') for i, user in enumerate(users)
+    ])
+    return users, profiles
+
+
+@override_settings(DASHBOARD_SNAPSHOT_TTL=0)
+class TeacherDashboardQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher()
+        self.users, self.profiles = make_students(6)
+        self.client.force_login(self.teacher)
+
+    def add_rooms(self, count):
+        for index in range(count):
+            room = Room.objects.create(name=f'Room {Room.objects.count()}', teacher=self.teacher.teacher)
+            room.students.add(*self.users[index % 3:index % 3 + 4])
+            Announcement.objects.create(room=room, title='Hello', content='Welcome')
+            for number in range(2):
+                activity = Activity.objects.create(room=room, title=f'Activity {number}', total_marks=10)
+                Submission.objects.create(activity=activity, student=self.profiles[index % 3])
+                Submission.objects.create(activity=activity, student=self.profiles[index % 3 + 1], score=5)
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('user_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rooms(self):
+        self.add_rooms(2)
+        # warms the per-user notification cache the header reads
+        self.dashboard_queries()
+        few = self.dashboard_queries()
+        self.add_rooms(38)
+        self.assertEqual(self.dashboard_queries(), few)
+        self.assertLessEqual(few, 8)
+
+    def test_counts_and_roster(self):
+        self.add_rooms(2)
+        context = self.client.get(reverse('user_dashboard'), {'course': 'Room 1'}).context
+        self.assertEqual(context['total_students'], 8)
+        self.assertEqual(context['total_activities'], 4)
+        self.assertEqual(context['total_announcements'], 2)
+        self.assertEqual([item['pending_count'] for item in context['grading_queue']], [1, 1, 1, 1])
+        self.assertEqual(context['grading_stats'], {'pending': 4, 'graded': 4, 'in_review': 0})
+        self.assertEqual(context['my_rooms'][0].student_count, 4)
+        # the course filter narrows the students, not the rooms listed for each of them
+        roster = {student['id']: student['courses'] for student in context['students']}
+        self.assertEqual(roster, {
+            self.users[1].id: 'Room 0, Room 1',
+            self.users[2].id: 'Room 0, Room 1',
+            self.users[3].id: 'Room 0, Room 1',
+            self.users[4].id: 'Room 1',
+        })
+
+    def test_search_filters_roster(self):
+        self.add_rooms(1)
+        context = self.client.get(reverse('user_dashboard'), {'q': 'Dent 2'}).context
+        self.assertEqual([student['id'] for student in context['students']], [self.users[2].id])
+
+
+@override_settings(DASHBOARD_SNAPSHOT_TTL=0)
+class StudentDashboardAssignmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher()
+        (self.user,), (self.profile,) = make_students(1)
+        self.client.force_login(self.user)
+        now = timezone.now()
+        self.rooms = []
+        for index in range(3):
+            room = Room.objects.create(name=f'Room {index}', teacher=self.teacher.teacher)
+            room.students.add(self.user)
+            self.rooms.append(room)
+        self.graded = Activity.objects.create(room=self.rooms[0], title='Essay', total_marks=10, due_date=now - timedelta(days=2))
+        self.submitted = Activity.objects.create(room=self.rooms[0], title='Lab', total_marks=10, due_date=now + timedelta(days=1))
+        self.overdue = Activity.objects.create(room=self.rooms[1], title='Quiz', total_marks=10, due_date=now - timedelta(days=1))
+        self.pending = Activity.objects.create(room=self.rooms[2], title='Project', total_marks=10, due_date=now + timedelta(days=3))
+        self.undated = Activity.objects.create(room=self.rooms[2], title='Reading', total_marks=10)
+        Submission.objects.create(activity=self.graded, student=self.profile, score=8)
+        Submission.objects.create(activity=self.submitted, student=self.profile)
+
+    def dashboard(self, **params):
+        return self.client.get(reverse('user_dashboard'), params).context
+
+    def test_statuses_and_stats(self):
+        context = self.dashboard()
+        rows = {row['name']: (row['status_class'], row['grade']) for row in context['assignments']}
+        self.assertEqual(rows, {
+            'Essay': ('graded', '8 / 10'),
+            'Lab': ('submitted', 'Pending'),
+            'Quiz': ('overdue', '—'),
+            'Project': ('pending', '—'),
+            'Reading': ('pending', '—'),
+        })
+        self.assertEqual([row['name'] for row in context['assignments']], ['Essay', 'Quiz', 'Lab', 'Project', 'Reading'])
+        self.assertEqual(context['assignment_stats'], {'pending': 2, 'submitted': 2, 'overdue': 1, 'total': 5})
+        self.assertEqual([a.title for a in context['upcoming_activities']], ['Lab', 'Project'])
+
+    def test_filters_run_in_the_database(self):
+        self.assertEqual([row['name'] for row in self.dashboard(a_status='overdue')['assignments']], ['Quiz'])
+        self.assertEqual([row['name'] for row in self.dashboard(a_course='Room 2')['assignments']], ['Project', 'Reading'])
+        self.assertEqual([row['name'] for row in self.dashboard(a_q='lab')['assignments']], ['Lab'])
+        context = self.dashboard(a_status='pending', a_q='room 2')
+        self.assertEqual([row['name'] for row in context['assignments']], ['Project', 'Reading'])
+        self.assertEqual(context['assignment_stats']['total'], 5)
+
+    def test_keyset_pages_cover_everything_once(self):
+        Activity.objects.bulk_create([
+            Activity(room=self.rooms[index % 3], title=f'Extra {index}', total_marks=10,
+                     due_date=None if index % 4 == 0 else self.undated.room.created_at + timedelta(hours=index % 5))
+            for index in range(40)
+        ])
+        seen, cursor = [], None
+        while True:
+            context = self.dashboard(**({'a_cursor': cursor} if cursor else {}))
+            seen += [row['activity_id'] for row in context['assignments']]
+            cursor = context['assignments_next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(len(set(seen)), 45)
+
+    def test_query_count_does_not_grow_with_rooms(self):
+        def queries():
+            self.client.get(reverse('user_dashboard'))
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(reverse('user_dashboard'))
+            return len(captured)
+
+        few = queries()
+        for index in range(9):
+            room = Room.objects.create(name=f'More {index}', teacher=self.teacher.teacher)
+            room.students.add(self.user)
+            Activity.objects.bulk_create([
+                Activity(room=room, title=f'Task {number}', total_marks=10) for number in range(30)
+            ])
+        self.assertEqual(queries(), few)
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), "set RUN_BENCHMARKS=1 to run benchmarks")
+@override_settings(DASHBOARD_SNAPSHOT_TTL=0)
+class TeacherDashboardBenchmark(TestCase):
+    students = 10000
+    rooms = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_teacher()
+        users, profiles = make_students(cls.students, prefix='bench')
+        rooms = [Room.objects.create(name=f'Room {i}', teacher=cls.teacher.teacher) for i in range(cls.rooms)]
+        Room.students.through.objects.bulk_create([
+            Room.students.through(room=rooms[i % cls.rooms], user=user) for i, user in enumerate(users)
+        ], batch_size=5000)
+        activities = Activity.objects.bulk_create([
+            Activity(room=room, title=f'Activity {i}', total_marks=10) for room in rooms for i in range(5)
+        ])
+        Submission.objects.bulk_create([
+            Submission(activity=activities[(i % cls.rooms) * 5], student=profile, score=None if i % 2 else 7)
+            for i, profile in enumerate(profiles)
+        ], batch_size=5000)
+        rebuild_directory()
+
+    def test_dashboard_benchmark(self):
+        self.client.force_login(self.teacher)
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('user_dashboard'))
+        elapsed = time.perf_counter() - started
+        print(f"\nteacher dashboard with {self.students} students: {elapsed:.2f}s, {len(queries)} queries")
+        self.assertEqual(len(response.context['students']), PAGE_SIZE)
+        self.assertTrue(response.context['students_has_next'])
+        self.assertLess(len(queries), 15)
+        self.assertLess(elapsed, 20)
+
+
+class StudentDirectoryTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.other_teacher = make_teacher('other')
+        self.physics = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.chemistry = Room.objects.create(name='Chemistry', teacher=self.teacher.teacher)
+        self.elsewhere = Room.objects.create(name='History', teacher=self.other_teacher.teacher)
+        self.users, self.profiles = make_students(4)
+        User.objects.filter(id=self.users[0].id).update(first_name='Annabel', last_name='Lee')
+        User.objects.filter(id=self.users[1].id).update(first_name='Hannah', last_name='Arendt')
+        rebuild_directory()
+        self.physics.students.add(*self.users[:3])
+        self.chemistry.students.add(self.users[0])
+        self.elsewhere.students.add(self.users[3])
+
+    def names(self, q='', **kwargs):
+        return [student['name'] for student in directory_page(self.teacher.teacher, q, **kwargs).students]
+
+    def test_rebuild_command(self):
+        StudentDirectoryEntry.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_student_directory', stdout=out)
+        self.assertIn('Indexed 4 directory entries', out.getvalue())
+        self.assertEqual(self.names('hannah'), ['Hannah  Arendt'])
+
+    def test_entries_follow_enrollment(self):
+        self.assertEqual(StudentDirectoryEntry.objects.filter(teacher=self.teacher.teacher).count(), 3)
+        entry = StudentDirectoryEntry.objects.get(teacher=self.teacher.teacher, user=self.users[0])
+        self.assertEqual(entry.courses, 'Chemistry, Physics')
+        self.physics.students.remove(self.users[0])
+        entry.refresh_from_db()
+        self.assertEqual(entry.courses, 'Chemistry')
+        self.chemistry.students.clear()
+        self.assertFalse(StudentDirectoryEntry.objects.filter(user=self.users[0]).exists())
+
+    def test_entries_follow_profiles_and_room_names(self):
+        user = self.users[2]
+        user.first_name = 'Zelda'
+        user.save()
+        self.profiles[2].student_id = 'Z-999'
+        self.profiles[2].save()
+        self.assertEqual(self.names('z-99'), ['Zelda  Dent 2'])
+        room = Room.objects.get(id=self.physics.id)
+        room.name = 'Astrophysics'
+        room.save()
+        self.assertCountEqual(self.names('astro'), ['Annabel  Lee', 'Hannah  Arendt', 'Zelda  Dent 2'])
+
+    def test_substring_search_ranks_prefixes_first(self):
+        self.assertEqual(self.names('ann'), ['Annabel  Lee', 'Hannah  Arendt'])
+        self.assertEqual(self.names('ann lee'), ['Annabel  Lee'])
+        self.assertEqual(self.names('chem'), ['Annabel  Lee'])
+        self.assertEqual(self.names('student2@'), ['Stu  Dent 2'])
+        self.assertEqual(self.names('dent 2'), ['Stu  Dent 2'])
+        self.assertEqual(self.names('dent 3'), [])
+        self.assertEqual(self.names('ann', room_ids=[self.chemistry.id]), ['Annabel  Lee'])
+        self.assertEqual(self.names(room_ids=[]), [])
+
+    def test_pages_and_one_query(self):
+        with self.assertNumQueries(1):
+            first = directory_page(self.teacher.teacher, 'dent', limit=2)
+        second = directory_page(self.teacher.teacher, 'dent', page=2, limit=2)
+        self.assertTrue(first.has_next)
+        self.assertFalse(second.has_next)
+        courses = {student['name']: student['courses'] for student in first.students + second.students}
+        self.assertEqual(len(courses), 3)
+        self.assertEqual(courses['Annabel  Lee'], 'Chemistry, Physics')
+
+
+class StudentDirectoryMigrationTests(TransactionTestCase):
+    migrate_from = [('dashboard', '0001_studentdirectoryentry')]
+    migrate_to = [('dashboard', '0002_backfill_studentdirectoryentry')]
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def test_existing_enrollments_are_backfilled(self):
+        teacher = make_teacher()
+        room = Room.objects.create(name='Physics', teacher=teacher.teacher)
+        users, _ = make_students(3)
+        room.students.add(*users)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.assertFalse(StudentDirectoryEntry.objects.exists())
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+
+        self.assertEqual(StudentDirectoryEntry.objects.filter(teacher=teacher.teacher, courses='Physics').count(), 3)
+        self.assertEqual(
+            [student['name'] for student in directory_page(teacher.teacher, 'dent 1').students], ['Stu  Dent 1']
+        )
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), "set RUN_BENCHMARKS=1 to run benchmarks")
+class StudentDirectoryBenchmark(TestCase):
+    students = 20000
+    rooms = 40
+    first_names = ['Ada', 'Bea', 'Carlos', 'Dara', 'Elif', 'Femi', 'Gus', 'Hana', 'Ivan', 'Jun', 'Kofi', 'Lena', 'Mateo',
+                   'Nia', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sami', 'Tomas', 'Uma', 'Vera', 'Wen', 'Ximena', 'Yusuf', 'Zoe']
+    last_names = ['Abara', 'Baker', 'Castro', 'Dimitrov', 'Eze', 'Fischer', 'Garcia', 'Haddad', 'Ivanova', 'Jensen',
+                  'Kowalski', 'Lindqvist', 'Mensah', 'Nakamura', 'Okafor', 'Petrov', 'Quispe', 'Rossi', 'Santos', 'Tanaka',
+                  'Umarov', 'Varga', 'Wojcik', 'Xu', 'Yilmaz', 'Zhang', 'Moreau', 'Silva', 'Novak', 'Hughes']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_teacher()
+        users = User.objects.bulk_create([
+            User(
+                username=f'user{i:05d}', email=f'user{i:05d}@school.example',
+                first_name=cls.first_names[i % len(cls.first_names)],
+                last_name=cls.last_names[i // len(cls.first_names) % len(cls.last_names)],
+            )
+            for i in range(cls.students)
+        ])
+        StudentProfile.objects.bulk_create([
+            StudentProfile(user=user, student_id=f'2024-{i:05d}') for i, user in enumerate(users)
+        ])
+        subjects = ['Algebra', 'Biology', 'Chemistry', 'Drama', 'Economics', 'French', 'Geography', 'History']
+        rooms = [
+            Room.objects.create(name=f'{subjects[i % len(subjects)]} {i // len(subjects) + 1}', teacher=cls.teacher.teacher)
+            for i in range(cls.rooms)
+        ]
+        Room.students.through.objects.bulk_create([
+            Room.students.through(room=rooms[(i + shift) % cls.rooms], user=user)
+            for i, user in enumerate(users) for shift in (0, 7)
+        ], batch_size=5000)
+        rebuild_directory()
+
+    def test_directory_benchmark(self):
+        queries = ['nakamura', 'priya tan', 'user01234', '2024-0042', 'okaf', 'chemistry 3', 'zoe x', 'mensah']
+        timings = []
+        for q in queries:
+            started = time.perf_counter()
+            page = directory_page(self.teacher.teacher, q)
+            timings.append(time.perf_counter() - started)
+            self.assertTrue(page.students, q)
+        timings.sort()
+        print(
+            f"\nstudent directory over {self.students * 2} enrollments: "
+            f"median {timings[len(timings) // 2] * 1000:.1f}ms, worst {timings[-1] * 1000:.1f}ms"
+        )
+        self.assertLess(timings[len(timings) // 2], 0.05)
+
+
+@override_settings(DEBUG=True)
+class DashboardSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher()
+        (self.student, self.other), (self.profile, self.other_profile) = make_students(2)
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.room.students.add(self.student)
+        self.activity = Activity.objects.create(room=self.room, title='Lab', total_marks=10)
+
+    def get(self, user, **params):
+        self.client.force_login(user)
+        return self.client.get(reverse('user_dashboard'), params)
+
+    def test_refresh_is_served_from_the_snapshot(self):
+        self.assertEqual(self.get(self.teacher)['X-Dashboard-Snapshot'], 'miss')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(self.teacher)
+        self.assertEqual(response['X-Dashboard-Snapshot'], 'hit')
+        self.assertFalse([q for q in queries.captured_queries if 'room_' in q['sql']])
+        # the section switcher's parameter shares the snapshot, real filters do not
+        self.assertEqual(self.get(self.teacher, section='students')['X-Dashboard-Snapshot'], 'hit')
+        self.assertEqual(self.get(self.teacher, q='dent')['X-Dashboard-Snapshot'], 'miss')
+
+    def test_submission_and_grade_invalidate_teacher_and_student(self):
+        self.get(self.teacher)
+        self.get(self.student)
+        submission = Submission.objects.create(activity=self.activity, student=self.profile)
+        response = self.get(self.teacher)
+        self.assertEqual(response['X-Dashboard-Snapshot'], 'miss')
+        self.assertEqual(response.context['grading_stats']['pending'], 1)
+        self.assertEqual(self.get(self.student)['X-Dashboard-Snapshot'], 'miss')
+
+        submission.score = 9
+        submission.save()
+        response = self.get(self.student)
+        self.assertEqual(response['X-Dashboard-Snapshot'], 'miss')
+        self.assertEqual(response.context['assignments'][0]['grade'], '9 / 10')
+
+    def test_enrollment_and_room_content_invalidate_members_only(self):
+        self.get(self.teacher)
+        self.get(self.student)
+        self.get(self.other)
+        Announcement.objects.create(room=self.room, title='Hello', content='Welcome')
+        self.assertEqual(self.get(self.teacher)['X-Dashboard-Snapshot'], 'miss')
+        self.assertEqual(self.get(self.student)['X-Dashboard-Snapshot'], 'miss')
+        self.assertEqual(self.get(self.other)['X-Dashboard-Snapshot'], 'hit')
+
+        self.room.students.add(self.other)
+        self.assertEqual(self.get(self.teacher).context['total_students'], 2)
+        self.assertEqual(self.get(self.other)['X-Dashboard-Snapshot'], 'miss')
+
+    def test_snapshot_rebuilt_before_commit_is_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Submission.objects.create(activity=self.activity, student=self.profile)
+            # a request rebuilding in between would still see the old rows in production
+            self.get(self.teacher)
+        self.assertEqual(self.get(self.teacher)['X-Dashboard-Snapshot'], 'miss')
+
+    @override_settings(DASHBOARD_SNAPSHOT_TTL=0)
+    def test_ttl_bounds_staleness(self):
+        self.get(self.teacher)
+        self.assertEqual(self.get(self.teacher)['X-Dashboard-Snapshot'], 'miss')
+
+    @override_settings(DEBUG=False)
+    def test_header_only_in_debug(self):
+        self.assertNotIn('X-Dashboard-Snapshot', self.get(self.teacher))
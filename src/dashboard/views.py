@@ -1,60 +1,72 @@
+from django.conf import settings
 from django.shortcuts import render, redirect
-from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.timesince import timesince
-from room.models import Room, Activity, Submission
+from room.models import Room, Activity, Announcement, Submission, RoomStudentStanding
 from user.models import StudentProfile, TeacherProfile
 from django.contrib.auth.decorators import login_required
+from .assignments import assignment_page
+from .directory import directory_page
+from .snapshots import get_dashboard_snapshot
+
+
+def _count(queryset):
+    """
+        correlated COUNT(*) subquery, so several per-room counts never multiply each other's joins
+    """
+    return Subquery(
+        queryset.order_by().values('room_id').annotate(total=Count('*')).values('total'),
+        output_field=IntegerField(),
+    )
+
+
+def teacher_rooms(teacher_profile):
+    return list(
+        Room.objects
+        .filter(teacher=teacher_profile)
+        .select_related('teacher__user')
+        .annotate(
+            student_count=Coalesce(_count(Room.students.through.objects.filter(room_id=OuterRef('pk'))), 0),
+            activity_count=Coalesce(_count(Activity.objects.filter(room_id=OuterRef('pk'))), 0),
+            announcement_count=Coalesce(_count(Announcement.objects.filter(room_id=OuterRef('pk'))), 0),
+        )
+    )
 
 
 @login_required
 def build_teacher_dashboard(request, user):
-    Activity.close_past_due_bulk()
     teacher_profile = user.teacher
-    my_rooms = Room.objects.filter(teacher=teacher_profile)
-    room_ids = list(my_rooms.values_list('id', flat=True))
+    my_rooms = teacher_rooms(teacher_profile)
+    room_ids = [room.id for room in my_rooms]
 
-    total_students = sum(r.students.count() for r in my_rooms)
-    total_activities = Activity.objects.filter(room_id__in=room_ids).count()
-    total_announcements = sum(r.announcement_set.count() for r in my_rooms)
+    total_students = sum(room.student_count for room in my_rooms)
+    total_activities = sum(room.activity_count for room in my_rooms)
+    total_announcements = sum(room.announcement_count for room in my_rooms)
 
-    activities = Activity.objects.filter(room_id__in=room_ids)
     grading_queue = [
-        {"activity": a, "pending_count": Submission.objects.filter(activity=a, score__isnull=True).count()}
-        for a in activities
-        if Submission.objects.filter(activity=a, score__isnull=True).exists()
+        {"activity": a, "pending_count": a.pending_count}
+        for a in Activity.objects
+        .filter(room_id__in=room_ids)
+        .select_related('room')
+        .annotate(pending_count=Count('submission', filter=Q(submission__score__isnull=True)))
+        .filter(pending_count__gt=0)
+        .order_by('id')
     ]
 
     q = request.GET.get('q', '').strip()
     course_filter = request.GET.get('course', '').strip()
-
-    students_qs = User.objects.filter(students__in=my_rooms).distinct()
-    if q:
-        students_qs = students_qs.filter(
-            Q(first_name__icontains=q) |
-            Q(last_name__icontains=q) |
-            Q(email__icontains=q) |
-            Q(username__icontains=q)
-        )
-    if course_filter:
-        students_qs = students_qs.filter(students__name=course_filter)
-
-    students_list = []
-    for stu in students_qs:
-        rooms_for_student = my_rooms.filter(students=stu)
-        students_list.append({
-            'id': stu.id,
-            "initials": f"{stu.first_name[:1]}{stu.last_name[:1]}".upper() or stu.username[:2].upper(),
-            "name": stu.student.get_full_name() or stu.username,
-            "email": stu.email,
-            "courses": ", ".join(r.name for r in rooms_for_student),
-            "last_active": stu.last_login,
-        })
+    course_room_ids = [room.id for room in my_rooms if room.name == course_filter] if course_filter else None
+    s_page = request.GET.get('s_page', '')
+    directory = directory_page(teacher_profile, q, course_room_ids, int(s_page) if s_page.isdigit() else 1)
 
     pending_qs = Submission.objects.filter(activity__room_id__in=room_ids, score__isnull=True)
-    graded_qs = Submission.objects.filter(activity__room_id__in=room_ids, score__isnull=False)
-    grading_stats = {"pending": pending_qs.count(), "in_review": 0, "graded": graded_qs.count()}
+    grading_stats = Submission.objects.filter(activity__room_id__in=room_ids).aggregate(
+        pending=Count('id', filter=Q(score__isnull=True)),
+        graded=Count('id', filter=Q(score__isnull=False)),
+    )
+    grading_stats["in_review"] = 0
 
     pending_submissions = []
     for s in pending_qs.select_related('student__user', 'activity__room')[:50]:
@@ -80,18 +92,23 @@ def build_teacher_dashboard(request, user):
         })
 
     room_q = request.GET.get('room_q', '').strip()
-    filtered_rooms = my_rooms.filter(Q(name__icontains=room_q) | Q(room_code__icontains=room_q)) if room_q else my_rooms
+    filtered_rooms = my_rooms
+    if room_q:
+        rq = room_q.lower()
+        filtered_rooms = [room for room in my_rooms if rq in room.name.lower() or rq in room.room_code.lower()]
 
     return {
         "my_rooms": my_rooms,
         "filtered_rooms": filtered_rooms,
-        "total_rooms": my_rooms.count(),
+        "total_rooms": len(my_rooms),
         "total_students": total_students,
         "total_activities": total_activities,
         "total_announcements": total_announcements,
         "grading_queue": grading_queue,
-        "students": students_list,
-        "courses_filter_options": list(my_rooms.values_list('name', flat=True)),
+        "students": directory.students,
+        "students_page": directory.page,
+        "students_has_next": directory.has_next,
+        "courses_filter_options": [room.name for room in my_rooms],
         "selected_q": q,
         "selected_course": course_filter,
         "grading_stats": grading_stats,
@@ -103,21 +120,25 @@ def build_teacher_dashboard(request, user):
 
 @login_required
 def build_student_dashboard(request, user):
-    Activity.close_past_due_bulk()
     student_profile = user.student
-    my_rooms = Room.objects.filter(students=user)
+    my_rooms = list(Room.objects.filter(students=user).select_related('teacher__user'))
+    standings_by_room = {
+        s.room_id: s for s in RoomStudentStanding.objects.filter(student=user, room__in=my_rooms)
+    }
 
     room_q = (request.GET.get('room_q') or '').strip()
     a_q = (request.GET.get('a_q') or '').strip()
     a_status = (request.GET.get('a_status') or '').strip().lower()  
     a_course = (request.GET.get('a_course') or '').strip()  
+    a_cursor = (request.GET.get('a_cursor') or '').strip()
 
     my_courses = [{
         "id": room.id,
         "name": room.name,
         "code": room.room_code,
         "instructor": room.teacher.user.get_full_name(),
-        "status": "Active"
+        "status": "Active",
+        "grade": standings_by_room[room.id].percent if room.id in standings_by_room else 0,
     } for room in my_rooms]
 
     filtered_my_courses = my_courses
@@ -125,48 +146,9 @@ def build_student_dashboard(request, user):
         rq = room_q.lower()
         filtered_my_courses = [c for c in my_courses if rq in c["name"].lower() or rq in c["code"].lower()]
 
-    all_activities = Activity.objects.filter(room__in=my_rooms).order_by('due_date')
-    subs_by_activity = {s.activity_id: s for s in Submission.objects.filter(activity__in=all_activities, student=student_profile)}
+    page = assignment_page(student_profile, my_rooms, a_q, a_status, a_course, a_cursor)
 
-    assignments, pending, overdue, submitted = [], 0, 0, 0
-    for a in all_activities:
-        sub = subs_by_activity.get(a.id)
-        status, status_class, grade_display = "Pending", "pending", "—"
-
-        if sub:
-            if sub.score is not None:
-                status, status_class, grade_display = "Graded", "graded", f"{sub.score} / {a.total_marks}"
-                submitted += 1
-            else:
-                status, status_class, grade_display = "Submitted", "submitted", "Pending"
-                submitted += 1
-        else:
-            if a.due_date and a.due_date < timezone.now():
-                status, status_class, overdue = "Overdue", "overdue", overdue + 1
-            else:
-                pending += 1
-
-        assignments.append({
-            "name": a.title,
-            "course_code": a.room.room_code,
-            "course_name": a.room.name,
-            "due_date": a.due_date,
-            "status": status,
-            "status_class": status_class,
-            "grade": grade_display,
-            "activity_id": a.id
-        })
-
-    filtered_assignments = assignments
-    if a_q:
-        ql = a_q.lower()
-        filtered_assignments = [x for x in filtered_assignments if ql in x["name"].lower() or ql in x["course_name"].lower() or ql in x["course_code"].lower()]
-    if a_status in {"pending", "submitted", "graded"}:
-        filtered_assignments = [x for x in filtered_assignments if x["status_class"] == a_status]
-    if a_course:
-        filtered_assignments = [x for x in filtered_assignments if x["course_name"] == a_course]
-
-    course_options = list(my_rooms.values_list('name', flat=True))
+    course_options = [room.name for room in my_rooms]
 
     return {
         "in_dashboard": True,
@@ -174,27 +156,36 @@ def build_student_dashboard(request, user):
         "filtered_my_courses": filtered_my_courses,
         "total_courses": len(my_courses),
         "room_q": room_q,
-        "pending_assignments": pending,
-        "assignments": filtered_assignments,
-        "assignment_stats": {"pending": pending, "submitted": submitted, "overdue": overdue, "total": len(assignments)},
+        "pending_assignments": page.stats["pending"],
+        "assignments": page.assignments,
+        "assignments_next_cursor": page.next_cursor,
+        "assignment_stats": page.stats,
         "a_q": a_q,
         "a_status": a_status,
         "a_course": a_course,
         "assignment_course_options": course_options,
-        "upcoming_activities": [a for a in all_activities if a.due_date and a.due_date >= timezone.now()][:5],
+        "upcoming_activities": list(
+            Activity.objects.filter(room__in=my_rooms, due_date__gte=timezone.now()).order_by('due_date', 'id')[:5]
+        ),
     }
 
+def snapshot_response(response, cached):
+    if settings.DEBUG:
+        response["X-Dashboard-Snapshot"] = "hit" if cached else "miss"
+    return response
+
+
 @login_required
 def user_dashboard(request):
     if not request.user.is_authenticated:
         return redirect("login_user")
 
     if hasattr(request.user, "teacher"):
-        context = build_teacher_dashboard(request, request.user)
-        return render(request, "teacher/dashboard.html", context)
+        context, cached = get_dashboard_snapshot(request, "teacher", build_teacher_dashboard)
+        return snapshot_response(render(request, "teacher/dashboard.html", context), cached)
 
     if hasattr(request.user, "student"):
-        context = build_student_dashboard(request, request.user)
-        return render(request, "student/dashboard.html", context)
+        context, cached = get_dashboard_snapshot(request, "student", build_student_dashboard)
+        return snapshot_response(render(request, "student/dashboard.html", context), cached)
 
     return redirect("role_selection")
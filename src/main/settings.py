@@ -64,12 +64,57 @@ TEMPLATES = [
     },
 ]
 
+# room access, unread counts and dashboard snapshots are invalidated through this cache, so a deployment
+# with more than one worker process needs a shared backend (redis, memcached or the database cache)
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default=""),
     }
 }
 
+ROOM_FRAGMENT_CACHE_SIZE = config("ROOM_FRAGMENT_CACHE_SIZE", cast=int, default=512)
+ROOM_FRAGMENT_CACHE_TTL = config("ROOM_FRAGMENT_CACHE_TTL", cast=int, default=300)
+ROOM_ACCESS_CACHE_TTL = config("ROOM_ACCESS_CACHE_TTL", cast=int, default=300)
+DASHBOARD_SNAPSHOT_TTL = config("DASHBOARD_SNAPSHOT_TTL", cast=int, default=60)
+NOTIFICATION_CACHE_TTL = config("NOTIFICATION_CACHE_TTL", cast=int, default=300)
+NOTIFICATION_FANOUT_WORKERS = config("NOTIFICATION_FANOUT_WORKERS", cast=int, default=1)
+NOTIFICATION_FANOUT_BATCH_SIZE = config("NOTIFICATION_FANOUT_BATCH_SIZE", cast=int, default=500)
+NOTIFICATION_FANOUT_CLAIM_TIMEOUT = config("NOTIFICATION_FANOUT_CLAIM_TIMEOUT", cast=int, default=10 * 60)
+NOTIFICATION_COLLAPSE_WINDOW = config("NOTIFICATION_COLLAPSE_WINDOW", cast=int, default=60 * 60)
+NOTIFICATION_READ_RETENTION_DAYS = config("NOTIFICATION_READ_RETENTION_DAYS", cast=int, default=30)
+NOTIFICATION_UNREAD_RETENTION_DAYS = config("NOTIFICATION_UNREAD_RETENTION_DAYS", cast=int, default=180)
+NOTIFICATION_PRUNE_BATCH_SIZE = config("NOTIFICATION_PRUNE_BATCH_SIZE", cast=int, default=1000)
+REMINDER_DUE_SOON_HOURS = config("REMINDER_DUE_SOON_HOURS", cast=int, default=24)
+REMINDER_OVERDUE_LOOKBACK_HOURS = config("REMINDER_OVERDUE_LOOKBACK_HOURS", cast=int, default=24)
+REMINDER_CHUNK_SIZE = config("REMINDER_CHUNK_SIZE", cast=int, default=1000)
+# server-sent events hold a worker for as long as the page is open; only turn this on when serving through main.asgi
+NOTIFICATION_STREAM_ENABLED = config("NOTIFICATION_STREAM_ENABLED", cast=bool, default=False)
+NOTIFICATION_STREAM_BROKER = config("NOTIFICATION_STREAM_BROKER", default="local")
+NOTIFICATION_STREAM_HEARTBEAT = config("NOTIFICATION_STREAM_HEARTBEAT", cast=int, default=15)
+NOTIFICATION_STREAM_POLL_INTERVAL = config("NOTIFICATION_STREAM_POLL_INTERVAL", cast=int, default=2)
+NOTIFICATION_STREAM_QUEUE_SIZE = config("NOTIFICATION_STREAM_QUEUE_SIZE", cast=int, default=100)
+
+ACTIVITY_CLOSER_WORKER = config("ACTIVITY_CLOSER_WORKER", cast=bool, default=False)
+ACTIVITY_CLOSER_RELOAD_INTERVAL = config("ACTIVITY_CLOSER_RELOAD_INTERVAL", cast=int, default=300)
+
+EXPORT_WORKERS = config("EXPORT_WORKERS", cast=int, default=2)
+EXPORT_CACHE_DIR = BASE_DIR / "export_cache"
+
+FILE_DELIVERY_BACKEND = config("FILE_DELIVERY_BACKEND", default="python")
+FILE_DELIVERY_INTERNAL_URL = config("FILE_DELIVERY_INTERNAL_URL", default="/protected-media/")
+FILE_VALIDATOR_CACHE_SIZE = config("FILE_VALIDATOR_CACHE_SIZE", cast=int, default=2048)
+FILE_VALIDATOR_CACHE_TTL = config("FILE_VALIDATOR_CACHE_TTL", cast=int, default=300)
+BLOB_GC_GRACE_SECONDS = config("BLOB_GC_GRACE_SECONDS", cast=int, default=3600)
+IMAGE_DERIVATIVE_URL_CACHE_SIZE = config("IMAGE_DERIVATIVE_URL_CACHE_SIZE", cast=int, default=4096)
+IMAGE_DERIVATIVE_URL_CACHE_TTL = config("IMAGE_DERIVATIVE_URL_CACHE_TTL", cast=int, default=3600)
+
+CHUNKED_UPLOAD_DIR = BASE_DIR / "upload_chunks"
+CHUNKED_UPLOAD_CHUNK_SIZE = config("CHUNKED_UPLOAD_CHUNK_SIZE", cast=int, default=5 * 1024 * 1024)
+CHUNKED_UPLOAD_MAX_SIZE = config("CHUNKED_UPLOAD_MAX_SIZE", cast=int, default=512 * 1024 * 1024)
+CHUNKED_UPLOAD_EXPIRY = config("CHUNKED_UPLOAD_EXPIRY", cast=int, default=24 * 60 * 60)
+CHUNKED_UPLOAD_GRACE = config("CHUNKED_UPLOAD_GRACE", cast=int, default=15 * 60)
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
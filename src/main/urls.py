@@ -11,6 +11,7 @@ urlpatterns = [
     path('auth/', include('user.urls')),
     path('room/', include('room.urls')),
     path('dashboard/', include('dashboard.urls')),
+    path(f"{settings.MEDIA_URL.strip('/')}/profile_pics/<path:path>", core_views.serve_profile_picture, name='profile_picture'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 handler404 = core_views.custom_404
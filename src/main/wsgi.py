@@ -5,3 +5,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
 
 application = get_wsgi_application()
+
+from room.scheduler import start_scheduler  # noqa: E402
+from room.fanout import start_fanout_resumer  # noqa: E402
+
+start_scheduler()
+start_fanout_resumer()
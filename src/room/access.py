@@ -0,0 +1,98 @@
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Room
+
+
+RoomAccess = namedtuple('RoomAccess', ['taught', 'enrolled'])
+NO_ACCESS = RoomAccess(frozenset(), frozenset())
+
+
+def access_cache_key(user_id):
+    return f'room_access:{user_id}'
+
+
+def access_version_key(user_id):
+    return f'room_access:version:{user_id}'
+
+
+def load_room_access(user_id):
+    taught = Room.objects.filter(teacher__user_id=user_id).values_list('id', flat=True)
+    enrolled = Room.students.through.objects.filter(user_id=user_id).values_list('room_id', flat=True)
+    return RoomAccess(frozenset(taught), frozenset(enrolled))
+
+
+def get_room_access(user):
+    """
+        the room ids a user teaches and is enrolled in, cached per user with the user's access version
+        and memoised on the user object; an index stored under an older version is never trusted
+    """
+    if not user.is_authenticated:
+        return NO_ACCESS
+    access = getattr(user, '_room_access', None)
+    if access is not None:
+        return access
+    version_key, key = access_version_key(user.id), access_cache_key(user.id)
+    cached = cache.get_many([version_key, key])
+    version = cached.get(version_key)
+    if version is None:
+        version = cache.get_or_set(version_key, time.time_ns, None)
+    entry = cached.get(key)
+    if entry is not None and entry[0] == version:
+        access = entry[1]
+    else:
+        access = load_room_access(user.id)
+        cache.set(key, (version, access), getattr(settings, 'ROOM_ACCESS_CACHE_TTL', 300))
+    user._room_access = access
+    return access
+
+
+def invalidate_room_access(user_ids):
+    """
+        bumps the users' access versions; they must live in a cache every worker shares
+    """
+    keys = [access_version_key(user_id) for user_id in set(user_ids) if user_id is not None]
+    if not keys:
+        return
+    # now, so the rest of the writing transaction never reads an index from before its own write
+    cache.delete_many(keys)
+    # and after commit, because another worker may have reloaded the old rows in between
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _room_id(room_id):
+    try:
+        return int(room_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def can_teach_room(user, room_id):
+    return _room_id(room_id) in get_room_access(user).taught
+
+
+def is_enrolled(user, room_id):
+    return _room_id(room_id) in get_room_access(user).enrolled
+
+
+def can_read_room(user, room_id):
+    room_id = _room_id(room_id)
+    access = get_room_access(user)
+    return room_id in access.taught or room_id in access.enrolled
+
+
+def can_read_activity(user, activity):
+    return can_read_room(user, activity.room_id)
+
+
+def can_read_submission(user, submission, room_id=None):
+    """
+        the room's teacher, or the student who submitted it
+    """
+    if room_id is None:
+        room_id = submission.activity.room_id
+    return can_teach_room(user, room_id) or submission.student.user_id == user.id
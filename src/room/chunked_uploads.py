@@ -0,0 +1,120 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .models import ChunkedUpload
+
+
+READ_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def chunk_root():
+    return Path(getattr(settings, 'CHUNKED_UPLOAD_DIR', Path(settings.BASE_DIR) / 'upload_chunks'))
+
+
+def upload_dir(upload):
+    return chunk_root() / str(upload.id)
+
+
+def chunk_path(upload, index):
+    return upload_dir(upload) / f'{index:06d}.part'
+
+
+def received_chunks(upload):
+    directory = upload_dir(upload)
+    if not directory.exists():
+        return []
+    return sorted(int(path.stem) for path in directory.glob('*.part'))
+
+
+def missing_chunks(upload):
+    received = set(received_chunks(upload))
+    return [index for index in range(upload.total_chunks) if index not in received]
+
+
+def write_chunk(upload, index, stream, checksum):
+    """
+        streams one chunk to disk, checking its length and sha256 before it becomes visible
+    """
+    if not 0 <= index < upload.total_chunks:
+        raise ChunkError("Chunk index out of range", status=416)
+    if not checksum:
+        raise ChunkError("Missing X-Chunk-SHA256 header")
+
+    expected_length = upload.chunk_length(index)
+    directory = upload_dir(upload)
+    directory.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    length = 0
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as fileobj:
+            while True:
+                data = stream.read(READ_SIZE)
+                if not data:
+                    break
+                length += len(data)
+                if length > expected_length:
+                    raise ChunkError(f"Chunk {index} should be {expected_length} bytes")
+                digest.update(data)
+                fileobj.write(data)
+        if length != expected_length:
+            raise ChunkError(f"Chunk {index} should be {expected_length} bytes")
+        if digest.hexdigest() != checksum.strip().lower():
+            raise ChunkError(f"Checksum mismatch for chunk {index}", status=422)
+        os.replace(temp_path, chunk_path(upload, index))
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    ChunkedUpload.objects.filter(id=upload.id).update(updated_at=timezone.now())
+
+
+class AssembledUpload(File):
+    """
+        the chunks read back in order, so storage consumes them without a joined copy
+    """
+
+    def __init__(self, upload):
+        super().__init__(None, upload.filename)
+        self.upload = upload
+        self.size = upload.total_size
+
+    def multiple_chunks(self, chunk_size=None):
+        return True
+
+    def chunks(self, chunk_size=None):
+        for index in range(self.upload.total_chunks):
+            with open(chunk_path(self.upload, index), 'rb') as fileobj:
+                for data in iter(lambda: fileobj.read(chunk_size or READ_SIZE), b''):
+                    yield data
+
+
+def discard_chunks(upload):
+    shutil.rmtree(upload_dir(upload), ignore_errors=True)
+
+
+def reap_stale_uploads(now=None):
+    """
+        drops unfinished uploads untouched for CHUNKED_UPLOAD_EXPIRY seconds, and finished ones' rows
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'CHUNKED_UPLOAD_EXPIRY', 24 * 60 * 60))
+    stale = list(ChunkedUpload.objects.filter(updated_at__lt=cutoff))
+    for upload in stale:
+        discard_chunks(upload)
+    ChunkedUpload.objects.filter(id__in=[upload.id for upload in stale]).delete()
+    return len(stale)
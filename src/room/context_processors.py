@@ -1,20 +1,19 @@
-from .models import Notification
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .inbox import get_unread_count, get_recent_notifications
 
 
 def notification_context(request):
+    """
+        resolved on first use, so pages that never render the bell skip the lookups
+    """
     if request.user.is_authenticated:
-        unread_count = Notification.objects.filter(
-            recipient=request.user, 
-            is_read=False
-        ).count()
-        
-        recent_notifications = Notification.objects.filter(
-            recipient=request.user
-        ).order_by('-created_at')[:5]
-        
+        user_id = request.user.id
         return {
-            'notification_count': unread_count,
-            'recent_notifications': recent_notifications
+            'notification_count': SimpleLazyObject(lambda: get_unread_count(user_id)),
+            'recent_notifications': SimpleLazyObject(lambda: get_recent_notifications(user_id)),
+            'notification_stream_enabled': settings.NOTIFICATION_STREAM_ENABLED,
         }
     
     return {
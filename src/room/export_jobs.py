@@ -0,0 +1,172 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ExportJob
+from .exports import GradebookExport, gradebook_filename
+from .utils.zipstream import stream_zip, unique_arcname
+
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+Artifact = namedtuple('Artifact', ['path', 'filename', 'cached'])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'EXPORT_WORKERS', 2),
+                thread_name_prefix='grade-export',
+            )
+        return _executor
+
+
+def export_cache_dir():
+    return Path(getattr(settings, 'EXPORT_CACHE_DIR', Path(settings.BASE_DIR) / 'export_cache'))
+
+
+def artifact_version(room):
+    """
+        microseconds of the room's updated_at, zero padded so that versions sort as strings
+    """
+    if room.updated_at is None:
+        return '0' * 20
+    return f'{(room.updated_at - EPOCH) // timedelta(microseconds=1):020d}'
+
+
+def room_artifact_path(room, file_format):
+    return export_cache_dir() / f'room_{room.id}' / f'{artifact_version(room)}.{file_format}'
+
+
+def get_room_artifact(room, file_format):
+    """
+        the room's gradebook file for its current data version, built on a cache miss
+    """
+    path = room_artifact_path(room, file_format)
+    filename = gradebook_filename(room, file_format)
+    if path.exists():
+        return Artifact(str(path), filename, True)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    export = GradebookExport(room)
+    descriptor, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.part')
+    try:
+        if file_format == 'csv':
+            with os.fdopen(descriptor, 'w', newline='', encoding='utf-8-sig') as fileobj:
+                export.write_csv(fileobj)
+        else:
+            with os.fdopen(descriptor, 'wb') as fileobj:
+                export.write_xlsx(fileobj)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # a slower request for an older version can finish last, so newer files are left alone
+    for stale in path.parent.glob(f'*.{file_format}'):
+        if not stale.stem.isdigit() or stale.stem < path.stem:
+            stale.unlink(missing_ok=True)
+    return Artifact(str(path), filename, False)
+
+
+def open_room_artifact(room, file_format, attempts=3):
+    """
+        (artifact, open file); a file pruned between the lookup and the open counts as a miss
+    """
+    for attempt in range(attempts):
+        artifact = get_room_artifact(room, file_format)
+        try:
+            return artifact, open(artifact.path, 'rb')
+        except FileNotFoundError:
+            if attempt == attempts - 1:
+                raise
+
+
+def is_cached(room, file_format):
+    return room_artifact_path(room, file_format).exists()
+
+
+def run_export_job(job_id):
+    try:
+        job = ExportJob.objects.get(id=job_id)
+        ExportJob.objects.filter(id=job_id).update(status='running')
+
+        artifacts = []
+        for room in job.rooms.order_by('name', 'id'):
+            artifact = get_room_artifact(room, job.file_format)
+            artifacts.append({
+                'path': os.path.relpath(artifact.path, export_cache_dir()),
+                'filename': artifact.filename,
+            })
+            ExportJob.objects.filter(id=job_id).update(rooms_done=F('rooms_done') + 1)
+
+        ExportJob.objects.filter(id=job_id).update(status='done', artifacts=artifacts, finished_at=timezone.now())
+    except Exception as error:
+        logger.exception("Export job %s failed", job_id)
+        ExportJob.objects.filter(id=job_id).update(status='failed', error=str(error), finished_at=timezone.now())
+
+
+def _run_in_worker(job_id):
+    close_old_connections()
+    try:
+        run_export_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def create_export_job(user, rooms, file_format='xlsx'):
+    """
+        queues an export; when every room is already cached it finishes inline
+    """
+    rooms = list(rooms)
+    job = ExportJob.objects.create(requested_by=user, file_format=file_format, rooms_total=len(rooms))
+    job.rooms.set(rooms)
+
+    if getattr(settings, 'EXPORT_WORKERS', 2) <= 0 or all(is_cached(room, file_format) for room in rooms):
+        run_export_job(job.id)
+        job.refresh_from_db()
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run_in_worker, job.id))
+    return job
+
+
+def artifact_path(artifact):
+    return str(export_cache_dir() / artifact['path'])
+
+
+def _artifact_opener(path):
+    return lambda: open(path, 'rb')
+
+
+def artifacts_available(job):
+    return all(os.path.exists(artifact_path(artifact)) for artifact in job.artifacts)
+
+
+def stream_job_archive(job):
+    entries = []
+    used_names = set()
+    for artifact in job.artifacts:
+        name = unique_arcname(artifact['filename'], used_names)
+        path = artifact_path(artifact)
+        modified = time.localtime(os.path.getmtime(path))[:6]
+        entries.append((name, _artifact_opener(path), modified))
+    return stream_zip(entries)
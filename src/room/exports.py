@@ -0,0 +1,144 @@
+import csv
+import tempfile
+
+import openpyxl
+from openpyxl.utils import get_column_letter
+from django.db.models import Max
+from django.db.models.functions import Length, Lower
+
+from .models import Submission, RoomStudentStanding
+
+
+STUDENT_HEADERS = [
+    'Student ID',
+    'Last Name',
+    'First Name',
+    'Middle Name',
+    'Course',
+    'Year Level',
+    'Subject',
+]
+TOTAL_HEADERS = ['Total Score', 'Max Score', 'Average %']
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CONTENT_TYPES = {
+    'xlsx': XLSX_CONTENT_TYPE,
+    'csv': 'text/csv',
+}
+
+
+def gradebook_filename(room, file_format='xlsx'):
+    return f"{room.name.upper()} - grades.{file_format}"
+
+
+def _text_width(value):
+    return len(str(value)) if value not in (None, '') else 0
+
+
+class GradebookExport:
+    """
+        one pass over the room: the roster from standings plus a single
+        (student, activity) -> score pivot of the room's submissions
+    """
+
+    def __init__(self, room):
+        self.room = room
+        self.activities = list(room.activities.order_by('id'))
+        self.max_score = sum(activity.total_marks for activity in self.activities)
+        self.headers = STUDENT_HEADERS + [activity.title for activity in self.activities] + TOTAL_HEADERS
+
+    def standings(self):
+        return RoomStudentStanding.objects.filter(room=self.room)
+
+    def scores(self):
+        submissions = (
+            Submission.objects
+            .filter(activity__room=self.room, score__isnull=False)
+            .values_list('student__user_id', 'activity_id', 'score')
+        )
+        return {
+            (user_id, activity_id): score
+            for user_id, activity_id, score in submissions.iterator(chunk_size=5000)
+        }
+
+    def rows(self):
+        scores = self.scores()
+        standings = (
+            self.standings()
+            .select_related('student__student__course', 'student__student__year_level')
+            .order_by(Lower('student__last_name'), Lower('student__first_name'))
+        )
+        for standing in standings.iterator(chunk_size=1000):
+            user = standing.student
+            student = user.student
+            row = [
+                student.student_id,
+                user.last_name,
+                user.first_name,
+                student.middle_name if student.middle_name else '-',
+                student.course.name if student.course else '-',
+                student.year_level.name.split(' ')[0] if student.year_level else '-',
+                self.room.name,
+            ]
+            for activity in self.activities:
+                score = scores.get((user.id, activity.id))
+                row.append(score if score else '-')
+
+            average_percent = (standing.scored_sum / self.max_score * 100) if self.max_score > 0 else 0
+            row += [standing.scored_sum, self.max_score, round(average_percent, 2)]
+            yield row
+
+    def column_widths(self):
+        """
+            write-only sheets need widths before the first row, so the text
+            columns are sized from one MAX(LENGTH()) query instead of a cell scan
+        """
+        lengths = self.standings().aggregate(
+            student_id=Max(Length('student__student__student_id')),
+            last_name=Max(Length('student__last_name')),
+            first_name=Max(Length('student__first_name')),
+            middle_name=Max(Length('student__student__middle_name')),
+            course=Max(Length('student__student__course__name')),
+            year_level=Max(Length('student__student__year_level__name')),
+        )
+        widths = [_text_width(header) for header in self.headers]
+        student_values = [
+            lengths['student_id'], lengths['last_name'], lengths['first_name'],
+            lengths['middle_name'], lengths['course'], lengths['year_level'], len(self.room.name),
+        ]
+        for index, length in enumerate(student_values):
+            widths[index] = max(widths[index], length or 1)
+
+        offset = len(STUDENT_HEADERS)
+        for index, activity in enumerate(self.activities):
+            widths[offset + index] = max(widths[offset + index], _text_width(activity.total_marks))
+        totals_offset = offset + len(self.activities)
+        widths[totals_offset] = max(widths[totals_offset], _text_width(self.max_score))
+        widths[totals_offset + 1] = max(widths[totals_offset + 1], _text_width(self.max_score))
+        widths[totals_offset + 2] = max(widths[totals_offset + 2], len('100.0'))
+        return [width + 2 for width in widths]
+
+    def write_xlsx(self, fileobj):
+        work_book = openpyxl.Workbook(write_only=True)
+        work_sheet = work_book.create_sheet(title=self.room.name.title()[:31])
+        for index, width in enumerate(self.column_widths(), start=1):
+            work_sheet.column_dimensions[get_column_letter(index)].width = width
+
+        work_sheet.append(self.headers)
+        for row in self.rows():
+            work_sheet.append(row)
+        work_book.save(fileobj)
+
+    def write_csv(self, fileobj):
+        writer = csv.writer(fileobj)
+        writer.writerow(self.headers)
+        for row in self.rows():
+            writer.writerow(row)
+
+    def xlsx_file(self):
+        """
+            the finished workbook in a temporary file, rewound for streaming
+        """
+        fileobj = tempfile.TemporaryFile()
+        self.write_xlsx(fileobj)
+        fileobj.seek(0)
+        return fileobj
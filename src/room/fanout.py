@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .inbox import record_new_notifications
+from .models import Notification, NotificationEvent, NotificationFanout, Submission
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, getattr(settings, 'NOTIFICATION_FANOUT_WORKERS', 1)),
+                thread_name_prefix='notification-fanout',
+            )
+        return _executor
+
+
+def fanout_recipients(job):
+    """
+        recipient user ids in ascending order, so a job can resume after its last processed id
+    """
+    recipients = job.room.students.all()
+    if job.audience == 'pending':
+        submitted = Submission.objects.filter(activity_id=job.activity_id).values('student__user_id')
+        recipients = recipients.exclude(id__in=submitted)
+    return recipients.order_by('id').values_list('id', flat=True)
+
+
+class ClaimLost(Exception):
+    pass
+
+
+def claim_fanout(job_id, runnable):
+    """
+        marks the job running for this worker; False when another worker got there first
+    """
+    now = timezone.now()
+    claimed = NotificationFanout.objects.filter(runnable, id=job_id).update(status='running', claimed_at=now)
+    return now if claimed == 1 else None
+
+
+def runnable_fanouts(include_failed=False):
+    """
+        queued jobs, and running ones whose worker has not checked in for NOTIFICATION_FANOUT_CLAIM_TIMEOUT seconds
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'NOTIFICATION_FANOUT_CLAIM_TIMEOUT', 600))
+    runnable = Q(status='queued') | Q(status='running', claimed_at__lt=cutoff) | Q(status='running', claimed_at__isnull=True)
+    if include_failed:
+        runnable |= Q(status='failed')
+    return runnable
+
+
+def run_fanout_batch(job, batch_size):
+    recipient_ids = list(fanout_recipients(job).filter(id__gt=job.last_recipient_id)[:batch_size])
+    if not recipient_ids:
+        return 0
+
+    started = time.perf_counter()
+    with transaction.atomic():
+        # a retried batch skips recipients that already hold a receipt for this event
+        existing = set(
+            Notification.objects
+            .filter(event_id=job.event_id, recipient_id__in=recipient_ids)
+            .values_list('recipient_id', flat=True)
+        )
+        new_ids = [recipient_id for recipient_id in recipient_ids if recipient_id not in existing]
+        Notification.objects.bulk_create(
+            [Notification(recipient_id=recipient_id, event=job.event) for recipient_id in new_ids],
+            ignore_conflicts=True,
+        )
+        # conflicting rows get no primary key back, so read the receipts that now exist
+        notifications = list(Notification.objects.filter(event_id=job.event_id, recipient_id__in=new_ids))
+        for notification in notifications:
+            notification.event = job.event
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        job.last_recipient_id = recipient_ids[-1]
+        job.batch_timings.append([len(recipient_ids), elapsed_ms])
+        claimed_at = timezone.now()
+        updated = NotificationFanout.objects.filter(id=job.id, claimed_at=job.claimed_at).update(
+            last_recipient_id=job.last_recipient_id,
+            recipients_done=F('recipients_done') + len(notifications),
+            batch_timings=job.batch_timings,
+            claimed_at=claimed_at,
+        )
+        if updated != 1:
+            raise ClaimLost
+        job.claimed_at = claimed_at
+
+    record_new_notifications(notifications)
+    logger.info("Notification fan-out %s: %s recipients in %.1f ms", job.id, len(recipient_ids), elapsed_ms)
+    return len(recipient_ids)
+
+
+def run_fanout(job_id, batch_size=None, runnable=None):
+    """
+        claims the job and works through it; a job claimed elsewhere is left alone
+    """
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_FANOUT_BATCH_SIZE', 500)
+    claimed_at = claim_fanout(job_id, runnable or Q(status='queued'))
+    if claimed_at is None:
+        return NotificationFanout.objects.get(id=job_id)
+    try:
+        job = NotificationFanout.objects.select_related('room', 'event').get(id=job_id)
+        job.claimed_at = claimed_at
+
+        while run_fanout_batch(job, batch_size):
+            pass
+
+        NotificationFanout.objects.filter(id=job_id, claimed_at=job.claimed_at).update(
+            status='done', error=None, finished_at=timezone.now()
+        )
+    except ClaimLost:
+        logger.warning("Notification fan-out %s was taken over by another worker", job_id)
+    except Exception as error:
+        logger.exception("Notification fan-out %s failed", job_id)
+        NotificationFanout.objects.filter(id=job_id, claimed_at=claimed_at).update(
+            status='failed', error=str(error), finished_at=timezone.now()
+        )
+    return NotificationFanout.objects.get(id=job_id)
+
+
+def _run_in_worker(job_id):
+    close_old_connections()
+    try:
+        run_fanout(job_id)
+    finally:
+        close_old_connections()
+
+
+def queue_room_notifications(room, notification_type, title, message, activity=None, audience='students'):
+    """
+        records the fan-out as a job and inserts the notifications after the request commits
+    """
+    event = NotificationEvent.objects.create(
+        notification_type=notification_type,
+        title=title,
+        message=message,
+        room=room,
+        activity=activity,
+    )
+    job = NotificationFanout.objects.create(room=room, activity=activity, audience=audience, event=event)
+    if getattr(settings, 'NOTIFICATION_FANOUT_WORKERS', 1) <= 0:
+        return run_fanout(job.id)
+    transaction.on_commit(lambda: get_executor().submit(_run_in_worker, job.id))
+    return job
+
+
+def resume_fanouts(include_failed=False):
+    """
+        finishes jobs left queued or interrupted by a restart
+    """
+    runnable = runnable_fanouts(include_failed)
+    job_ids = list(NotificationFanout.objects.filter(runnable).order_by('created_at').values_list('id', flat=True))
+    return [run_fanout(job_id, runnable=runnable) for job_id in job_ids]
+
+
+def _resume_forever():
+    interval = getattr(settings, 'NOTIFICATION_FANOUT_CLAIM_TIMEOUT', 600)
+    while True:
+        close_old_connections()
+        try:
+            resume_fanouts()
+        except Exception:
+            logger.exception("Resuming notification fan-outs failed")
+        finally:
+            close_old_connections()
+        time.sleep(interval)
+
+
+def start_fanout_resumer():
+    """
+        picks up jobs a previous process left behind, now and once per claim timeout
+    """
+    if getattr(settings, 'NOTIFICATION_FANOUT_WORKERS', 1) > 0:
+        threading.Thread(target=_resume_forever, name='notification-fanout-resumer', daemon=True).start()
@@ -0,0 +1,77 @@
+import base64
+from collections import namedtuple
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Notification, NotificationEvent
+
+
+PAGE_SIZE = 20
+NOTIFICATION_TYPES = dict(NotificationEvent.NOTIFICATION_TYPES)
+
+FeedPage = namedtuple('FeedPage', ['notifications', 'next_cursor'])
+
+
+def encode_cursor(notification):
+    raw = f'{notification.created_at.isoformat()}|{notification.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+        (created_at, id) from an opaque cursor, or None for a missing or malformed one
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, notification_id = raw.split('|')
+        created_at = parse_datetime(created_at)
+        notification_id = int(notification_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if created_at is None:
+        return None
+    return created_at, notification_id
+
+
+def parse_filters(params):
+    filters = {}
+    if params.get('type') in NOTIFICATION_TYPES:
+        filters['type'] = params['type']
+    if params.get('room', '').isdigit():
+        filters['room'] = int(params['room'])
+    if params.get('read') in ('read', 'unread'):
+        filters['read'] = params['read']
+    return filters
+
+
+def notification_page(user, cursor=None, filters=None, limit=PAGE_SIZE):
+    """
+        one page of the inbox, newest first, seeking past (created_at, id) of the cursor
+        so every page costs the same however deep it is
+    """
+    filters = filters or {}
+    notifications = Notification.objects.filter(recipient=user)
+    if 'read' in filters:
+        notifications = notifications.filter(is_read=filters['read'] == 'read')
+    if 'type' in filters:
+        notifications = notifications.filter(event__notification_type=filters['type'])
+    if 'room' in filters:
+        notifications = notifications.filter(event__room_id=filters['room'])
+
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, notification_id = position
+        notifications = notifications.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=notification_id)
+        )
+
+    rows = list(
+        notifications
+        .select_related('event__room', 'event__activity', 'event__related_user')
+        .order_by('-created_at', '-id')[:limit + 1]
+    )
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return FeedPage(rows[:limit], next_cursor)
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.utils import timezone
+
+from core.cache import LRUCache
+from .models import Room
+
+
+fragment_cache = LRUCache(
+    'room_fragments',
+    maxsize=getattr(settings, 'ROOM_FRAGMENT_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'ROOM_FRAGMENT_CACHE_TTL', 300),
+)
+
+
+def room_version(room):
+    """
+        the room's updated_at doubles as its version stamp; touch_room moves it
+    """
+    return room.updated_at.isoformat() if room.updated_at else ''
+
+
+def touch_room(room_id):
+    Room.objects.filter(id=room_id).update(updated_at=timezone.now())
+
+
+def touch_rooms(room_ids):
+    room_ids = set(room_ids)
+    if room_ids:
+        Room.objects.filter(id__in=room_ids).update(updated_at=timezone.now())
+
+
+def room_fragment_key(room, role, student=None):
+    student_part = student.id if student is not None else '-'
+    return f'{room.id}:{role}:{room_version(room)}:{student_part}'
+
+
+def get_room_fragments(room, role, build, student=None):
+    """
+        rendered fragments for the room page; build() only runs on a miss
+    """
+    key = room_fragment_key(room, role, student)
+    fragments = fragment_cache.get(key)
+    if fragments is not None and fragments['valid_until'] and fragments['valid_until'] <= timezone.now():
+        fragments = None
+    if fragments is None:
+        fragments = build()
+        fragment_cache.set(key, fragments)
+    return fragments
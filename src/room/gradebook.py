@@ -0,0 +1,136 @@
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import Room, Submission, RoomStudentStanding
+from .utils.grades import calculate_grade
+
+
+GRADED = Q(score__isnull=False)
+EMPTY_TOTALS = {'total_score': 0, 'total_possible': 0, 'submissions_count': 0, 'graded_submissions': 0}
+STANDING_FIELDS = ['scored_sum', 'possible_sum', 'submission_count', 'graded_count', 'percent', 'grade']
+
+
+def _aggregate_submissions(submissions):
+    return submissions.annotate(
+        total_score=Sum('score', filter=GRADED),
+        total_possible=Sum('activity__total_marks', filter=GRADED),
+        submissions_count=Count('id'),
+        graded_submissions=Count('id', filter=GRADED),
+    )
+
+
+def _clean_totals(row):
+    return {
+        'total_score': row['total_score'] or 0,
+        'total_possible': row['total_possible'] or 0,
+        'submissions_count': row['submissions_count'],
+        'graded_submissions': row['graded_submissions'],
+    }
+
+
+def get_room_totals(room):
+    """
+        per student user id: score, possible marks, submission and graded counts
+    """
+    rows = _aggregate_submissions(
+        Submission.objects.filter(activity__room=room).values('student__user_id')
+    )
+    return {row['student__user_id']: _clean_totals(row) for row in rows}
+
+
+def get_student_totals(room, student):
+    rows = _aggregate_submissions(
+        Submission.objects.filter(activity__room=room, student__user=student).values('student__user_id')
+    )
+    for row in rows:
+        return _clean_totals(row)
+    return dict(EMPTY_TOTALS)
+
+
+def standing_values(totals, base_passing):
+    percent, grade = calculate_grade(totals['total_score'], totals['total_possible'], base_passing=base_passing)
+    return {
+        'scored_sum': totals['total_score'],
+        'possible_sum': totals['total_possible'],
+        'submission_count': totals['submissions_count'],
+        'graded_count': totals['graded_submissions'],
+        'percent': percent,
+        'grade': grade,
+    }
+
+
+def refresh_standing(room, student, create=False):
+    """
+        recompute one (room, student) row; rows are only created on enrollment
+    """
+    values = standing_values(get_student_totals(room, student), room.base_passing)
+    if create:
+        RoomStudentStanding.objects.update_or_create(room=room, student=student, defaults=values)
+    else:
+        RoomStudentStanding.objects.filter(room=room, student=student).update(**values)
+
+
+def remove_standing(room, student):
+    RoomStudentStanding.objects.filter(room=room, student=student).delete()
+
+
+def refresh_room_standings(room):
+    totals = get_room_totals(room)
+    standings = list(RoomStudentStanding.objects.filter(room=room))
+    for standing in standings:
+        values = standing_values(totals.get(standing.student_id, EMPTY_TOTALS), room.base_passing)
+        for field, value in values.items():
+            setattr(standing, field, value)
+    RoomStudentStanding.objects.bulk_update(standings, STANDING_FIELDS)
+
+
+def regrade_room_standings(room):
+    """
+        base_passing only moves the grade bands, so the stored sums are reused
+    """
+    standings = list(RoomStudentStanding.objects.filter(room=room))
+    for standing in standings:
+        standing.percent, standing.grade = calculate_grade(
+            standing.scored_sum, standing.possible_sum, base_passing=room.base_passing
+        )
+    RoomStudentStanding.objects.bulk_update(standings, ['percent', 'grade'])
+
+
+def rebuild_standings(rooms=None):
+    rooms = Room.objects.all() if rooms is None else rooms
+    rebuilt = 0
+    for room in rooms:
+        totals = get_room_totals(room)
+        student_ids = list(room.students.values_list('id', flat=True))
+        with transaction.atomic():
+            RoomStudentStanding.objects.filter(room=room).delete()
+            RoomStudentStanding.objects.bulk_create([
+                RoomStudentStanding(
+                    room=room,
+                    student_id=student_id,
+                    **standing_values(totals.get(student_id, EMPTY_TOTALS), room.base_passing)
+                )
+                for student_id in student_ids
+            ])
+        rebuilt += len(student_ids)
+    return rebuilt
+
+
+def build_students_with_grades(room):
+    standings = (
+        RoomStudentStanding.objects
+        .filter(room=room)
+        .select_related('student')
+        .order_by('student_id')
+    )
+
+    return [{
+        'id': standing.student_id,
+        'student': standing.student,
+        'grade': standing.percent,
+        'overall_grade': standing.grade,
+        'total_score': standing.scored_sum,
+        'total_possible': standing.possible_sum,
+        'submissions_count': standing.submission_count,
+        'graded_submissions': standing.graded_count,
+    } for standing in standings]
@@ -0,0 +1,151 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .live import publish_notifications, publish_unread_count
+from .models import Notification
+
+
+RECENT_LIMIT = 5
+
+
+def unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def recent_key(user_id):
+    return f'notifications:recent:{user_id}'
+
+
+def _ttl():
+    return getattr(settings, 'NOTIFICATION_CACHE_TTL', 300)
+
+
+def _detach(instance):
+    model = type(instance)
+    return model(**{field.attname: getattr(instance, field.attname) for field in model._meta.concrete_fields})
+
+
+def _snapshot(notification):
+    """
+        the receipt and its event without any other cached relations, so cache entries stay small
+    """
+    snapshot = _detach(notification)
+    snapshot.event = _detach(notification.event)
+    return snapshot
+
+
+def get_unread_count(user_id):
+    count = cache.get(unread_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.set(unread_key(user_id), count, _ttl())
+    return count
+
+
+def get_recent_notifications(user_id):
+    recent = cache.get(recent_key(user_id))
+    if recent is None:
+        recent = list(
+            Notification.objects
+            .filter(recipient_id=user_id)
+            .select_related('event')
+            .order_by('-created_at', '-id')[:RECENT_LIMIT]
+        )
+        cache.set(recent_key(user_id), recent, _ttl())
+    return recent
+
+
+def record_new_notifications(notifications):
+    """
+        refreshes cached counters and recent lists for freshly created notifications with one
+        get_many, at most one count query and one set_many, however many recipients there are;
+        users with nothing cached are left to the database fallback
+    """
+    by_user = {}
+    for notification in notifications:
+        by_user.setdefault(notification.recipient_id, []).append(notification)
+    if not by_user:
+        return
+
+    cached = cache.get_many([unread_key(user_id) for user_id in by_user] + [recent_key(user_id) for user_id in by_user])
+    updates = {}
+
+    # recounted rather than incremented, so a write that races this one cannot skew the counter for good
+    counted_ids = [
+        user_id for user_id, created in by_user.items()
+        if unread_key(user_id) in cached and any(not notification.is_read for notification in created)
+    ]
+    counts = {}
+    if counted_ids:
+        counts = dict.fromkeys(counted_ids, 0)
+        counts.update(
+            Notification.objects
+            .filter(recipient_id__in=counted_ids, is_read=False)
+            .order_by()
+            .values('recipient_id')
+            .annotate(count=Count('id'))
+            .values_list('recipient_id', 'count')
+        )
+        updates.update({unread_key(user_id): count for user_id, count in counts.items()})
+
+    for user_id, created in by_user.items():
+        key = recent_key(user_id)
+        if key in cached:
+            newest_first = sorted(map(_snapshot, created), key=lambda notification: notification.id or 0, reverse=True)
+            updates[key] = (newest_first + cached[key])[:RECENT_LIMIT]
+    if updates:
+        cache.set_many(updates, _ttl())
+    publish_notifications(notifications, counts)
+
+
+def record_collapsed(notification):
+    """
+        an existing unread notification was folded into and moved to the top; the count is unchanged
+    """
+    key = recent_key(notification.recipient_id)
+    recent = cache.get(key)
+    if recent is not None:
+        others = [cached for cached in recent if cached.id != notification.id]
+        cache.set(key, ([_snapshot(notification)] + others)[:RECENT_LIMIT], _ttl())
+    publish_notifications([notification], {})
+
+
+def record_read(user_id, notification_ids=None):
+    """
+        notification_ids=None marks the whole inbox read
+    """
+    count = None
+    if notification_ids is None:
+        count = 0
+        cache.set(unread_key(user_id), count, _ttl())
+    else:
+        try:
+            count = cache.decr(unread_key(user_id), len(notification_ids))
+            if count < 0:
+                count = 0
+                cache.set(unread_key(user_id), count, _ttl())
+        except ValueError:
+            pass
+    if count is not None:
+        publish_unread_count(user_id, count)
+
+    recent = cache.get(recent_key(user_id))
+    if recent is not None:
+        for notification in recent:
+            if notification_ids is None or notification.id in notification_ids:
+                notification.is_read = True
+        cache.set(recent_key(user_id), recent, _ttl())
+
+
+def record_cleared(user_id):
+    cache.set_many({unread_key(user_id): 0, recent_key(user_id): []}, _ttl())
+    publish_unread_count(user_id, 0)
+
+
+def forget_inbox(user_ids):
+    keys = []
+    for user_id in user_ids:
+        keys += [unread_key(user_id), recent_key(user_id)]
+    if keys:
+        cache.delete_many(keys)
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.urls import reverse
+
+from .models import Notification
+
+
+logger = logging.getLogger(__name__)
+
+MISSED_LIMIT = 50
+SENT_MEMORY = 500
+
+
+class Subscription:
+    def __init__(self, user_id, loop, queue_size):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def offer(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # the stream closes and the client resumes from Last-Event-ID
+            self.overflowed = True
+
+
+class NotificationHub:
+    """
+        in-process pub/sub from the notification helpers to connected streams;
+        publish is thread-safe and never waits on a slow client
+    """
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(
+            user_id, asyncio.get_running_loop(), getattr(settings, 'NOTIFICATION_STREAM_QUEUE_SIZE', 100)
+        )
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def is_subscribed(self, user_id):
+        return user_id in self._subscriptions
+
+    def subscribed_users(self):
+        with self._lock:
+            return list(self._subscriptions)
+
+    def publish(self, user_id, kind, payload):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, (kind, payload))
+            except RuntimeError:
+                self.unsubscribe(subscription)
+
+
+hub = NotificationHub()
+
+
+def notification_payload(notification):
+    event = notification.event
+    return {
+        'id': notification.id,
+        'title': event.title,
+        'message': event.message,
+        'icon': event.get_icon(),
+        'url': reverse('mark_notification_read', kwargs={'notification_id': notification.id}),
+        'is_read': notification.is_read,
+        'count': event.count,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def publish_notifications(notifications, unread_counts):
+    """
+        pushes new receipts and unread counts to the recipients' open streams once the insert commits
+    """
+    notifications = [notification for notification in notifications if hub.is_subscribed(notification.recipient_id)]
+    if not notifications:
+        return
+    payloads = [(notification.recipient_id, notification_payload(notification)) for notification in notifications]
+
+    def publish():
+        for user_id, payload in payloads:
+            hub.publish(user_id, 'notification', payload)
+        for user_id in {user_id for user_id, _ in payloads}:
+            if user_id in unread_counts:
+                hub.publish(user_id, 'unread', {'count': unread_counts[user_id]})
+
+    transaction.on_commit(publish)
+
+
+def publish_unread_count(user_id, count):
+    if hub.is_subscribed(user_id):
+        transaction.on_commit(lambda: hub.publish(user_id, 'unread', {'count': count}))
+
+
+class DatabaseRelay:
+    """
+        the multi-worker stand-in for a shared broker: polls for receipts written by other
+        processes and republishes them to this process's subscribers
+    """
+
+    def __init__(self, interval=2, lookback=200):
+        self.interval = interval
+        self.lookback = lookback
+        self.cursor = None
+        self.start_id = 0
+        self.published = set()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run_forever, name='notification-relay', daemon=True)
+                self._thread.start()
+
+    def poll(self):
+        if self.cursor is None:
+            self.cursor = self.start_id = Notification.objects.aggregate(last=Max('id'))['last'] or 0
+            return 0
+        users = hub.subscribed_users()
+        if not users:
+            return 0
+        # a lookback window catches receipts that committed after a higher id
+        floor = max(self.start_id, self.cursor - self.lookback)
+        receipts = list(
+            Notification.objects
+            .filter(id__gt=floor, recipient_id__in=users)
+            .exclude(id__in=self.published)
+            .select_related('event')
+            .order_by('id')[:1000]
+        )
+        for notification in receipts:
+            hub.publish(notification.recipient_id, 'notification', notification_payload(notification))
+            self.published.add(notification.id)
+        if receipts:
+            self.cursor = max(self.cursor, receipts[-1].id)
+        self.published = {receipt_id for receipt_id in self.published if receipt_id > floor}
+        return len(receipts)
+
+    def run_forever(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Notification relay poll failed")
+            finally:
+                close_old_connections()
+            time.sleep(self.interval)
+
+
+relay = DatabaseRelay(interval=getattr(settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 2))
+
+
+def missed_notifications(user_id, last_event_id):
+    receipts = (
+        Notification.objects
+        .filter(recipient_id=user_id, id__gt=last_event_id)
+        .select_related('event')
+        .order_by('id')[:MISSED_LIMIT]
+    )
+    return [notification_payload(notification) for notification in receipts]
+
+
+def format_event(kind, payload, event_id=None):
+    lines = [f'event: {kind}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(payload)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+async def stream_notifications(user_id, last_event_id=None, heartbeat=None):
+    """
+        SSE for one user: missed receipts after last_event_id, the unread count, then live
+        events with a comment line every `heartbeat` seconds of silence
+    """
+    from .inbox import get_unread_count
+
+    heartbeat = heartbeat or getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+    relayed = getattr(settings, 'NOTIFICATION_STREAM_BROKER', 'local') == 'database'
+    if relayed:
+        relay.start()
+
+    subscription = hub.subscribe(user_id)
+    sent = deque(maxlen=SENT_MEMORY)
+    try:
+        yield 'retry: 5000\n\n'
+        if last_event_id is not None:
+            for payload in await sync_to_async(missed_notifications)(user_id, last_event_id):
+                sent.append((payload['id'], payload['count']))
+                yield format_event('notification', payload, payload['id'])
+        count = await sync_to_async(get_unread_count)(user_id)
+        yield format_event('unread', {'count': count})
+
+        while not subscription.overflowed:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ': heartbeat\n\n'
+                if relayed:
+                    latest = await sync_to_async(get_unread_count)(user_id)
+                    if latest != count:
+                        count = latest
+                        yield format_event('unread', {'count': count})
+                continue
+
+            kind, payload = message
+            if kind == 'notification':
+                # a collapsed notification comes back with the same id and a higher count
+                if (payload['id'], payload.get('count')) in sent:
+                    continue
+                sent.append((payload['id'], payload.get('count')))
+                yield format_event(kind, payload, payload['id'])
+            elif payload['count'] != count:
+                count = payload['count']
+                yield format_event(kind, payload)
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from room.models import Activity
+from room.scheduler import DueDateScheduler
+
+
+class Command(BaseCommand):
+    help = "Close activities whose due date has passed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help="Keep running and close activities as they become due")
+        parser.add_argument('--reload-interval', type=int, default=300, help="Seconds between reloads of upcoming due dates in watch mode")
+
+    def handle(self, *args, **options):
+        if not options['watch']:
+            closed = Activity.close_past_due_bulk()
+            self.stdout.write(self.style.SUCCESS(f"Closed {closed} past-due activities."))
+            return
+
+        scheduler = DueDateScheduler(reload_interval=options['reload_interval'])
+        scheduler.start()
+        self.stdout.write("Watching activity due dates. Press Ctrl+C to stop.")
+        try:
+            while scheduler.running:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            scheduler.stop()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from room.storage import collect_blobs, import_legacy_files, recount_blobs
+
+
+class Command(BaseCommand):
+    help = "Garbage-collect unreferenced submission and resource blobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--import-legacy', action='store_true', help="Move files saved before the blob store into it first")
+        parser.add_argument('--recount', action='store_true', help="Rebuild reference counts from the database before collecting")
+
+    def handle(self, *args, **options):
+        if options['import_legacy']:
+            imported = import_legacy_files()
+            self.stdout.write(f"Imported {imported} legacy files.")
+        if options['recount']:
+            counted = recount_blobs()
+            self.stdout.write(f"Recounted {counted} blobs.")
+
+        collected = collect_blobs()
+        self.stdout.write(self.style.SUCCESS(f"Collected {collected} unreferenced blobs."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from room.retention import prune_notifications
+
+
+class Command(BaseCommand):
+    help = "Delete old read notifications, archive stale unread ones and drop unreferenced events"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        result = prune_notifications(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {result.deleted} read notifications, archived {result.archived} unread, "
+            f"removed {result.events} events and {result.fanouts} finished fan-outs."
+        ))
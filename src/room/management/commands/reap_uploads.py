@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from room.chunked_uploads import reap_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete chunked uploads that have not been touched within CHUNKED_UPLOAD_EXPIRY"
+
+    def handle(self, *args, **options):
+        reaped = reap_stale_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Reaped {reaped} stale uploads."))
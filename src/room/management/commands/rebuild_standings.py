@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from room.models import Room
+from room.gradebook import rebuild_standings
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-student room standings from submissions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', type=int, action='append', dest='room_ids', help="Only rebuild the given room id (repeatable)")
+
+    def handle(self, *args, **options):
+        rooms = Room.objects.all()
+        if options['room_ids']:
+            rooms = rooms.filter(id__in=options['room_ids'])
+
+        rebuilt = rebuild_standings(rooms)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} standings across {rooms.count()} rooms."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from room.fanout import resume_fanouts
+
+
+class Command(BaseCommand):
+    help = "Finish notification fan-outs that were queued or interrupted, reporting per-batch timings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help="Also retry fan-outs that failed")
+
+    def handle(self, *args, **options):
+        for job in resume_fanouts(include_failed=options['retry_failed']):
+            timings = ', '.join(f"{size} in {ms} ms" for size, ms in job.batch_timings)
+            self.stdout.write(f"Fan-out {job.id}: {job.status}, {job.recipients_done} notified ({timings or 'no batches'})")
+        self.stdout.write(self.style.SUCCESS("Notification fan-outs processed."))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from room.reminders import send_all_reminders
+
+
+class Command(BaseCommand):
+    help = "Send due-soon and overdue reminders to students who have not submitted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help="Keep running and sweep every --interval seconds")
+        parser.add_argument('--interval', type=int, default=300, help="Seconds between sweeps in watch mode")
+
+    def sweep(self):
+        for result in send_all_reminders():
+            self.stdout.write(
+                f"{result.kind}: {result.notifications} reminders for {result.activities} activities in {result.seconds}s"
+            )
+
+    def handle(self, *args, **options):
+        if not options['watch']:
+            self.sweep()
+            return
+
+        self.stdout.write("Sending reminders. Press Ctrl+C to stop.")
+        try:
+            while True:
+                self.sweep()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
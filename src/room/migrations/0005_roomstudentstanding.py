@@ -0,0 +1,75 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+from room.utils.grades import calculate_grade
+
+
+def populate_standings(apps, schema_editor):
+    Room = apps.get_model('room', 'Room')
+    Submission = apps.get_model('room', 'Submission')
+    RoomStudentStanding = apps.get_model('room', 'RoomStudentStanding')
+
+    graded = Q(score__isnull=False)
+    for room in Room.objects.all():
+        totals = {
+            row['student__user_id']: row
+            for row in Submission.objects.filter(activity__room=room).values('student__user_id').annotate(
+                total_score=Sum('score', filter=graded),
+                total_possible=Sum('activity__total_marks', filter=graded),
+                submissions_count=Count('id'),
+                graded_submissions=Count('id', filter=graded),
+            )
+        }
+
+        standings = []
+        for student_id in room.students.values_list('id', flat=True):
+            row = totals.get(student_id, {})
+            scored_sum = row.get('total_score') or 0
+            possible_sum = row.get('total_possible') or 0
+            percent, grade = calculate_grade(scored_sum, possible_sum, base_passing=room.base_passing)
+            standings.append(RoomStudentStanding(
+                room=room,
+                student_id=student_id,
+                scored_sum=scored_sum,
+                possible_sum=possible_sum,
+                submission_count=row.get('submissions_count') or 0,
+                graded_count=row.get('graded_submissions') or 0,
+                percent=percent,
+                grade=grade,
+            ))
+        RoomStudentStanding.objects.bulk_create(standings)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0004_room_base_passing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomStudentStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scored_sum', models.IntegerField(default=0)),
+                ('possible_sum', models.IntegerField(default=0)),
+                ('submission_count', models.PositiveIntegerField(default=0)),
+                ('graded_count', models.PositiveIntegerField(default=0)),
+                ('percent', models.FloatField(default=0)),
+                ('grade', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='room.room')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_standings', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='roomstudentstanding',
+            constraint=models.UniqueConstraint(fields=('room', 'student'), name='unique_room_student_standing'),
+        ),
+        migrations.RunPython(populate_standings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0006_exportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionArchiveDownload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('downloaded_at', models.DateTimeField()),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_downloads', to='room.activity')),
+                ('downloaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_archive_downloads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='submissionarchivedownload',
+            constraint=models.UniqueConstraint(fields=('activity', 'downloaded_by'), name='unique_activity_archive_download'),
+        ),
+    ]
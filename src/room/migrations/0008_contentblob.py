@@ -0,0 +1,40 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:21
+
+import django.utils.timezone
+import room.models
+import room.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0007_submissionarchivedownload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activity',
+            name='resource_file',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=room.storage.get_content_storage, upload_to=room.models.activity_resource_upload_path),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='submission_file',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=room.storage.get_content_storage, upload_to=room.models.submission_upload_path),
+        ),
+        migrations.CreateModel(
+            name='ContentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'last_used_at'], name='room_conten_ref_cou_c92250_idx')],
+            },
+        ),
+    ]
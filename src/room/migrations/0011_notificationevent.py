@@ -0,0 +1,43 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0010_notificationfanout'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('activity_graded', 'Activity Graded'), ('new_activity', 'New Activity Assigned'), ('new_announcement', 'New Announcement'), ('activity_due_soon', 'Activity Due Soon'), ('activity_overdue', 'Activity Overdue'), ('room_update', 'Room Updated'), ('student_submitted', 'Student Submitted'), ('student_enrolled', 'Student Enrolled'), ('student_left', 'Student Left Room'), ('activity_due_reminder', 'Activity Due Reminder'), ('submission_overdue', 'Submission Overdue')], max_length=30)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('activity', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='room.activity')),
+                ('related_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='related_notifications', to=settings.AUTH_USER_MODEL)),
+                ('room', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='room.room')),
+                ('submission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='room.submission')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='room_notifi_created_2eca7f_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='event',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='room.notificationevent'),
+        ),
+        migrations.AddField(
+            model_name='notificationfanout',
+            name='event',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='fanouts', to='room.notificationevent'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations
+
+
+CONTENT_FIELDS = ['notification_type', 'title', 'message', 'room_id', 'activity_id', 'submission_id', 'related_user_id']
+BATCH_SIZE = 2000
+
+
+def create_event(NotificationEvent, created_at, **content):
+    event = NotificationEvent.objects.create(**content)
+    NotificationEvent.objects.filter(id=event.id).update(created_at=created_at)
+    return event.id
+
+
+def convert_notifications(apps, schema_editor):
+    Notification = apps.get_model('room', 'Notification')
+    NotificationEvent = apps.get_model('room', 'NotificationEvent')
+    NotificationFanout = apps.get_model('room', 'NotificationFanout')
+
+    for fanout in NotificationFanout.objects.order_by('id'):
+        fanout.event_id = create_event(
+            NotificationEvent, fanout.created_at,
+            notification_type=fanout.notification_type, title=fanout.title, message=fanout.message,
+            room_id=fanout.room_id, activity_id=fanout.activity_id,
+        )
+        fanout.save(update_fields=['event'])
+        Notification.objects.filter(fanout_id=fanout.id).update(event_id=fanout.event_id)
+
+    # rows bulk-created for one fan-out share their content; a repeated recipient starts a new event
+    groups = {}
+    last_id = 0
+    while True:
+        rows = list(
+            Notification.objects
+            .filter(id__gt=last_id, event__isnull=True)
+            .order_by('id')
+            .values('id', 'recipient_id', 'created_at', *CONTENT_FIELDS)[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        by_event = {}
+        for row in rows:
+            key = tuple(row[field] for field in CONTENT_FIELDS)
+            group = groups.get(key)
+            if group is None or row['recipient_id'] in group[1]:
+                event_id = create_event(NotificationEvent, row['created_at'], **{field: row[field] for field in CONTENT_FIELDS})
+                group = groups[key] = (event_id, set())
+            group[1].add(row['recipient_id'])
+            by_event.setdefault(group[0], []).append(row['id'])
+        for event_id, ids in by_event.items():
+            Notification.objects.filter(id__in=ids).update(event_id=event_id)
+        last_id = rows[-1]['id']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0011_notificationevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_notifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0012_notificationevent_receipts'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='notification',
+            name='unique_fanout_recipient',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='activity',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='fanout',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='message',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='notification_type',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='related_user',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='room',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='submission',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='title',
+        ),
+        migrations.RemoveField(
+            model_name='notificationfanout',
+            name='message',
+        ),
+        migrations.RemoveField(
+            model_name='notificationfanout',
+            name='notification_type',
+        ),
+        migrations.RemoveField(
+            model_name='notificationfanout',
+            name='title',
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='room.notificationevent'),
+        ),
+        migrations.AlterField(
+            model_name='notificationfanout',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fanouts', to='room.notificationevent'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'created_at'], name='room_notifi_recipie_6989b7_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('event', 'recipient'), name='unique_event_recipient'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0013_remove_notification_content'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('activity_graded', 'Activity Graded'), ('new_activity', 'New Activity Assigned'), ('new_announcement', 'New Announcement'), ('activity_due_soon', 'Activity Due Soon'), ('activity_overdue', 'Activity Overdue'), ('room_update', 'Room Updated'), ('student_submitted', 'Student Submitted'), ('student_enrolled', 'Student Enrolled'), ('student_left', 'Student Left Room'), ('activity_due_reminder', 'Activity Due Reminder'), ('submission_overdue', 'Submission Overdue')], max_length=30)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notificationevent',
+            name='count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['is_read', 'created_at'], name='room_notifi_is_read_9a8e92_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivednotification',
+            name='recipient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivednotification',
+            index=models.Index(fields=['recipient', 'created_at'], name='room_archiv_recipie_2fe02e_idx'),
+        ),
+    ]
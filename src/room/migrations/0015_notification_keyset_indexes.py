@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0014_notification_retention'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='room_notifi_recipie_7a8587_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='room_notifi_recipie_6989b7_idx',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'is_read', 'created_at', 'id'], name='room_notifi_recipie_78ee23_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'created_at', 'id'], name='room_notifi_recipie_449f10_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0015_notification_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('due_soon', 'Due soon'), ('overdue', 'Overdue')], max_length=20)),
+                ('recipients', models.PositiveIntegerField(default=0)),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['due_date'], name='room_activi_due_dat_ff6e8f_idx'),
+        ),
+        migrations.AddField(
+            model_name='activityreminder',
+            name='activity',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='room.activity'),
+        ),
+        migrations.AddField(
+            model_name='activityreminder',
+            name='event',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='room.notificationevent'),
+        ),
+        migrations.AddConstraint(
+            model_name='activityreminder',
+            constraint=models.UniqueConstraint(fields=('activity', 'kind'), name='unique_activity_reminder'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    """
+        SQLite mirrors the documents into an FTS5 table through triggers;
+        PostgreSQL gets a GIN index over the weighted tsvector
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("""
+            CREATE VIRTUAL TABLE room_searchdocument_fts USING fts5(
+                title, body, rooms, kind, content='', prefix='2 3 4', tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        schema_editor.execute("""
+            CREATE TRIGGER room_searchdocument_ai AFTER INSERT ON room_searchdocument BEGIN
+                INSERT INTO room_searchdocument_fts(rowid, title, body, rooms, kind)
+                VALUES (new.id, new.title, new.body, 'r' || new.room_id, new.kind);
+            END
+        """)
+        schema_editor.execute("""
+            CREATE TRIGGER room_searchdocument_ad AFTER DELETE ON room_searchdocument BEGIN
+                INSERT INTO room_searchdocument_fts(room_searchdocument_fts, rowid, title, body, rooms, kind)
+                VALUES ('delete', old.id, old.title, old.body, 'r' || old.room_id, old.kind);
+            END
+        """)
+        schema_editor.execute("""
+            CREATE TRIGGER room_searchdocument_au AFTER UPDATE ON room_searchdocument BEGIN
+                INSERT INTO room_searchdocument_fts(room_searchdocument_fts, rowid, title, body, rooms, kind)
+                VALUES ('delete', old.id, old.title, old.body, 'r' || old.room_id, old.kind);
+                INSERT INTO room_searchdocument_fts(rowid, title, body, rooms, kind)
+                VALUES (new.id, new.title, new.body, 'r' || new.room_id, new.kind);
+            END
+        """)
+    elif vendor == 'postgresql':
+        schema_editor.execute("""
+            CREATE INDEX room_searchdocument_tsv ON room_searchdocument USING GIN ((
+                setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')
+            ))
+        """)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for trigger in ['au', 'ad', 'ai']:
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS room_searchdocument_{trigger}')
+        schema_editor.execute('DROP TABLE IF EXISTS room_searchdocument_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS room_searchdocument_tsv')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0016_activityreminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('room', 'Room'), ('activity', 'Activity'), ('announcement', 'Announcement')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='room.room')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
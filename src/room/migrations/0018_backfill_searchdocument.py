@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+# (room id, title, body) of each indexed model, as room.search.document_fields built them at the time
+DOCUMENT_FIELDS = {
+    'Room': lambda room: (room.id, room.name, f'{room.room_code} {room.description or ""}'),
+    'Activity': lambda activity: (activity.room_id, activity.title, activity.description or ''),
+    'Announcement': lambda announcement: (announcement.room_id, announcement.title, announcement.content or ''),
+}
+
+
+def backfill(apps, schema_editor):
+    SearchDocument = apps.get_model('room', 'SearchDocument')
+    for model_name, fields in DOCUMENT_FIELDS.items():
+        batch = []
+        for instance in apps.get_model('room', model_name).objects.order_by('id').iterator(chunk_size=BATCH_SIZE):
+            room_id, title, body = fields(instance)
+            batch.append(SearchDocument(
+                kind=model_name.lower(), object_id=instance.id, room_id=room_id, title=title[:255], body=body,
+            ))
+            if len(batch) >= BATCH_SIZE:
+                SearchDocument.objects.bulk_create(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+
+
+def clear(apps, schema_editor):
+    apps.get_model('room', 'SearchDocument').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0017_searchdocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, clear),
+    ]
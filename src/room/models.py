@@ -1,10 +1,12 @@
 import random
 import string
 import os
+import uuid
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from user.models import TeacherProfile, StudentProfile
+from .storage import get_content_storage
 
 
 def generate_code():
@@ -38,6 +40,14 @@ class Room(models.Model):
 
     base_passing = models.PositiveIntegerField(default=60)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_base_passing = instance.__dict__.get('base_passing')
+        instance._loaded_name = instance.__dict__.get('name')
+        instance._loaded_teacher_id = instance.__dict__.get('teacher_id')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.room_code:
             code = generate_code()
@@ -47,6 +57,12 @@ class Room(models.Model):
 
         super().save(*args, **kwargs)
 
+        loaded_base_passing = getattr(self, '_loaded_base_passing', None)
+        if loaded_base_passing is not None and loaded_base_passing != self.base_passing:
+            from .gradebook import regrade_room_standings
+            regrade_room_standings(self)
+        self._loaded_base_passing = self.base_passing
+
     def __str__(self):
         return self.name
     
@@ -67,7 +83,7 @@ class Activity(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
 
-    resource_file = models.FileField(upload_to=activity_resource_upload_path, blank=True, null=True)
+    resource_file = models.FileField(upload_to=activity_resource_upload_path, storage=get_content_storage, max_length=255, blank=True, null=True)
 
     total_marks = models.IntegerField(default=0)
     due_date = models.DateTimeField(blank=True, null=True)
@@ -86,6 +102,27 @@ class Activity(models.Model):
 
     class Meta:
         verbose_name_plural = 'Activities'
+        indexes = [
+            models.Index(fields=['due_date']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_total_marks = instance.__dict__.get('total_marks')
+        instance._loaded_file_name = instance.__dict__.get('resource_file')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        loaded_total_marks = getattr(self, '_loaded_total_marks', None)
+        # compare as numbers; "10", 10 and Decimal("10.00") are the same total
+        to_number = self._meta.get_field('total_marks').to_python
+        if loaded_total_marks is not None and to_number(loaded_total_marks) != to_number(self.total_marks):
+            from .gradebook import refresh_room_standings
+            refresh_room_standings(self.room)
+        self._loaded_total_marks = self.total_marks
 
     def is_past_due(self):
         from django.utils import timezone
@@ -100,10 +137,18 @@ class Activity(models.Model):
         return False
 
     @classmethod
-    def close_past_due_bulk(cls):
+    def close_past_due_bulk(cls, activity_ids=None):
         from django.utils import timezone
         now = timezone.now()
-        cls.objects.filter(due_date__isnull=False, due_date__lt=now).exclude(status="closed").update(status="closed")
+        past_due = cls.objects.filter(due_date__isnull=False, due_date__lt=now).exclude(status="closed")
+        if activity_ids is not None:
+            past_due = past_due.filter(id__in=activity_ids)
+        room_ids = list(past_due.values_list('room_id', flat=True).distinct())
+        closed = 0
+        if room_ids:
+            closed = past_due.update(status="closed")
+            Room.objects.filter(id__in=room_ids).update(updated_at=now)
+        return closed
 
     def get_resource_filename(self):
         if self.resource_file:
@@ -127,7 +172,7 @@ class Submission(models.Model):
     score = models.IntegerField(blank=True, null=True)
     feedback = models.TextField(blank=True, null=True)
 
-    submission_file = models.FileField(upload_to=submission_upload_path, blank=True, null=True)
+    submission_file = models.FileField(upload_to=submission_upload_path, storage=get_content_storage, max_length=255, blank=True, null=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
 
     status = models.CharField(
@@ -139,6 +184,12 @@ class Submission(models.Model):
         default="submitted",
     )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_file_name = instance.__dict__.get('submission_file')
+        return instance
+
     def get_submission_filename(self):
         if self.submission_file:
             return os.path.basename(self.submission_file.name)
@@ -154,7 +205,138 @@ class Submission(models.Model):
         return f"{self.student.user.username} - {self.activity.title}"
 
 
-class Notification(models.Model):
+class ContentBlob(models.Model):
+    digest = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'last_used_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.ref_count} refs)"
+
+
+class RoomStudentStanding(models.Model):
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='standings')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='room_standings')
+
+    scored_sum = models.IntegerField(default=0)
+    possible_sum = models.IntegerField(default=0)
+    submission_count = models.PositiveIntegerField(default=0)
+    graded_count = models.PositiveIntegerField(default=0)
+
+    percent = models.FloatField(default=0)
+    grade = models.FloatField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'student'], name='unique_room_student_standing'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.room.name}"
+
+
+class ExportJob(models.Model):
+    FORMATS = [
+        ("xlsx", "Excel"),
+        ("csv", "CSV"),
+    ]
+
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    rooms = models.ManyToManyField(Room, related_name='export_jobs')
+    file_format = models.CharField(max_length=4, choices=FORMATS, default="xlsx")
+
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ("queued", "Queued"),
+            ("running", "Running"),
+            ("done", "Done"),
+            ("failed", "Failed"),
+        ],
+        default="queued",
+    )
+    rooms_total = models.PositiveIntegerField(default=0)
+    rooms_done = models.PositiveIntegerField(default=0)
+    artifacts = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def progress(self):
+        if self.rooms_total <= 0:
+            return 100 if self.status == "done" else 0
+        return round(self.rooms_done / self.rooms_total * 100)
+
+    def __str__(self):
+        return f"Export {self.id} ({self.status})"
+
+
+class ChunkedUpload(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='chunked_uploads')
+    submission = models.ForeignKey(Submission, on_delete=models.SET_NULL, null=True, blank=True)
+
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ("uploading", "Uploading"),
+            ("complete", "Complete"),
+        ],
+        default="uploading",
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def chunk_length(self, index):
+        if index == self.total_chunks - 1:
+            return self.total_size - index * self.chunk_size
+        return self.chunk_size
+
+    def __str__(self):
+        return f"{self.user.username} - {self.filename} ({self.status})"
+
+
+class SubmissionArchiveDownload(models.Model):
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='archive_downloads')
+    downloaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submission_archive_downloads')
+    downloaded_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['activity', 'downloaded_by'], name='unique_activity_archive_download'),
+        ]
+
+    def __str__(self):
+        return f"{self.downloaded_by.username} - {self.activity.title}"
+
+
+class NotificationEvent(models.Model):
     NOTIFICATION_TYPES = [
         ('activity_graded', 'Activity Graded'),
         ('new_activity', 'New Activity Assigned'),
@@ -170,7 +352,6 @@ class Notification(models.Model):
         ('submission_overdue', 'Submission Overdue'),
     ]
     
-    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     notification_type = models.CharField(max_length=30, choices=NOTIFICATION_TYPES)
     title = models.CharField(max_length=255)
     message = models.TextField()
@@ -179,19 +360,17 @@ class Notification(models.Model):
     activity = models.ForeignKey(Activity, on_delete=models.CASCADE, null=True, blank=True)
     submission = models.ForeignKey(Submission, on_delete=models.CASCADE, null=True, blank=True)
     related_user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='related_notifications')
+    count = models.PositiveIntegerField(default=1)
     
-    is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['recipient', 'is_read']),
             models.Index(fields=['created_at']),
         ]
     
     def __str__(self):
-        return f"{self.recipient.username} - {self.title}"
+        return self.title
     
     def get_icon(self):
         icon_map = {
@@ -210,18 +389,194 @@ class Notification(models.Model):
         return icon_map.get(self.notification_type, 'bi-bell-fill text-secondary')
     
     def get_url(self):
-        if self.activity:
-            return f'/room/activity/{self.activity.id}/'
-        elif self.room:
-            return f'/room/{self.room.id}/'
+        if self.activity_id:
+            return f'/room/activity/{self.activity_id}/'
+        elif self.room_id:
+            return f'/room/{self.room_id}/'
         return '/room/all/'
+
+
+class NotificationFanout(models.Model):
+    AUDIENCES = [
+        ("students", "Room students"),
+        ("pending", "Students without a submission"),
+    ]
+
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='notification_fanouts')
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, null=True, blank=True)
+    audience = models.CharField(max_length=20, choices=AUDIENCES, default="students")
+    event = models.ForeignKey(NotificationEvent, on_delete=models.CASCADE, related_name='fanouts')
+
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ("queued", "Queued"),
+            ("running", "Running"),
+            ("done", "Done"),
+            ("failed", "Failed"),
+        ],
+        default="queued",
+    )
+    last_recipient_id = models.BigIntegerField(default=0)
+    recipients_done = models.PositiveIntegerField(default=0)
+    batch_timings = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Fan-out {self.id} to {self.room.name} ({self.status})"
+
+
+class Notification(models.Model):
+    """
+        one recipient's receipt for a NotificationEvent; the content lives on the event
+    """
+    NOTIFICATION_TYPES = NotificationEvent.NOTIFICATION_TYPES
+    
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    event = models.ForeignKey(NotificationEvent, on_delete=models.CASCADE, related_name='receipts')
+    
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'is_read', 'created_at', 'id']),
+            models.Index(fields=['recipient', 'created_at', 'id']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['is_read', 'created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'recipient'], name='unique_event_recipient'),
+        ]
+    
+    def __str__(self):
+        return f"{self.recipient.username} - {self.title}"
+    
+    @property
+    def notification_type(self):
+        return self.event.notification_type
+    
+    @property
+    def title(self):
+        return self.event.title
+    
+    @property
+    def message(self):
+        return self.event.message
+    
+    @property
+    def room(self):
+        return self.event.room
+    
+    @property
+    def activity(self):
+        return self.event.activity
+    
+    @property
+    def submission(self):
+        return self.event.submission
+    
+    @property
+    def related_user(self):
+        return self.event.related_user
+    
+    def get_icon(self):
+        return self.event.get_icon()
+    
+    def get_url(self):
+        return self.event.get_url()
     
     @classmethod
     def create_notification(cls, recipient, notification_type, title, message, **kwargs):
-        return cls.objects.create(
-            recipient=recipient,
+        from .inbox import record_new_notifications
+        event = NotificationEvent.objects.create(
             notification_type=notification_type,
             title=title,
             message=message,
             **kwargs
-        )
\ No newline at end of file
+        )
+        notification = cls.objects.create(recipient=recipient, event=event)
+        record_new_notifications([notification])
+        return notification
+
+
+class ArchivedNotification(models.Model):
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    notification_type = models.CharField(max_length=30, choices=NotificationEvent.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient.username} - {self.title}"
+
+
+class ActivityReminder(models.Model):
+    KINDS = [
+        ("due_soon", "Due soon"),
+        ("overdue", "Overdue"),
+    ]
+
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='reminders')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    event = models.ForeignKey(NotificationEvent, on_delete=models.SET_NULL, null=True, blank=True)
+    recipients = models.PositiveIntegerField(default=0)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['activity', 'kind'], name='unique_activity_reminder'),
+        ]
+
+    def __str__(self):
+        return f"{self.activity.title} - {self.kind}"
+
+
+class SearchDocument(models.Model):
+    """
+        the searchable text of a room, activity or announcement; room.search keeps it in sync
+        and the database's full-text index is built over it
+    """
+    KINDS = [
+        ("room", "Room"),
+        ("activity", "Activity"),
+        ("announcement", "Announcement"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.PositiveBigIntegerField()
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='search_documents')
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
+
+    def get_url(self):
+        if self.kind == 'activity':
+            return f'/room/activity/{self.object_id}/'
+        if self.kind == 'announcement':
+            return f'/room/announcement/{self.object_id}/'
+        return f'/room/{self.room_id}/'
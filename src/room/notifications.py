@@ -1,18 +1,13 @@
-from .models import Notification
-from user.models import StudentProfile
+from datetime import timedelta
 
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
-def create_student_notifications(students, notification_type, title, message, **kwargs):
-    notifications = []
-    for student in students:
-        notifications.append(Notification(
-            recipient=student,
-            notification_type=notification_type,
-            title=title,
-            message=message,
-            **kwargs
-        ))
-    Notification.objects.bulk_create(notifications)
+from .fanout import queue_room_notifications
+from .inbox import record_collapsed
+from .models import Notification
+from user.models import StudentProfile
 
 
 def create_teacher_notification(teacher_user, notification_type, title, message, **kwargs):
@@ -25,6 +20,43 @@ def create_teacher_notification(teacher_user, notification_type, title, message,
     )
 
 
+def collapse_notification(recipient, notification_type, activity, describe, **fields):
+    """
+        folds a repeat into the recipient's unread notification of the same type and activity
+        from within NOTIFICATION_COLLAPSE_WINDOW seconds; None when there is nothing to fold into
+    """
+    now = timezone.now()
+    window = now - timedelta(seconds=getattr(settings, 'NOTIFICATION_COLLAPSE_WINDOW', 3600))
+    with transaction.atomic():
+        notification = (
+            Notification.objects
+            .select_for_update()
+            .select_related('event')
+            .filter(
+                recipient=recipient,
+                is_read=False,
+                created_at__gte=window,
+                event__notification_type=notification_type,
+                event__activity=activity,
+            )
+            .order_by('-created_at')
+            .first()
+        )
+        if notification is None:
+            return None
+
+        event = notification.event
+        event.count += 1
+        event.title, event.message = describe(event.count)
+        for name, value in fields.items():
+            setattr(event, name, value)
+        event.save(update_fields=['count', 'title', 'message', *fields])
+        notification.created_at = now
+        notification.save(update_fields=['created_at'])
+    record_collapsed(notification)
+    return notification
+
+
 def notify_activity_graded(submission):
     Notification.create_notification(
         recipient=submission.student.user,
@@ -38,25 +70,39 @@ def notify_activity_graded(submission):
 
 
 def notify_new_activity(activity):
-    students = activity.room.students.all()
-    create_student_notifications(
-        students=students,
+    queue_room_notifications(
+        room=activity.room,
         notification_type='new_activity',
         title=f'New Activity: {activity.title}',
         message=f'A new activity has been assigned in {activity.room.name}',
-        room=activity.room,
         activity=activity
     )
 
 
 def notify_student_submission(submission):
+    activity = submission.activity
+    student_name = submission.student.user.get_full_name()
+
+    def describe(count):
+        return (
+            f'{count} New Submissions for {activity.title}',
+            f'Latest from {student_name} in {activity.room.name}',
+        )
+
+    collapsed = collapse_notification(
+        activity.room.teacher.user, 'student_submitted', activity, describe,
+        submission=submission, related_user=submission.student.user
+    )
+    if collapsed is not None:
+        return
+
     create_teacher_notification(
-        teacher_user=submission.activity.room.teacher.user,
+        teacher_user=activity.room.teacher.user,
         notification_type='student_submitted',
-        title=f'New Submission from {submission.student.user.get_full_name()}',
-        message=f'{submission.student.user.get_full_name()} submitted work for "{submission.activity.title}" in {submission.activity.room.name}',
-        room=submission.activity.room,
-        activity=submission.activity,
+        title=f'New Submission from {student_name}',
+        message=f'{student_name} submitted work for "{activity.title}" in {activity.room.name}',
+        room=activity.room,
+        activity=activity,
         submission=submission,
         related_user=submission.student.user
     )
@@ -92,31 +138,39 @@ def notify_student_left(room, student):
         pass
 
 
+def due_soon_content(activity_title, hours_until_due):
+    return (
+        f'Activity Due Soon: {activity_title}',
+        f'"{activity_title}" is due in {hours_until_due} hours. Don\'t forget to submit!',
+    )
+
+
+def overdue_content(activity_title):
+    return (
+        f'Activity Overdue: {activity_title}',
+        f'"{activity_title}" is now overdue. Contact your teacher if you need assistance.',
+    )
+
+
 def notify_activity_due_soon(activity, hours_until_due=24):
-    from .models import Submission
-    submitted_students = Submission.objects.filter(activity=activity).values_list('student__user', flat=True)
-    pending_students = activity.room.students.exclude(id__in=submitted_students)
-    
-    create_student_notifications(
-        students=pending_students,
-        notification_type='activity_due_soon',
-        title=f'Activity Due Soon: {activity.title}',
-        message=f'"{activity.title}" is due in {hours_until_due} hours. Don\'t forget to submit!',
+    title, message = due_soon_content(activity.title, hours_until_due)
+    queue_room_notifications(
         room=activity.room,
-        activity=activity
+        notification_type='activity_due_soon',
+        title=title,
+        message=message,
+        activity=activity,
+        audience='pending'
     )
 
 
 def notify_activity_overdue(activity):
-    from .models import Submission
-    submitted_students = Submission.objects.filter(activity=activity).values_list('student__user', flat=True)
-    pending_students = activity.room.students.exclude(id__in=submitted_students)
-    
-    create_student_notifications(
-        students=pending_students,
-        notification_type='activity_overdue',
-        title=f'Activity Overdue: {activity.title}',
-        message=f'"{activity.title}" is now overdue. Contact your teacher if you need assistance.',
+    title, message = overdue_content(activity.title)
+    queue_room_notifications(
         room=activity.room,
-        activity=activity
+        notification_type='activity_overdue',
+        title=title,
+        message=message,
+        activity=activity,
+        audience='pending'
     )
@@ -0,0 +1,135 @@
+import logging
+import math
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from .inbox import record_new_notifications
+from .models import Activity, ActivityReminder, Notification, NotificationEvent, Submission
+from .notifications import due_soon_content, overdue_content
+
+
+logger = logging.getLogger(__name__)
+
+SweepResult = namedtuple('SweepResult', ['kind', 'activities', 'notifications', 'seconds'])
+
+NOTIFICATION_TYPES = {
+    'due_soon': 'activity_due_soon',
+    'overdue': 'activity_overdue',
+}
+
+
+def reminder_window(kind, now):
+    if kind == 'due_soon':
+        return now, now + timedelta(hours=getattr(settings, 'REMINDER_DUE_SOON_HOURS', 24))
+    return now - timedelta(hours=getattr(settings, 'REMINDER_OVERDUE_LOOKBACK_HOURS', 24)), now
+
+
+def activities_to_remind(kind, now):
+    """
+        activities whose due_date falls in the kind's window and that have no reminder of that kind yet
+    """
+    start, end = reminder_window(kind, now)
+    activities = (
+        Activity.objects
+        .filter(due_date__gt=start, due_date__lte=end)
+        .exclude(Exists(ActivityReminder.objects.filter(activity=OuterRef('pk'), kind=kind)))
+    )
+    if kind == 'due_soon':
+        activities = activities.exclude(status='closed')
+    return activities.order_by('id').values_list('id', 'title', 'room_id', 'due_date')
+
+
+def pending_recipients(activity_ids):
+    """
+        (activity id, user id) for every enrolled student without a submission, in one query
+    """
+    submitted = Submission.objects.filter(activity_id=OuterRef('pk'), student__user_id=OuterRef('user_id'))
+    return (
+        Activity.objects
+        .filter(id__in=activity_ids)
+        .annotate(user_id=F('room__students'))
+        .filter(user_id__isnull=False)
+        .exclude(Exists(submitted))
+        .values_list('id', 'user_id')
+    )
+
+
+def reminder_content(kind, activity_title, due_date, now):
+    if kind == 'due_soon':
+        return due_soon_content(activity_title, max(1, math.ceil((due_date - now).total_seconds() / 3600)))
+    return overdue_content(activity_title)
+
+
+def send_reminder_chunk(kind, activities, now):
+    recipients = {}
+    for activity_id, user_id in pending_recipients([activity[0] for activity in activities]):
+        recipients.setdefault(activity_id, []).append(user_id)
+
+    with transaction.atomic():
+        events = {}
+        for activity_id, title, room_id, due_date in activities:
+            if activity_id in recipients:
+                event_title, message = reminder_content(kind, title, due_date, now)
+                events[activity_id] = NotificationEvent(
+                    notification_type=NOTIFICATION_TYPES[kind],
+                    title=event_title,
+                    message=message,
+                    room_id=room_id,
+                    activity_id=activity_id,
+                )
+        NotificationEvent.objects.bulk_create(events.values())
+
+        notifications = [
+            Notification(recipient_id=user_id, event=event)
+            for activity_id, event in events.items()
+            for user_id in recipients[activity_id]
+        ]
+        Notification.objects.bulk_create(notifications, batch_size=1000)
+        # activities with nobody pending are recorded too, so later sweeps skip them; a concurrent
+        # sweep that got there first trips the unique constraint and rolls this chunk back
+        ActivityReminder.objects.bulk_create([
+            ActivityReminder(
+                activity_id=activity[0],
+                kind=kind,
+                event=events.get(activity[0]),
+                recipients=len(recipients.get(activity[0], ())),
+            )
+            for activity in activities
+        ])
+
+    record_new_notifications(notifications)
+    return len(notifications)
+
+
+def send_reminders(kind, now=None, chunk_size=None):
+    """
+        one sweep of a reminder kind: a window query for the activities, then one pending-recipient
+        query and a handful of bulk inserts per chunk of activities
+    """
+    now = now or timezone.now()
+    chunk_size = chunk_size or getattr(settings, 'REMINDER_CHUNK_SIZE', 1000)
+    started = time.perf_counter()
+    activities = list(activities_to_remind(kind, now))
+
+    sent = 0
+    for index in range(0, len(activities), chunk_size):
+        try:
+            sent += send_reminder_chunk(kind, activities[index:index + chunk_size], now)
+        except IntegrityError:
+            logger.warning("Skipped a chunk of %s reminders already sent by another sweep", kind)
+
+    result = SweepResult(kind, len(activities), sent, round(time.perf_counter() - started, 3))
+    if activities:
+        logger.info("Sent %s %s reminders for %s activities in %.3fs", sent, kind, len(activities), result.seconds)
+    return result
+
+
+def send_all_reminders(now=None, chunk_size=None):
+    now = now or timezone.now()
+    return [send_reminders(kind, now, chunk_size) for kind in NOTIFICATION_TYPES]
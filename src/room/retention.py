@@ -0,0 +1,104 @@
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .inbox import forget_inbox
+from .models import ArchivedNotification, Notification, NotificationEvent, NotificationFanout
+
+
+PruneResult = namedtuple('PruneResult', ['deleted', 'archived', 'events', 'fanouts'])
+
+
+def _batch_size(batch_size):
+    return batch_size or getattr(settings, 'NOTIFICATION_PRUNE_BATCH_SIZE', 1000)
+
+
+def delete_read_notifications(cutoff, batch_size=None):
+    deleted = 0
+    while True:
+        rows = list(
+            Notification.objects
+            .filter(is_read=True, created_at__lt=cutoff)
+            .values_list('id', 'recipient_id')[:_batch_size(batch_size)]
+        )
+        if not rows:
+            return deleted
+        Notification.objects.filter(id__in=[row[0] for row in rows]).delete()
+        forget_inbox({row[1] for row in rows})
+        deleted += len(rows)
+
+
+def archive_unread_notifications(cutoff, batch_size=None):
+    """
+        moves unread receipts past the hard limit into ArchivedNotification, one batch per transaction
+    """
+    archived = 0
+    while True:
+        with transaction.atomic():
+            receipts = list(
+                Notification.objects
+                .filter(is_read=False, created_at__lt=cutoff)
+                .select_related('event')[:_batch_size(batch_size)]
+            )
+            if not receipts:
+                return archived
+            ArchivedNotification.objects.bulk_create([
+                ArchivedNotification(
+                    recipient_id=receipt.recipient_id,
+                    notification_type=receipt.event.notification_type,
+                    title=receipt.event.title,
+                    message=receipt.event.message,
+                    created_at=receipt.created_at,
+                )
+                for receipt in receipts
+            ])
+            Notification.objects.filter(id__in=[receipt.id for receipt in receipts]).delete()
+        forget_inbox({receipt.recipient_id for receipt in receipts})
+        archived += len(receipts)
+
+
+def delete_finished_fanouts(cutoff, batch_size=None):
+    deleted = 0
+    while True:
+        ids = list(
+            NotificationFanout.objects
+            .filter(status='done', finished_at__lt=cutoff)
+            .values_list('id', flat=True)[:_batch_size(batch_size)]
+        )
+        if not ids:
+            return deleted
+        NotificationFanout.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+def delete_orphan_events(cutoff, batch_size=None):
+    deleted = 0
+    while True:
+        ids = list(
+            NotificationEvent.objects
+            .filter(created_at__lt=cutoff, receipts__isnull=True, fanouts__isnull=True)
+            .values_list('id', flat=True)[:_batch_size(batch_size)]
+        )
+        if not ids:
+            return deleted
+        NotificationEvent.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+def prune_notifications(now=None, batch_size=None):
+    """
+        deletes read notifications after NOTIFICATION_READ_RETENTION_DAYS and archives unread
+        ones after NOTIFICATION_UNREAD_RETENTION_DAYS, then drops events nobody holds any more
+    """
+    now = now or timezone.now()
+    read_cutoff = now - timedelta(days=getattr(settings, 'NOTIFICATION_READ_RETENTION_DAYS', 30))
+    unread_cutoff = now - timedelta(days=getattr(settings, 'NOTIFICATION_UNREAD_RETENTION_DAYS', 180))
+
+    deleted = delete_read_notifications(read_cutoff, batch_size)
+    archived = archive_unread_notifications(unread_cutoff, batch_size)
+    fanouts = delete_finished_fanouts(read_cutoff, batch_size)
+    events = delete_orphan_events(read_cutoff, batch_size)
+    return PruneResult(deleted, archived, events, fanouts)
@@ -0,0 +1,110 @@
+import heapq
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import Activity
+
+
+logger = logging.getLogger(__name__)
+
+
+class DueDateScheduler:
+    """
+        closes activities as their due_date passes, using a min-heap of (due_date, activity id)
+    """
+
+    def __init__(self, reload_interval=300):
+        self.reload_interval = reload_interval
+        self._heap = []
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def load(self):
+        upcoming = (
+            Activity.objects
+            .filter(due_date__isnull=False)
+            .exclude(status='closed')
+            .values_list('due_date', 'id')
+        )
+        with self._condition:
+            self._heap = list(upcoming)
+            heapq.heapify(self._heap)
+            self._condition.notify()
+
+    def schedule(self, activity_id, due_date):
+        if due_date is None:
+            return
+        with self._condition:
+            heapq.heappush(self._heap, (due_date, activity_id))
+            self._condition.notify()
+
+    def next_due(self):
+        with self._condition:
+            return self._heap[0][0] if self._heap else None
+
+    def run_pending(self, now=None):
+        now = now or timezone.now()
+        due_ids = []
+        with self._condition:
+            while self._heap and self._heap[0][0] < now:
+                due_ids.append(heapq.heappop(self._heap)[1])
+        if not due_ids:
+            return 0
+        # stale entries (rescheduled or deleted activities) are filtered out by the query itself
+        return Activity.close_past_due_bulk(activity_ids=due_ids)
+
+    def run_forever(self):
+        self.load()
+        last_load = timezone.now()
+        while not self._stopping:
+            try:
+                closed = self.run_pending()
+                if closed:
+                    logger.info("Closed %s past-due activities", closed)
+                if (timezone.now() - last_load).total_seconds() >= self.reload_interval:
+                    self.load()
+                    last_load = timezone.now()
+            except Exception:
+                logger.exception("Due-date scheduler iteration failed")
+            finally:
+                close_old_connections()
+
+            with self._condition:
+                if self._stopping:
+                    break
+                timeout = self.reload_interval
+                if self._heap:
+                    until_due = (self._heap[0][0] - timezone.now()).total_seconds()
+                    timeout = max(0, min(timeout, until_due))
+                self._condition.wait(timeout)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run_forever, name='activity-due-date-closer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+
+scheduler = DueDateScheduler(reload_interval=getattr(settings, 'ACTIVITY_CLOSER_RELOAD_INTERVAL', 300))
+
+
+def start_scheduler():
+    if getattr(settings, 'ACTIVITY_CLOSER_WORKER', False):
+        scheduler.start()
@@ -0,0 +1,171 @@
+import re
+
+from django.db import connection
+
+from .access import get_room_access
+from .models import Room, Activity, Announcement, SearchDocument
+
+
+FTS_TABLE = 'room_searchdocument_fts'
+# must match the expression of the room_searchdocument_tsv index for PostgreSQL to use it
+TSVECTOR = "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')"
+MAX_TERMS = 8
+# words in nearly every document cost a full posting-list read and add nothing to the ranking
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is',
+    'it', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'with',
+}
+KINDS = {
+    Room: 'room',
+    Activity: 'activity',
+    Announcement: 'announcement',
+}
+
+
+def document_fields(instance):
+    """
+        (kind, room id, title, body) of an indexed object
+    """
+    kind = KINDS[type(instance)]
+    if kind == 'room':
+        return kind, instance.id, instance.name, f'{instance.room_code} {instance.description or ""}'
+    if kind == 'activity':
+        return kind, instance.room_id, instance.title, instance.description or ''
+    return kind, instance.room_id, instance.title, instance.content or ''
+
+
+def build_document(instance):
+    kind, room_id, title, body = document_fields(instance)
+    return SearchDocument(kind=kind, object_id=instance.id, room_id=room_id, title=title[:255], body=body)
+
+
+def index_object(instance):
+    kind, room_id, title, body = document_fields(instance)
+    SearchDocument.objects.update_or_create(
+        kind=kind, object_id=instance.id, defaults={'room_id': room_id, 'title': title[:255], 'body': body}
+    )
+
+
+def remove_object(instance):
+    SearchDocument.objects.filter(kind=KINDS[type(instance)], object_id=instance.id).delete()
+
+
+def rebuild_index(batch_size=1000):
+    """
+        drops every document and re-indexes all rooms, activities and announcements
+    """
+    SearchDocument.objects.all().delete()
+    indexed = 0
+    for model in KINDS:
+        batch = []
+        for instance in model.objects.order_by('id').iterator(chunk_size=batch_size):
+            batch.append(build_document(instance))
+            if len(batch) >= batch_size:
+                SearchDocument.objects.bulk_create(batch)
+                indexed += len(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+        indexed += len(batch)
+    return indexed
+
+
+def search_terms(q):
+    terms = re.findall(r'\w+', (q or '').lower())
+    return ([term for term in terms if term not in STOP_WORDS] or terms)[:MAX_TERMS]
+
+
+def _sqlite_match(terms, room_ids, kinds):
+    # room ids are indexed as r<id> tokens so the permission filter runs inside the FTS index
+    match = '{title body} : (%s) AND rooms : (%s)' % (
+        ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*']),
+        ' OR '.join(f'r{room_id}' for room_id in room_ids),
+    )
+    if kinds:
+        match += ' AND kind : (%s)' % ' OR '.join(kinds)
+    return match
+
+
+def _postgres_query(terms):
+    return ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+
+
+def _sqlite_matches(terms, room_ids, kinds, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, bm25({FTS_TABLE}, 10.0, 1.0, 0.0, 0.0) AS score FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s ORDER BY score LIMIT %s',
+            [_sqlite_match(terms, room_ids, kinds), limit],
+        )
+        # bm25 is lower for better matches
+        return [(document_id, -score) for document_id, score in cursor.fetchall()]
+
+
+def _postgres_matches(terms, room_ids, kinds, limit):
+    kind_clause = 'AND kind = ANY(%s)' if kinds else ''
+    params = [_postgres_query(terms), list(room_ids)] + ([list(kinds)] if kinds else []) + [limit]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id, ts_rank({TSVECTOR}, query) AS score '
+            f"FROM room_searchdocument, to_tsquery('english', %s) query "
+            f'WHERE ({TSVECTOR}) @@ query AND room_id = ANY(%s) {kind_clause} '
+            f'ORDER BY score DESC LIMIT %s',
+            params,
+        )
+        return cursor.fetchall()
+
+
+def visible_room_ids(user):
+    access = get_room_access(user)
+    return sorted(access.taught | access.enrolled)
+
+
+def matching_room_ids(user, q):
+    """
+        ids of the user's rooms with at least one matching document, however many documents match
+    """
+    room_ids = visible_room_ids(user)
+    terms = search_terms(q)
+    if not terms or not room_ids:
+        return set()
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"SELECT DISTINCT room_id FROM room_searchdocument, to_tsquery('english', %s) query "
+                f'WHERE ({TSVECTOR}) @@ query AND room_id = ANY(%s)',
+                [_postgres_query(terms), room_ids],
+            )
+        else:
+            # the FTS table is contentless, so the room id comes from the document row
+            cursor.execute(
+                f'SELECT DISTINCT d.room_id FROM {FTS_TABLE} JOIN room_searchdocument d ON d.id = {FTS_TABLE}.rowid '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [_sqlite_match(terms, room_ids, [])],
+            )
+        return {room_id for room_id, in cursor.fetchall()}
+
+
+def search(user, q, kinds=None, limit=20):
+    """
+        ranked SearchDocuments in rooms the user teaches or is enrolled in, best first,
+        each with a rank attribute; the last term matches as a prefix, as the user is typing it
+    """
+    room_ids = visible_room_ids(user)
+    terms = search_terms(q)
+    kinds = [kind for kind in (kinds or []) if kind in KINDS.values()]
+    if not terms or not room_ids:
+        return []
+
+    if connection.vendor == 'postgresql':
+        matches = _postgres_matches(terms, room_ids, kinds, limit)
+    else:
+        matches = _sqlite_matches(terms, room_ids, kinds, limit)
+
+    documents = SearchDocument.objects.select_related('room').in_bulk([document_id for document_id, _ in matches])
+    results = []
+    for document_id, rank in matches:
+        document = documents.get(document_id)
+        if document is not None:
+            document.rank = rank
+            results.append(document)
+    return results
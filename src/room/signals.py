@@ -0,0 +1,173 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from core.delivery import forget_validators
+from user.models import StudentProfile, TeacherProfile
+from core.images import forget_derivative_urls
+from .models import Room, Activity, Announcement, Submission, RoomStudentStanding
+from .fragments import touch_room, touch_rooms
+from .gradebook import refresh_room_standings, refresh_standing
+from .storage import retain_blob, release_blob
+from .access import invalidate_room_access
+from .search import index_object, remove_object
+
+
+@receiver([post_save, post_delete], sender=Activity)
+@receiver([post_save, post_delete], sender=Announcement)
+def touch_room_on_content_change(sender, instance, **kwargs):
+    touch_room(instance.room_id)
+
+
+@receiver([post_save, post_delete], sender=Submission)
+def touch_room_on_submission_change(sender, instance, **kwargs):
+    Room.objects.filter(activities__id=instance.activity_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=StudentProfile)
+def touch_rooms_on_student_change(sender, instance, created, update_fields=None, **kwargs):
+    # names, student ids and courses are part of the gradebook and its exports
+    if created or set(update_fields or ()) == {'last_login'}:
+        return
+    user_id = instance.id if sender is User else instance.user_id
+    touch_rooms(Room.students.through.objects.filter(user_id=user_id).values_list('room_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Activity)
+def forget_resource_validators(sender, instance, **kwargs):
+    forget_validators(instance.resource_file.name)
+    forget_derivative_urls(instance.resource_file.name)
+
+
+@receiver([post_save, post_delete], sender=Submission)
+def forget_submission_file_validators(sender, instance, **kwargs):
+    forget_validators(instance.submission_file.name)
+    forget_derivative_urls(instance.submission_file.name)
+
+
+def sync_blob_references(instance, field_file):
+    loaded = getattr(instance, '_loaded_file_name', None)
+    loaded = getattr(loaded, 'name', loaded) or ''
+    current = field_file.name or ''
+    if current != loaded:
+        retain_blob(current)
+        release_blob(loaded)
+    instance._loaded_file_name = current
+
+
+@receiver(post_save, sender=Activity)
+def sync_resource_blob(sender, instance, **kwargs):
+    sync_blob_references(instance, instance.resource_file)
+
+
+@receiver(post_save, sender=Submission)
+def sync_submission_blob(sender, instance, **kwargs):
+    sync_blob_references(instance, instance.submission_file)
+
+
+@receiver(post_delete, sender=Activity)
+def release_resource_blob(sender, instance, **kwargs):
+    release_blob(instance.resource_file.name)
+
+
+@receiver(post_delete, sender=Submission)
+def release_submission_blob(sender, instance, **kwargs):
+    release_blob(instance.submission_file.name)
+
+
+@receiver(m2m_changed, sender=Room.students.through)
+def touch_room_on_enrollment_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        touch_rooms(pk_set or [])
+    else:
+        touch_room(instance.id)
+
+
+@receiver(m2m_changed, sender=Room.students.through)
+def invalidate_access_on_enrollment_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_student_ids = list(instance.students.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        invalidate_room_access([instance.id])
+    elif action == 'post_clear':
+        invalidate_room_access(getattr(instance, '_cleared_student_ids', []))
+    else:
+        invalidate_room_access(pk_set or [])
+
+
+@receiver(post_save, sender=Room)
+def invalidate_access_on_room_teacher_change(sender, instance, created, **kwargs):
+    loaded_teacher_id = getattr(instance, '_loaded_teacher_id', None)
+    if created:
+        invalidate_room_access([instance.teacher.user_id])
+    elif loaded_teacher_id is not None and loaded_teacher_id != instance.teacher_id:
+        invalidate_room_access(TeacherProfile.objects.filter(
+            id__in=[loaded_teacher_id, instance.teacher_id]
+        ).values_list('user_id', flat=True))
+    instance._loaded_teacher_id = instance.teacher_id
+
+
+@receiver(pre_delete, sender=Room)
+def collect_room_members(sender, instance, **kwargs):
+    instance._member_ids = [instance.teacher.user_id] + list(instance.students.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Room)
+def invalidate_access_on_room_delete(sender, instance, **kwargs):
+    invalidate_room_access(getattr(instance, '_member_ids', []))
+
+
+@receiver(post_save, sender=Activity)
+def schedule_activity_due_date(sender, instance, **kwargs):
+    from .scheduler import scheduler
+    if scheduler.running and instance.status != 'closed':
+        scheduler.schedule(instance.id, instance.due_date)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_save, sender=Activity)
+@receiver(post_save, sender=Announcement)
+def index_search_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_object(instance)
+
+
+@receiver(post_delete, sender=Activity)
+@receiver(post_delete, sender=Announcement)
+def remove_search_document(sender, instance, **kwargs):
+    remove_object(instance)
+
+
+@receiver(post_delete, sender=Activity)
+def refresh_standings_on_activity_delete(sender, instance, origin=None, **kwargs):
+    # a deleted room takes its standings with it
+    if isinstance(origin, Room):
+        return
+    room = Room.objects.filter(id=instance.room_id).first()
+    if room is not None:
+        refresh_room_standings(room)
+
+
+@receiver(m2m_changed, sender=Room.students.through)
+def sync_standings_on_enrollment_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+        enrollments from the views, the admin or the shell all create and drop standings here
+    """
+    if action == 'post_add':
+        if reverse:
+            pairs = [(room, instance) for room in Room.objects.filter(id__in=pk_set)]
+        else:
+            pairs = [(instance, student) for student in User.objects.filter(id__in=pk_set)]
+        for room, student in pairs:
+            refresh_standing(room, student, create=True)
+    elif action in ('post_remove', 'post_clear'):
+        standings = RoomStudentStanding.objects.filter(**{'student' if reverse else 'room': instance})
+        if action == 'post_remove':
+            standings = standings.filter(**{'room_id__in' if reverse else 'student_id__in': pk_set})
+        standings.delete()
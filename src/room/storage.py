@@ -0,0 +1,271 @@
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.images import delete_derivatives
+
+
+BLOB_PREFIX = 'blobs'
+BLOB_NAME_RE = re.compile(rf'^{BLOB_PREFIX}/([0-9a-f]{{2}})/([0-9a-f]{{2}})/([0-9a-f]{{64}})/[^/]+$')
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+HASH_CHUNK_SIZE = 64 * 1024
+TOMBSTONE_SUFFIX = '.collected'
+
+
+def blob_digest(name):
+    match = BLOB_NAME_RE.match(name or '')
+    return match.group(3) if match else None
+
+
+def blob_relative_path(digest):
+    return f'{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+        uploads are hashed while they are written and kept once per digest;
+        names look like blobs/ab/cd/<sha256>/<original filename> so the
+        basename shown to users is unchanged. Legacy names resolve as usual.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        """
+            names never collide, but the blob prefix counts towards max_length, so long basenames are shortened
+        """
+        if max_length is None:
+            return name
+        directory, basename = os.path.split(name)
+        budget = max_length - len(blob_relative_path('0' * 64)) - 1
+        if len(basename) > budget:
+            root, ext = os.path.splitext(basename)
+            root = root[:budget - len(ext)]
+            if not root:
+                raise SuspiciousFileOperation(
+                    f'Storage can not fit "{name}" into a blob name. Please make sure that the corresponding '
+                    f'file field allows sufficient "max_length".'
+                )
+            basename = root + ext
+        return os.path.join(directory, basename)
+
+    def content_digest(self, name):
+        """
+            the sha256 of a blob's content, read from its name; None for legacy names
+        """
+        return blob_digest(name)
+
+    def path(self, name):
+        digest = blob_digest(name)
+        if digest is not None:
+            name = blob_relative_path(digest)
+        return super().path(name)
+
+    def _save(self, name, content):
+        temp_dir = os.path.join(self.location, BLOB_PREFIX, 'tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        descriptor, temp_path = tempfile.mkstemp(dir=temp_dir, suffix='.part')
+        try:
+            with os.fdopen(descriptor, 'wb') as fileobj:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(HASH_CHUNK_SIZE):
+                    digest.update(chunk)
+                    fileobj.write(chunk)
+                    size += len(chunk)
+
+            hexdigest = digest.hexdigest()
+            from .models import ContentBlob
+            ContentBlob.objects.update_or_create(
+                digest=hexdigest,
+                defaults={'size': size, 'last_used_at': timezone.now()},
+            )
+
+            blob_path = super().path(blob_relative_path(hexdigest))
+            try:
+                # touching the blob keeps collect_orphan_files away from a file this upload now relies on;
+                # if the collector has already moved it aside, this upload writes its own copy
+                os.utime(blob_path)
+                os.remove(temp_path)
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                os.replace(temp_path, blob_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return f'{blob_relative_path(hexdigest)}/{os.path.basename(name)}'
+
+    def delete(self, name):
+        """
+            blobs are shared, so only reference counting may remove them
+        """
+        if blob_digest(name) is None:
+            delete_derivatives(self.path(name))
+            super().delete(name)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def get_content_storage():
+    return content_storage
+
+
+def retain_blob(name):
+    digest = blob_digest(name)
+    if digest is not None:
+        from .models import ContentBlob
+        ContentBlob.objects.filter(digest=digest).update(ref_count=F('ref_count') + 1, last_used_at=timezone.now())
+
+
+def release_blob(name):
+    digest = blob_digest(name)
+    if digest is None:
+        return
+    from .models import ContentBlob
+    ContentBlob.objects.filter(digest=digest, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    transaction.on_commit(lambda: collect_blobs([digest]))
+
+
+def collect_blobs(digests=None):
+    """
+        removes unreferenced blobs that have not been uploaded again within the grace period
+    """
+    from .models import ContentBlob
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'BLOB_GC_GRACE_SECONDS', 3600))
+    unreferenced = ContentBlob.objects.filter(ref_count=0, last_used_at__lt=cutoff)
+    if digests is not None:
+        unreferenced = unreferenced.filter(digest__in=digests)
+
+    collected = 0
+    for digest in list(unreferenced.values_list('digest', flat=True)):
+        path = content_storage.path(blob_relative_path(digest))
+        with transaction.atomic():
+            # an upload of the same digest refreshes this row before it looks for the file,
+            # so it either waits for this lock or has already made the blob ineligible
+            blob = (
+                ContentBlob.objects.select_for_update()
+                .filter(digest=digest, ref_count=0, last_used_at__lt=cutoff)
+                .first()
+            )
+            if blob is None:
+                continue
+            blob.delete()
+            tombstone = bury(path)
+        delete_derivatives(path)
+        if tombstone is not None:
+            os.remove(tombstone)
+        collected += 1
+    if digests is None:
+        collected += collect_orphan_files(cutoff)
+    return collected
+
+
+def collect_orphan_files(cutoff, batch_size=1000):
+    """
+        blob files whose ContentBlob row never committed, because the upload's transaction
+        rolled back, once they are older than the cutoff
+    """
+    from .models import ContentBlob
+    root = content_storage.path(BLOB_PREFIX)
+    candidates = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.getmtime(path) >= cutoff.timestamp():
+                continue
+            if DIGEST_RE.match(name):
+                candidates[name] = path
+            elif name.endswith(TOMBSTONE_SUFFIX):
+                # left behind by a collector that died between moving and removing a blob
+                os.remove(path)
+
+    digests = list(candidates)
+    collected = 0
+    for index in range(0, len(digests), batch_size):
+        batch = digests[index:index + batch_size]
+        known = set(ContentBlob.objects.filter(digest__in=batch).values_list('digest', flat=True))
+        for digest in batch:
+            if digest in known:
+                continue
+            path = candidates[digest]
+            tombstone = bury(path)
+            if tombstone is None:
+                continue
+            if os.path.getmtime(tombstone) >= cutoff.timestamp():
+                # an upload touched it after the scan; put it back, identical content if one rewrote it
+                os.replace(tombstone, path)
+                continue
+            delete_derivatives(path)
+            os.remove(tombstone)
+            collected += 1
+    return collected
+
+
+def bury(path):
+    """
+        moves a blob aside in one rename, so an upload either touched it first or finds it gone;
+        None when it was already gone
+    """
+    tombstone = f'{path}.{uuid.uuid4().hex}{TOMBSTONE_SUFFIX}'
+    try:
+        os.replace(path, tombstone)
+    except FileNotFoundError:
+        return None
+    return tombstone
+
+
+def recount_blobs():
+    """
+        rebuilds every ref_count from the Activity and Submission rows
+    """
+    from collections import Counter
+    from .models import Activity, Submission, ContentBlob
+
+    counts = Counter()
+    for name in Activity.objects.exclude(resource_file='').values_list('resource_file', flat=True).iterator():
+        counts[blob_digest(name)] += 1
+    for name in Submission.objects.exclude(submission_file='').values_list('submission_file', flat=True).iterator():
+        counts[blob_digest(name)] += 1
+    counts.pop(None, None)
+
+    blobs = list(ContentBlob.objects.all())
+    for blob in blobs:
+        blob.ref_count = counts.get(blob.digest, 0)
+    ContentBlob.objects.bulk_update(blobs, ['ref_count'], batch_size=1000)
+    return len(blobs)
+
+
+def import_legacy_files():
+    """
+        moves files stored under their upload_to paths into the blob store
+    """
+    from .models import Activity, Submission
+
+    imported = 0
+    for model, field_name in ((Activity, 'resource_file'), (Submission, 'submission_file')):
+        rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        for pk, name in rows.values_list('pk', field_name).iterator():
+            if blob_digest(name) is not None or not content_storage.exists(name):
+                continue
+            with transaction.atomic():
+                with content_storage.open(name, 'rb') as fileobj:
+                    blob_name = content_storage.save(name, fileobj)
+                model.objects.filter(pk=pk).update(**{field_name: blob_name})
+                retain_blob(blob_name)
+            content_storage.delete(name)
+            imported += 1
+    return imported
@@ -0,0 +1,79 @@
+import os
+
+from django.utils import timezone
+
+from .models import Submission, SubmissionArchiveDownload
+from .utils.zipstream import stream_zip, unique_arcname
+
+
+ARCHIVE_FILTERS = ('all', 'ungraded', 'new')
+
+
+def archive_submissions(activity, user, archive_filter='all'):
+    """
+        the submissions to pack; "new" means submitted after this user's last archive download
+    """
+    submissions = (
+        Submission.objects
+        .filter(activity=activity)
+        .exclude(submission_file='')
+        .exclude(submission_file__isnull=True)
+        .select_related('student__user')
+        .order_by('student__user__last_name', 'student__user__first_name', 'id')
+    )
+    if archive_filter == 'ungraded':
+        submissions = submissions.filter(score__isnull=True)
+    elif archive_filter == 'new':
+        last_download = (
+            SubmissionArchiveDownload.objects
+            .filter(activity=activity, downloaded_by=user)
+            .values_list('downloaded_at', flat=True)
+            .first()
+        )
+        if last_download is not None:
+            submissions = submissions.filter(submitted_at__gt=last_download)
+    return submissions
+
+
+def record_archive_download(activity, user, downloaded_at=None):
+    SubmissionArchiveDownload.objects.update_or_create(
+        activity=activity,
+        downloaded_by=user,
+        defaults={'downloaded_at': downloaded_at or timezone.now()},
+    )
+
+
+def submission_arcname(submission):
+    user = submission.student.user
+    student_name = f'{user.last_name}, {user.first_name}'.strip(', ') or user.username
+    return f'{student_name} ({submission.student.student_id}) - {os.path.basename(submission.submission_file.name)}'
+
+
+def _storage_opener(storage, name):
+    return lambda: storage.open(name, 'rb')
+
+
+def submission_entries(submissions):
+    used_names = set()
+    for submission in submissions.iterator(chunk_size=500):
+        name = submission.submission_file.name
+        storage = submission.submission_file.storage
+        if not storage.exists(name):
+            continue
+        date_time = timezone.localtime(submission.submitted_at).timetuple()[:6]
+        yield unique_arcname(submission_arcname(submission), used_names), _storage_opener(storage, name), date_time
+
+
+def stream_submission_archive(submissions, on_complete=None):
+    """
+        on_complete runs once the last chunk has been handed over, so an aborted
+        or failed download is never counted
+    """
+    yield from stream_zip(submission_entries(submissions))
+    if on_complete is not None:
+        on_complete()
+
+
+def submission_archive_filename(activity, archive_filter='all'):
+    suffix = '' if archive_filter == 'all' else f' ({archive_filter})'
+    return f'{activity.room.name} - {activity.title} - submissions{suffix}.zip'
@@ -0,0 +1,22 @@
+from django import template
+from django.urls import reverse
+
+from core.images import derivative_url, is_raster_image
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(obj, size='thumb'):
+    """
+        resized image URL for an activity resource or a submission file
+    """
+    if hasattr(obj, 'submission_file'):
+        field_file = obj.submission_file
+        base_url = reverse('serve_submission_file', kwargs={'submission_id': obj.id})
+    else:
+        field_file = obj.resource_file
+        base_url = reverse('serve_activity_resource', kwargs={'activity_id': obj.id})
+    if not field_file or not is_raster_image(field_file.name):
+        return base_url
+    return derivative_url(base_url, field_file.storage, field_file.name, size)
@@ -1 +1,1798 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import zipfile
+import tracemalloc
+from decimal import Decimal
+from io import BytesIO, StringIO
+from random import Random
+from unittest import skipUnless
+from unittest.mock import patch
+
+import openpyxl
+from PIL import Image
+from asgiref.sync import sync_to_async
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+
+from user.models import StudentProfile, TeacherProfile, Course, YearLevel
+from .models import Room, Activity, Submission, RoomStudentStanding, ExportJob, ContentBlob, SubmissionArchiveDownload, ChunkedUpload, Notification, NotificationEvent, NotificationFanout, ArchivedNotification, ActivityReminder, Announcement, SearchDocument
+from .gradebook import build_students_with_grades, refresh_standing, rebuild_standings
+from .exports import GradebookExport
+from .export_jobs import create_export_job, get_room_artifact, open_room_artifact
+from .fragments import fragment_cache
+from .scheduler import DueDateScheduler
+from .access import RoomAccess, access_cache_key, can_teach_room, invalidate_room_access, is_enrolled
+from .inbox import get_unread_count, get_recent_notifications
+from .notifications import notify_student_submission
+from .retention import prune_notifications
+from .reminders import send_all_reminders, send_reminders
+from .search import search
+from .fanout import queue_room_notifications, resume_fanouts, run_fanout
+from .live import DatabaseRelay, hub, stream_notifications
+from .context_processors import notification_context
+from core.delivery import validator_cache
+from core.images import derivative_url_cache
+from core.templatetags.images import avatar_url
+from .templatetags.room_images import thumbnail_url
+from .storage import blob_relative_path, bury, collect_blobs, content_storage, import_legacy_files
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+
+def make_teacher(username='teacher'):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com')
+    TeacherProfile.objects.create(user=user, years_of_exp='5')
+    return user
+
+
+def make_student(username):
+    user = User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        first_name=username.title(),
+        last_name='Student',
+    )
+    StudentProfile.objects.create(user=user, student_id=username[:15])
+    return user
+
+
+class RoomTeacherViewQueryTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher, base_passing=60)
+        fragment_cache.clear()
+        self.activities = [
+            Activity.objects.create(room=self.room, title=f'Lab {i}', total_marks=10)
+            for i in range(3)
+        ]
+        self.student_count = 0
+
+    def add_students(self, count):
+        for _ in range(count):
+            self.student_count += 1
+            student = make_student(f'student{self.student_count}')
+            self.room.students.add(student)
+            for activity in self.activities[:2]:
+                Submission.objects.create(activity=activity, student=student.student, score=7)
+            Submission.objects.create(activity=self.activities[2], student=student.student)
+            refresh_standing(self.room, student, create=True)
+
+    def count_room_view_queries(self):
+        cache.clear()
+        self.client.force_login(self.teacher)
+        url = reverse('room', kwargs={'room_id': self.room.id})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_class_size(self):
+        self.add_students(2)
+        small_room_queries = self.count_room_view_queries()
+
+        self.add_students(20)
+        large_room_queries = self.count_room_view_queries()
+
+        self.assertEqual(small_room_queries, large_room_queries)
+
+    def test_students_with_grades_totals(self):
+        self.add_students(2)
+        outsider = make_student('outsider')
+        Submission.objects.create(activity=self.activities[0], student=outsider.student, score=10)
+        unsubmitted = make_student('unsubmitted')
+        self.room.students.add(unsubmitted)
+        refresh_standing(self.room, unsubmitted, create=True)
+
+        rows = {row['id']: row for row in build_students_with_grades(self.room)}
+
+        self.assertEqual(len(rows), 3)
+        self.assertNotIn(outsider.id, rows)
+
+        graded = rows[User.objects.get(username='student1').id]
+        self.assertEqual(graded['total_score'], 14)
+        self.assertEqual(graded['total_possible'], 20)
+        self.assertEqual(graded['submissions_count'], 3)
+        self.assertEqual(graded['graded_submissions'], 2)
+        self.assertEqual(graded['grade'], 70.0)
+
+        empty = rows[unsubmitted.id]
+        self.assertEqual(empty['grade'], 0)
+        self.assertEqual(empty['submissions_count'], 0)
+
+
+class RoomStudentStandingTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.room = Room.objects.create(name='Chemistry', teacher=self.teacher.teacher, base_passing=60)
+        self.activity = Activity.objects.create(room=self.room, title='Quiz 1', total_marks=20)
+        self.student = make_student('alice')
+
+    def get_standing(self):
+        return RoomStudentStanding.objects.get(room=self.room, student=self.student)
+
+    def test_enroll_grade_and_unenroll_maintain_standing(self):
+        self.client.force_login(self.student)
+        self.client.post(reverse('enroll_student'), {'code': self.room.room_code})
+        self.assertEqual(self.get_standing().submission_count, 0)
+
+        submission = Submission.objects.create(activity=self.activity, student=self.student.student)
+        refresh_standing(self.room, self.student)
+        self.assertEqual(self.get_standing().submission_count, 1)
+        self.assertEqual(self.get_standing().graded_count, 0)
+
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('grade_submission'), {'submission_id': submission.id, 'score': 15})
+        standing = self.get_standing()
+        self.assertEqual((standing.scored_sum, standing.possible_sum, standing.graded_count), (15, 20, 1))
+        self.assertEqual(standing.percent, 75.0)
+        self.assertEqual(standing.grade, 2.0)
+
+        self.client.post(reverse('kick_student'), {'room_id': self.room.id, 'student_id': self.student.id})
+        self.assertFalse(RoomStudentStanding.objects.filter(room=self.room).exists())
+
+    def test_base_passing_and_total_marks_changes_regrade(self):
+        self.room.students.add(self.student)
+        Submission.objects.create(activity=self.activity, student=self.student.student, score=15)
+        refresh_standing(self.room, self.student, create=True)
+
+        room = Room.objects.get(id=self.room.id)
+        room.base_passing = 75
+        room.save()
+        self.assertEqual(self.get_standing().grade, 3.0)
+
+        activity = Activity.objects.get(id=self.activity.id)
+        activity.total_marks = 15
+        activity.save()
+        standing = self.get_standing()
+        self.assertEqual((standing.possible_sum, standing.percent), (15, 100.0))
+
+    def test_equal_decimal_total_marks_is_not_a_regrade(self):
+        activity = Activity.objects.get(id=self.activity.id)
+        activity.total_marks = Decimal('20.00')
+        with patch('room.gradebook.refresh_room_standings') as refresh:
+            activity.save()
+        refresh.assert_not_called()
+
+        activity = Activity.objects.get(id=self.activity.id)
+        activity.total_marks = Decimal('25')
+        with patch('room.gradebook.refresh_room_standings') as refresh:
+            activity.save()
+        refresh.assert_called_once()
+
+    def test_activity_delete_and_roster_edits_maintain_standing(self):
+        self.room.students.add(self.student)
+        self.assertEqual(self.get_standing().possible_sum, 0)
+        Submission.objects.create(activity=self.activity, student=self.student.student, score=15)
+        refresh_standing(self.room, self.student)
+        self.assertEqual(self.get_standing().possible_sum, 20)
+
+        self.activity.delete()
+        self.assertEqual((self.get_standing().possible_sum, self.get_standing().graded_count), (0, 0))
+
+        self.student.students.remove(self.room)
+        self.assertFalse(RoomStudentStanding.objects.filter(room=self.room).exists())
+        self.student.students.add(self.room)
+        self.assertTrue(RoomStudentStanding.objects.filter(room=self.room).exists())
+        self.room.students.clear()
+        self.assertFalse(RoomStudentStanding.objects.filter(room=self.room).exists())
+
+    def test_rebuild_standings_command(self):
+        self.room.students.add(self.student)
+        Submission.objects.create(activity=self.activity, student=self.student.student, score=10)
+
+        call_command('rebuild_standings', stdout=StringIO())
+
+        standing = self.get_standing()
+        self.assertEqual((standing.scored_sum, standing.possible_sum, standing.percent), (10, 20, 50.0))
+
+
+class RoomFragmentCacheTests(TestCase):
+    def setUp(self):
+        fragment_cache.clear()
+        self.teacher = make_teacher()
+        self.room = Room.objects.create(name='Biology', teacher=self.teacher.teacher)
+        self.activity = Activity.objects.create(room=self.room, title='Essay', total_marks=10)
+        self.student = make_student('bob')
+        self.room.students.add(self.student)
+        refresh_standing(self.room, self.student, create=True)
+        self.url = reverse('room', kwargs={'room_id': self.room.id})
+
+    def get_room_page(self, user):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_hit_skips_queries_and_rendering(self):
+        first, miss_queries = self.get_room_page(self.teacher)
+        second, hit_queries = self.get_room_page(self.teacher)
+
+        self.assertLess(hit_queries, miss_queries)
+        self.assertEqual(fragment_cache.hits, 1)
+        self.assertEqual(fragment_cache.misses, 1)
+        self.assertContains(second, 'Essay')
+        self.assertContains(second, 'bob@example.com')
+
+    def test_grading_bumps_room_version(self):
+        submission = Submission.objects.create(activity=self.activity, student=self.student.student)
+        self.get_room_page(self.teacher)
+
+        self.client.post(reverse('grade_submission'), {'submission_id': submission.id, 'score': 9})
+        response, _ = self.get_room_page(self.teacher)
+
+        self.assertEqual(fragment_cache.hits, 0)
+        self.assertContains(response, '90.0%')
+
+    def test_student_fragments_are_per_student(self):
+        other = make_student('carol')
+        self.room.students.add(other)
+        Submission.objects.create(activity=self.activity, student=self.student.student)
+
+        self.get_room_page(self.student)
+        response, _ = self.get_room_page(other)
+
+        self.assertEqual(fragment_cache.hits, 0)
+        self.assertContains(response, 'Not Submitted')
+
+
+class DueDateClosingTests(TestCase):
+    def setUp(self):
+        fragment_cache.clear()
+        self.teacher = make_teacher()
+        self.room = Room.objects.create(name='History', teacher=self.teacher.teacher)
+        self.past_due = Activity.objects.create(
+            room=self.room, title='Late Essay', total_marks=10, due_date=timezone.now() - timedelta(hours=1)
+        )
+        self.upcoming = Activity.objects.create(
+            room=self.room, title='Next Essay', total_marks=10, due_date=timezone.now() + timedelta(days=1)
+        )
+
+    def test_page_views_do_not_write(self):
+        self.client.force_login(self.teacher)
+        with CaptureQueriesContext(connection) as queries:
+            room_response = self.client.get(reverse('room', kwargs={'room_id': self.room.id}))
+            activity_response = self.client.get(reverse('activity_view', kwargs={'activity_id': self.past_due.id}))
+
+        writes = [q['sql'] for q in queries if q['sql'].split()[0].upper() in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+        self.assertContains(room_response, 'Closed')
+        self.assertEqual(activity_response.context['activity'].status, 'closed')
+        self.past_due.refresh_from_db()
+        self.assertEqual(self.past_due.status, 'open')
+
+    def test_scheduler_closes_only_due_activities(self):
+        scheduler = DueDateScheduler()
+        scheduler.load()
+        self.assertEqual(scheduler.next_due(), self.past_due.due_date)
+
+        self.assertEqual(scheduler.run_pending(), 1)
+        self.past_due.refresh_from_db()
+        self.upcoming.refresh_from_db()
+        self.assertEqual(self.past_due.status, 'closed')
+        self.assertEqual(self.upcoming.status, 'open')
+        self.assertEqual(scheduler.next_due(), self.upcoming.due_date)
+
+    def test_scheduler_ignores_rescheduled_activity(self):
+        scheduler = DueDateScheduler()
+        scheduler.load()
+        self.past_due.due_date = timezone.now() + timedelta(days=2)
+        self.past_due.save()
+
+        self.assertEqual(scheduler.run_pending(), 0)
+        self.past_due.refresh_from_db()
+        self.assertEqual(self.past_due.status, 'open')
+
+    def test_close_due_activities_command(self):
+        out = StringIO()
+        call_command('close_due_activities', stdout=out)
+        self.assertIn('Closed 1', out.getvalue())
+
+
+class TempExportCacheMixin:
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = self.settings(EXPORT_CACHE_DIR=cache_dir.name, EXPORT_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class ExportGradesTests(TempExportCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = make_teacher()
+        self.room = Room.objects.create(name='Algebra', teacher=self.teacher.teacher)
+        self.quiz = Activity.objects.create(room=self.room, title='Quiz', total_marks=10)
+        self.exam = Activity.objects.create(room=self.room, title='Final Exam', total_marks=50)
+        course = Course.objects.create(name='BS Computer Science')
+        year_level = YearLevel.objects.create(name='1st Year')
+
+        for username, last_name in (('zed', 'Zulu'), ('amy', 'alpha')):
+            student = make_student(username)
+            student.last_name = last_name
+            student.save()
+            student.student.course = course
+            student.student.year_level = year_level
+            student.student.save()
+            self.room.students.add(student)
+        amy = User.objects.get(username='amy').student
+        Submission.objects.create(activity=self.quiz, student=amy, score=8)
+        Submission.objects.create(activity=self.exam, student=amy)
+        rebuild_standings([self.room])
+
+    def download(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('export_grades', kwargs={'room_id': self.room.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        work_book = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+        return work_book.active
+
+    def test_export_contents(self):
+        sheet = self.download()
+        rows = list(sheet.values)
+
+        self.assertEqual(rows[0][7:], ('Quiz', 'Final Exam', 'Total Score', 'Max Score', 'Average %'))
+        self.assertEqual(rows[1][1:], ('alpha', 'Amy', '-', 'BS Computer Science', '1st', 'Algebra', 8, '-', 8, 60, 13.33))
+        self.assertEqual(rows[2][1], 'Zulu')
+        self.assertEqual(rows[2][7:10], ('-', '-', 0))
+        self.assertEqual(sheet.column_dimensions['E'].width, len('BS Computer Science') + 2)
+
+    def test_export_query_count_does_not_grow_with_class_size(self):
+        with CaptureQueriesContext(connection) as small:
+            GradebookExport(self.room).xlsx_file().close()
+
+        for index in range(10):
+            student = make_student(f'extra{index}')
+            self.room.students.add(student)
+            Submission.objects.create(activity=self.quiz, student=student.student, score=5)
+        rebuild_standings([self.room])
+
+        with CaptureQueriesContext(connection) as large:
+            GradebookExport(self.room).xlsx_file().close()
+
+        self.assertEqual(len(small), len(large))
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), "set RUN_BENCHMARKS=1 to run benchmarks")
+class ExportGradesBenchmark(TestCase):
+    students = 1000
+    activities = 80
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = make_teacher()
+        cls.room = Room.objects.create(name='Benchmark', teacher=teacher.teacher)
+        activities = Activity.objects.bulk_create([
+            Activity(room=cls.room, title=f'Activity {i}', total_marks=100) for i in range(cls.activities)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'bench{i}', email=f'bench{i}@example.com', first_name='Bench', last_name=f'Student {i}')
+            for i in range(cls.students)
+        ])
+        profiles = StudentProfile.objects.bulk_create([
+            StudentProfile(user=user, student_id=f'S{i:05d}') for i, user in enumerate(users)
+        ])
+        cls.room.students.add(*users)
+        Submission.objects.bulk_create([
+            Submission(activity=activity, student=profile, score=(i + j) % 100, status='graded')
+            for i, profile in enumerate(profiles)
+            for j, activity in enumerate(activities)
+        ], batch_size=5000)
+        rebuild_standings([cls.room])
+
+    def test_export_benchmark(self):
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            fileobj = GradebookExport(self.room).xlsx_file()
+        elapsed = time.perf_counter() - started
+        size = fileobj.seek(0, os.SEEK_END)
+        fileobj.close()
+
+        # measured separately since tracing allocations slows the export several times over
+        tracemalloc.start()
+        GradebookExport(self.room).xlsx_file().close()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"\nexport {self.students} students x {self.activities} activities: "
+            f"{elapsed:.2f}s, {len(queries)} queries, peak {peak / 1024 / 1024:.1f} MiB, {size / 1024:.0f} KiB file"
+        )
+        self.assertLess(elapsed, 15)
+        self.assertLess(len(queries), 10)
+
+
+class ExportJobTests(TempExportCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = make_teacher()
+        self.rooms = [
+            Room.objects.create(name=name, teacher=self.teacher.teacher) for name in ('Section A', 'Section B')
+        ]
+        for room in self.rooms:
+            Activity.objects.create(room=room, title='Quiz', total_marks=10)
+            student = make_student(f'student_{room.id}')
+            room.students.add(student)
+            refresh_standing(room, student, create=True)
+        self.client.force_login(self.teacher)
+
+    def start(self, rooms, file_format='csv'):
+        response = self.client.post(reverse('start_export_job'), {
+            'room_ids': [room.id for room in rooms],
+            'format': file_format,
+        })
+        self.assertEqual(response.status_code, 202)
+        return response.json()
+
+    def test_multi_room_job_streams_zip(self):
+        job = self.start(self.rooms)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['progress'], 100)
+
+        status = self.client.get(job['status_url']).json()
+        self.assertEqual(status['rooms_done'], 2)
+
+        response = self.client.get(job['download_url'])
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), ['SECTION A - grades.csv', 'SECTION B - grades.csv'])
+        self.assertIn('student_', archive.read('SECTION A - grades.csv').decode('utf-8-sig'))
+        self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist()))
+
+    def test_unchanged_room_is_served_from_cache(self):
+        room = self.rooms[0]
+        first = ExportJob.objects.get(id=self.start([room])['id'])
+
+        with CaptureQueriesContext(connection) as queries:
+            second = create_export_job(self.teacher, [Room.objects.get(id=room.id)], 'csv')
+        self.assertEqual(second.artifacts, first.artifacts)
+        self.assertFalse(any('room_submission' in q['sql'] for q in queries))
+
+        Activity.objects.create(room=room, title='Quiz 2', total_marks=5)
+        third = create_export_job(self.teacher, [Room.objects.get(id=room.id)], 'csv')
+        self.assertNotEqual(third.artifacts, first.artifacts)
+
+    def test_older_build_keeps_newer_artifact(self):
+        stale = Room.objects.get(id=self.rooms[0].id)
+        Activity.objects.create(room=stale, title='Quiz 2', total_marks=5)
+        fresh = Room.objects.get(id=stale.id)
+        newer = get_room_artifact(fresh, 'csv')
+        older = get_room_artifact(stale, 'csv')
+        self.assertTrue(os.path.exists(newer.path))
+        self.assertTrue(os.path.exists(older.path))
+
+        Activity.objects.create(room=stale, title='Quiz 3', total_marks=5)
+        get_room_artifact(Room.objects.get(id=stale.id), 'csv')
+        self.assertFalse(os.path.exists(newer.path))
+        self.assertFalse(os.path.exists(older.path))
+
+    def test_pruned_artifact_is_rebuilt_on_open(self):
+        room = Room.objects.get(id=self.rooms[0].id)
+        artifact = get_room_artifact(room, 'csv')
+        os.remove(artifact.path)
+        reopened, fileobj = open_room_artifact(room, 'csv')
+        with fileobj:
+            self.assertIn(b'student_', fileobj.read())
+        self.assertFalse(reopened.cached)
+
+    def test_student_changes_refresh_the_export(self):
+        room = self.rooms[0]
+        first = get_room_artifact(Room.objects.get(id=room.id), 'csv')
+        student = room.students.get()
+        student.last_name = 'Renamed'
+        student.save()
+        second = get_room_artifact(Room.objects.get(id=room.id), 'csv')
+        self.assertNotEqual(first.path, second.path)
+        with open(second.path, encoding='utf-8-sig') as fileobj:
+            self.assertIn('Renamed', fileobj.read())
+
+    def test_other_teachers_rooms_are_rejected(self):
+        other = make_teacher('other_teacher')
+        self.client.force_login(other)
+        response = self.client.post(reverse('start_export_job'), {'room_ids': [self.rooms[0].id]})
+        self.assertEqual(response.status_code, 400)
+
+
+class TempMediaMixin:
+    def setUp(self):
+        super().setUp()
+        media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        self.media_root = media_dir.name
+        settings_override = self.settings(MEDIA_ROOT=media_dir.name, FILE_DELIVERY_BACKEND='python')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        validator_cache.clear()
+
+    def write_media(self, name, content):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fileobj:
+            fileobj.write(content)
+        return name
+
+
+class FileDeliveryTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = make_teacher()
+        self.student = make_student('student1')
+        self.outsider = make_student('student2')
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.room.students.add(self.student)
+        self.content = bytes(range(256)) * 4
+        self.activity = Activity.objects.create(room=self.room, title='Lab', total_marks=10)
+        self.activity.resource_file.name = self.write_media('activity_resources/lab/notes.pdf', self.content)
+        self.activity.save()
+        self.url = reverse('serve_activity_resource', kwargs={'activity_id': self.activity.id})
+
+    def test_full_response_advertises_ranges(self):
+        self.client.force_login(self.student)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_range_request_returns_partial_content(self):
+        self.client.force_login(self.student)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-24')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-24:])
+
+    def test_unsatisfiable_range(self):
+        self.client.force_login(self.student)
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_stale_if_range_sends_whole_file(self):
+        self.client.force_login(self.student)
+        response = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='Thu, 01 Jan 1970 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_proxy_backends_only_send_headers(self):
+        self.client.force_login(self.teacher)
+        with self.settings(FILE_DELIVERY_BACKEND='x-accel-redirect', FILE_DELIVERY_INTERNAL_URL='/protected/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/activity_resources/lab/notes.pdf')
+        self.assertEqual(response.content, b'')
+
+        with self.settings(FILE_DELIVERY_BACKEND='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'activity_resources/lab/notes.pdf'))
+
+    def test_permission_check_runs_before_delivery(self):
+        self.client.force_login(self.outsider)
+        with self.settings(FILE_DELIVERY_BACKEND='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+    def test_validators_and_not_modified(self):
+        self.client.force_login(self.student)
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+
+        os.remove(os.path.join(self.media_root, self.activity.resource_file.name))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_replaced_file_gets_new_etag(self):
+        self.client.force_login(self.student)
+        etag = self.client.get(self.url)['ETag']
+        self.write_media(self.activity.resource_file.name, b'updated notes')
+        self.activity.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(b''.join(response.streaming_content), b'updated notes')
+
+    def use_blob(self):
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.write_media(blob_relative_path(digest), self.content)
+        Activity.objects.filter(id=self.activity.id).update(resource_file=f'{blob_relative_path(digest)}/notes.pdf')
+        return digest
+
+    def test_blob_etag_is_its_digest_and_legacy_etag_is_weak(self):
+        self.client.force_login(self.student)
+        self.assertTrue(self.client.get(self.url)['ETag'].startswith(f'W/"{len(self.content):x}-'))
+
+        digest = self.use_blob()
+        with self.settings(FILE_DELIVERY_BACKEND='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], f'"{digest}"')
+
+    def test_if_range_accepts_current_strong_etag(self):
+        self.client.force_login(self.student)
+        weak_etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=weak_etag)
+        self.assertEqual(response.status_code, 200)
+
+        self.use_blob()
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_pictures_go_through_delivery(self):
+        self.write_media('profile_pics/students/me.png', b'png')
+        response = self.client.get('/media/profile_pics/students/me.png')
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(self.student)
+        response = self.client.get('/media/profile_pics/students/me.png', HTTP_RANGE='bytes=1-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'ng')
+
+    def test_profile_picture_path_cannot_leave_profile_pics(self):
+        self.write_media('submissions/answers.txt', b'secret')
+        self.client.force_login(self.student)
+        for url in ['/media/profile_pics/../submissions/answers.txt', '/media/profile_pics/..%2Fsubmissions/answers.txt']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 404)
+
+
+class SubmissionArchiveTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = make_teacher()
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.activity = Activity.objects.create(room=self.room, title='Lab', total_marks=10)
+        self.url = reverse('download_activity_submissions', kwargs={'activity_id': self.activity.id})
+        self.submissions = []
+        for index in range(3):
+            student = make_student(f'student{index}')
+            self.room.students.add(student)
+            submission = Submission.objects.create(activity=self.activity, student=student.student)
+            submission.submission_file.name = self.write_media(
+                f'submissions/activity_{self.activity.id}/student_{student.id}/report.pdf',
+                f'report {index}'.encode(),
+            )
+            submission.save()
+            self.submissions.append(submission)
+
+    def download(self, **params):
+        self.client.force_login(self.teacher)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        return {name: archive.read(name) for name in archive.namelist()}
+
+    def test_streams_every_submission_stored_and_named_per_student(self):
+        files = self.download()
+        self.assertEqual(len(files), 3)
+        self.assertEqual(files['Student, Student0 (student0) - report.pdf'], b'report 0')
+
+        self.client.force_login(self.teacher)
+        archive = zipfile.ZipFile(BytesIO(b''.join(self.client.get(self.url).streaming_content)))
+        self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist()))
+
+    def test_ungraded_filter(self):
+        self.submissions[0].score = 8
+        self.submissions[0].save()
+        self.assertEqual(len(self.download(filter='ungraded')), 2)
+
+    def test_new_since_last_download(self):
+        self.download()
+        self.assertEqual(self.download(filter='new'), {})
+
+        Submission.objects.filter(id=self.submissions[1].id).update(submitted_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(list(self.download(filter='new')), ['Student, Student1 (student1) - report.pdf'])
+
+    def test_aborted_download_is_not_recorded(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(self.url)
+        next(iter(response.streaming_content))
+        response.close()
+        self.assertFalse(SubmissionArchiveDownload.objects.exists())
+
+        self.download()
+        self.assertTrue(SubmissionArchiveDownload.objects.filter(activity=self.activity, downloaded_by=self.teacher).exists())
+
+    def test_only_room_teacher_can_download(self):
+        self.client.force_login(make_teacher('other'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.submissions[0].student.user)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_missing_files_are_skipped(self):
+        os.remove(os.path.join(self.media_root, self.submissions[2].submission_file.name))
+        self.assertEqual(len(self.download()), 2)
+
+
+class ContentAddressedStorageTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        settings_override = self.settings(BLOB_GC_GRACE_SECONDS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.teacher = make_teacher()
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.activity = Activity.objects.create(room=self.room, title='Lab', total_marks=10)
+        self.students = [make_student(f'student{index}') for index in range(2)]
+        for student in self.students:
+            self.room.students.add(student)
+
+    def submit(self, student, filename, content):
+        self.client.force_login(student)
+        upload = SimpleUploadedFile(filename, content, content_type='application/pdf')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('submit_activity'), {'activity_id': self.activity.id, 'submission_file': upload})
+        return Submission.objects.get(activity=self.activity, student=student.student)
+
+    def blob_files(self):
+        blob_root = os.path.join(self.media_root, 'blobs')
+        return [
+            os.path.join(root, name)
+            for root, _, names in os.walk(blob_root) if not root.endswith('tmp')
+            for name in names
+        ]
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.submit(self.students[0], 'essay.pdf', b'same bytes')
+        second = self.submit(self.students[1], 'copy.pdf', b'same bytes')
+
+        self.assertEqual(first.get_submission_filename(), 'essay.pdf')
+        self.assertEqual(second.get_submission_filename(), 'copy.pdf')
+        self.assertEqual(first.submission_file.path, second.submission_file.path)
+        self.assertEqual(len(self.blob_files()), 1)
+        self.assertEqual(ContentBlob.objects.get().ref_count, 2)
+
+        self.client.force_login(self.students[1])
+        response = self.client.get(reverse('serve_submission_file', kwargs={'submission_id': second.id}))
+        self.assertEqual(b''.join(response.streaming_content), b'same bytes')
+        self.assertIn('copy.pdf', response['Content-Disposition'])
+
+    def test_resubmission_releases_and_collects_old_blob(self):
+        self.submit(self.students[0], 'essay.pdf', b'draft')
+        self.submit(self.students[1], 'essay.pdf', b'shared')
+        submission = self.submit(self.students[0], 'essay.pdf', b'shared')
+
+        self.assertEqual(ContentBlob.objects.count(), 1)
+        self.assertEqual(ContentBlob.objects.get().ref_count, 2)
+        self.assertEqual(len(self.blob_files()), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            submission.delete()
+        self.assertEqual(ContentBlob.objects.get().ref_count, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Submission.objects.all().delete()
+        self.assertFalse(ContentBlob.objects.exists())
+        self.assertEqual(self.blob_files(), [])
+
+    def test_long_filenames_fit_the_field(self):
+        submission = self.submit(self.students[0], 'r' * 240 + '.pdf', b'long name')
+        self.assertLessEqual(len(submission.submission_file.name), 255)
+        self.assertTrue(submission.get_submission_filename().endswith('rr.pdf'))
+        self.assertEqual(submission.submission_file.read(), b'long name')
+
+    def test_blob_from_rolled_back_upload_is_collected(self):
+        class Rollback(Exception):
+            pass
+
+        try:
+            with transaction.atomic():
+                name = content_storage.save('submissions/lost.pdf', SimpleUploadedFile('lost.pdf', b'never committed'))
+                raise Rollback
+        except Rollback:
+            pass
+        path = content_storage.path(name)
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(ContentBlob.objects.exists())
+
+        kept = self.submit(self.students[0], 'kept.pdf', b'kept')
+        past = time.time() - 10
+        for blob in self.blob_files():
+            os.utime(blob, (past, past))
+        self.assertEqual(collect_blobs(), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(kept.submission_file.path))
+
+    def test_orphan_touched_during_collection_is_kept(self):
+        name = content_storage.save('submissions/lost.pdf', SimpleUploadedFile('lost.pdf', b'reused'))
+        ContentBlob.objects.all().delete()
+        path = content_storage.path(name)
+        past = time.time() - 10
+        os.utime(path, (past, past))
+
+        def reused_then_buried(blob_path):
+            # an upload of the same content touched the file right after the scan
+            os.utime(blob_path)
+            return bury(blob_path)
+
+        with patch('room.storage.bury', side_effect=reused_then_buried):
+            self.assertEqual(collect_blobs(), 0)
+        with open(path, 'rb') as fileobj:
+            self.assertEqual(fileobj.read(), b'reused')
+
+    def test_upload_rewrites_a_blob_moved_aside_by_the_collector(self):
+        first = self.submit(self.students[0], 'a.pdf', b'same bytes')
+        tombstone = bury(first.submission_file.path)
+        second = self.submit(self.students[1], 'b.pdf', b'same bytes')
+        self.assertEqual(second.submission_file.read(), b'same bytes')
+        os.remove(tombstone)
+
+    def test_legacy_files_can_be_imported(self):
+        submission = Submission.objects.create(activity=self.activity, student=self.students[0].student)
+        submission.submission_file.name = self.write_media('submissions/legacy/report.pdf', b'old upload')
+        submission.save()
+
+        self.assertEqual(import_legacy_files(), 1)
+        submission.refresh_from_db()
+        self.assertEqual(submission.get_submission_filename(), 'report.pdf')
+        self.assertTrue(submission.submission_file.name.startswith('blobs/'))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'submissions/legacy/report.pdf')))
+        self.assertEqual(ContentBlob.objects.get().ref_count, 1)
+        self.assertEqual(content_storage.open(submission.submission_file.name).read(), b'old upload')
+
+
+class ChunkedUploadTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        chunk_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(chunk_dir.cleanup)
+        self.chunk_dir = chunk_dir.name
+        settings_override = self.settings(CHUNKED_UPLOAD_DIR=chunk_dir.name, CHUNKED_UPLOAD_CHUNK_SIZE=4)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.teacher = make_teacher()
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.activity = Activity.objects.create(room=self.room, title='Lab', total_marks=10)
+        self.student = make_student('student1')
+        self.room.students.add(self.student)
+        refresh_standing(self.room, self.student, create=True)
+        self.client.force_login(self.student)
+        self.content = b'0123456789'
+
+    def start(self, content=None):
+        content = self.content if content is None else content
+        response = self.client.post(reverse('start_chunked_upload'), {
+            'activity_id': self.activity.id, 'filename': 'video.mp4', 'size': len(content),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_chunk(self, upload, index, data, checksum=None):
+        return self.client.put(
+            f"{upload['status_url']}chunks/{index}/",
+            data=data,
+            content_type='application/octet-stream',
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(data).hexdigest(),
+        )
+
+    def test_upload_resumes_from_missing_chunks(self):
+        upload = self.start()
+        self.assertEqual(upload['total_chunks'], 3)
+        self.assertEqual(upload['missing'], [0, 1, 2])
+
+        self.assertEqual(self.put_chunk(upload, 2, b'89').status_code, 200)
+        self.assertEqual(self.put_chunk(upload, 0, b'0123').status_code, 200)
+        self.assertEqual(self.client.get(upload['status_url']).json()['missing'], [1])
+
+        response = self.client.post(upload['finalize_url'])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['missing'], [1])
+
+        self.put_chunk(upload, 1, b'4567')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(upload['finalize_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'complete')
+
+        submission = Submission.objects.get(activity=self.activity, student=self.student.student)
+        self.assertEqual(submission.get_submission_filename(), 'video.mp4')
+        self.assertEqual(submission.submission_file.read(), self.content)
+        self.assertEqual(RoomStudentStanding.objects.get(room=self.room, student=self.student).submission_count, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.chunk_dir, upload['upload_id'])))
+
+    def test_rejects_bad_checksum_and_length(self):
+        upload = self.start()
+        response = self.put_chunk(upload, 0, b'0123', checksum='0' * 64)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.put_chunk(upload, 0, b'012').status_code, 400)
+        self.assertEqual(self.put_chunk(upload, 3, b'01').status_code, 416)
+        self.assertEqual(self.client.get(upload['status_url']).json()['missing'], [0, 1, 2])
+
+    def test_uploads_are_private_and_respect_closed_activities(self):
+        upload = self.start()
+        self.client.force_login(make_student('student2'))
+        self.assertEqual(self.client.get(upload['status_url']).status_code, 404)
+
+        self.client.force_login(self.student)
+        Activity.objects.filter(id=self.activity.id).update(status='closed')
+        for index, data in enumerate([b'0123', b'4567', b'89']):
+            self.put_chunk(upload, index, data)
+        self.assertEqual(self.client.post(upload['finalize_url']).status_code, 409)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_upload_started_before_the_deadline_can_finish_after_it(self):
+        Activity.objects.filter(id=self.activity.id).update(due_date=timezone.now() + timedelta(minutes=5))
+        upload = self.start()
+        for index, data in enumerate([b'0123', b'4567', b'89']):
+            self.put_chunk(upload, index, data)
+        Activity.objects.filter(id=self.activity.id).update(due_date=timezone.now() - timedelta(minutes=1), status='closed')
+        ChunkedUpload.objects.update(created_at=timezone.now() - timedelta(minutes=10))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(upload['finalize_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Submission.objects.filter(activity=self.activity).exists())
+
+    @override_settings(CHUNKED_UPLOAD_GRACE=600)
+    def test_late_finish_is_bounded_by_the_grace_period(self):
+        Activity.objects.filter(id=self.activity.id).update(due_date=timezone.now() + timedelta(minutes=5))
+        upload = self.start()
+        self.put_chunk(upload, 0, b'0123')
+        Activity.objects.filter(id=self.activity.id).update(due_date=timezone.now() - timedelta(minutes=11), status='closed')
+        ChunkedUpload.objects.update(created_at=timezone.now() - timedelta(minutes=20))
+
+        self.assertEqual(self.put_chunk(upload, 1, b'4567').status_code, 409)
+        self.assertEqual(self.client.get(upload['status_url']).json()['missing'], [1, 2])
+        self.assertEqual(self.client.post(upload['finalize_url']).status_code, 409)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_finalize_requires_enrollment(self):
+        upload = self.start()
+        for index, data in enumerate([b'0123', b'4567', b'89']):
+            self.put_chunk(upload, index, data)
+        self.room.students.remove(self.student)
+        self.assertEqual(self.client.post(upload['finalize_url']).status_code, 404)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_stale_uploads_are_reaped(self):
+        upload = self.start()
+        self.put_chunk(upload, 0, b'0123')
+        ChunkedUpload.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+        self.start()
+        self.assertEqual(ChunkedUpload.objects.count(), 2)
+        call_command('reap_uploads', stdout=StringIO())
+        self.assertEqual(ChunkedUpload.objects.count(), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.chunk_dir, upload['upload_id'])))
+
+
+class ImageDerivativeTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        derivative_url_cache.clear()
+        self.teacher = make_teacher()
+        self.student = make_student('student1')
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.room.students.add(self.student)
+        self.activity = Activity.objects.create(room=self.room, title='Lab', total_marks=10)
+        self.submission = Submission.objects.create(activity=self.activity, student=self.student.student)
+        self.submission.submission_file.name = self.write_image('submissions/lab/photo.png', (2000, 1000))
+        self.submission.save()
+
+    def write_image(self, name, dimensions, color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', dimensions, color).save(buffer, 'PNG')
+        return self.write_media(name, buffer.getvalue())
+
+    def open_response_image(self, response):
+        return Image.open(BytesIO(b''.join(response.streaming_content)))
+
+    def test_thumbnail_is_generated_lazily_next_to_original(self):
+        url = reverse('serve_submission_file', kwargs={'submission_id': self.submission.id})
+        self.client.force_login(self.teacher)
+        response = self.client.get(url, {'size': 'thumb'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(self.open_response_image(response).size, (320, 160))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, 'submissions/lab/photo.png.thumb.webp')))
+
+        response = self.client.get(url)
+        self.assertEqual(self.open_response_image(response).size, (2000, 1000))
+
+    def test_derivatives_follow_permissions(self):
+        url = reverse('serve_submission_file', kwargs={'submission_id': self.submission.id})
+        self.client.force_login(make_student('student2'))
+        self.assertEqual(self.client.get(url, {'size': 'thumb'}).status_code, 404)
+
+    def test_changed_source_rebuilds_derivative_and_url(self):
+        url = reverse('serve_submission_file', kwargs={'submission_id': self.submission.id})
+        first_url = thumbnail_url(self.submission)
+        self.client.force_login(self.student)
+        self.client.get(url, {'size': 'thumb'})
+
+        path = os.path.join(self.media_root, self.submission.submission_file.name)
+        self.write_image(self.submission.submission_file.name, (100, 400), color='blue')
+        future = time.time() + 10
+        os.utime(path, (future, future))
+        self.submission.save()
+
+        self.assertNotEqual(thumbnail_url(self.submission), first_url)
+        response = self.client.get(url, {'size': 'thumb'})
+        self.assertEqual(self.open_response_image(response).size, (80, 320))
+
+    def test_avatars_use_small_derivative(self):
+        profile = self.student.student
+        profile.profile_picture.name = self.write_image('profile_pics/students/me.png', (800, 800))
+        profile.save()
+
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('all_room'))
+        avatar = avatar_url(profile.profile_picture)
+        self.assertIn('size=avatar', avatar)
+        self.assertContains(response, avatar.replace('&', '&amp;'))
+
+        response = self.client.get(avatar)
+        self.assertEqual(self.open_response_image(response).size, (96, 96))
+
+    def test_non_images_fall_back_to_original(self):
+        self.submission.submission_file.name = self.write_media('submissions/lab/notes.svg', b'<svg/>')
+        self.submission.save()
+        self.assertEqual(thumbnail_url(self.submission), reverse('serve_submission_file', kwargs={'submission_id': self.submission.id}))
+
+
+class RoomAccessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        fragment_cache.clear()
+        self.teacher = make_teacher()
+        self.student = make_student('student1')
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.activity = Activity.objects.create(room=self.room, title='Lab', total_marks=10)
+        self.room_url = reverse('room', kwargs={'room_id': self.room.id})
+
+    def test_enroll_and_leave_update_access_immediately(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(self.room_url).status_code, 404)
+
+        self.client.post(reverse('enroll_student'), {'code': self.room.room_code})
+        self.assertEqual(self.client.get(self.room_url).status_code, 200)
+
+        self.client.get(reverse('leave_room', kwargs={'room_id': self.room.id}))
+        self.assertEqual(self.client.get(self.room_url).status_code, 404)
+
+    def test_unenroll_revokes_access(self):
+        self.room.students.add(self.student)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(self.room_url).status_code, 200)
+
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('kick_student'), {'room_id': self.room.id, 'student_id': self.student.id})
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(self.room_url).status_code, 404)
+
+    def test_create_and_delete_room_update_teacher_access(self):
+        self.client.force_login(self.teacher)
+        self.client.get(self.room_url)
+        response = self.client.post(reverse('create_room'), {'name': 'Chemistry', 'description': ''})
+        self.assertEqual(self.client.get(response['Location']).status_code, 200)
+
+        self.client.get(reverse('delete_room', kwargs={'room_id': self.room.id}))
+        self.assertFalse(Room.objects.filter(id=self.room.id).exists())
+        self.assertFalse(can_teach_room(self.teacher, self.room.id))
+
+    def test_other_teachers_cannot_manage_room(self):
+        self.room.students.add(self.student)
+        other = make_teacher('other')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.room_url).status_code, 404)
+        self.client.post(reverse('kick_student'), {'room_id': self.room.id, 'student_id': self.student.id})
+        self.client.get(reverse('delete_room', kwargs={'room_id': self.room.id}))
+        self.assertTrue(self.room.students.filter(id=self.student.id).exists())
+        self.assertTrue(Room.objects.filter(id=self.room.id).exists())
+
+    def test_cached_index_is_trusted_until_the_version_is_bumped(self):
+        self.room.students.add(self.student)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(self.room_url).status_code, 200)
+        with patch('room.access.load_room_access') as load:
+            self.assertEqual(self.client.get(self.room_url).status_code, 200)
+        load.assert_not_called()
+
+        # another worker removed the student and bumped the version in the shared cache
+        self.room.students.through.objects.filter(user=self.student).delete()
+        invalidate_room_access([self.student.id])
+        self.assertEqual(self.client.get(self.room_url).status_code, 404)
+
+    def test_index_cached_under_an_old_version_is_ignored(self):
+        stale = RoomAccess(frozenset(), frozenset({self.room.id}))
+        cache.set(access_cache_key(self.student.id), (0, stale))
+        self.assertFalse(is_enrolled(User.objects.get(id=self.student.id), self.room.id))
+
+    def test_reassigning_the_teacher_moves_access(self):
+        other = make_teacher('other')
+        self.assertTrue(can_teach_room(User.objects.get(id=self.teacher.id), self.room.id))
+        room = Room.objects.get(id=self.room.id)
+        room.teacher = other.teacher
+        room.save()
+        self.assertFalse(can_teach_room(User.objects.get(id=self.teacher.id), self.room.id))
+        self.assertTrue(can_teach_room(User.objects.get(id=other.id), self.room.id))
+
+    def test_deleting_a_deleted_room_is_not_an_error(self):
+        self.client.force_login(self.teacher)
+        self.client.get(reverse('delete_room', kwargs={'room_id': self.room.id}))
+        response = self.client.get(reverse('delete_room', kwargs={'room_id': self.room.id}))
+        self.assertEqual(response.status_code, 302)
+
+    def test_file_checks_do_not_load_the_roster(self):
+        for index in range(20):
+            self.room.students.add(make_student(f'extra{index}'))
+        self.room.students.add(self.student)
+        self.client.force_login(self.student)
+        url = reverse('serve_activity_resource', kwargs={'activity_id': self.activity.id})
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(any('room_room_students' in query['sql'] for query in queries.captured_queries))
+
+
+class NotificationInboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher()
+        self.student = make_student('student1')
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.room.students.add(self.student)
+
+    def notify(self, title='Hello'):
+        return Notification.create_notification(self.student, 'room_update', title, 'message', room=self.room)
+
+    def test_counters_follow_creates_reads_and_clears(self):
+        self.assertEqual(get_unread_count(self.student.id), 0)
+        self.assertEqual(get_recent_notifications(self.student.id), [])
+
+        first = self.notify('first')
+        with self.settings(NOTIFICATION_FANOUT_WORKERS=0):
+            queue_room_notifications(self.room, 'new_announcement', 'second', 'message')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.student.id), 2)
+            self.assertEqual([n.title for n in get_recent_notifications(self.student.id)], ['second', 'first'])
+
+        self.client.force_login(self.student)
+        self.client.get(reverse('mark_notification_read', kwargs={'notification_id': first.id}))
+        self.client.get(reverse('mark_notification_read', kwargs={'notification_id': first.id}))
+        self.assertEqual(get_unread_count(self.student.id), 1)
+        self.assertTrue(get_recent_notifications(self.student.id)[1].is_read)
+
+        self.client.get(reverse('mark_all_notifications_read'))
+        self.assertEqual(get_unread_count(self.student.id), 0)
+
+        self.notify('third')
+        self.client.post(reverse('clear_all_notifications'))
+        self.assertEqual(get_unread_count(self.student.id), 0)
+        self.assertEqual(get_recent_notifications(self.student.id), [])
+
+    def test_pages_render_event_content(self):
+        self.notify('Room moved')
+        self.client.force_login(self.student)
+        with self.assertNumQueries(10):
+            response = self.client.get(reverse('notifications'))
+        self.assertContains(response, 'Room moved', count=2)
+        self.assertContains(response, 'Physics')
+
+    def test_recent_list_is_capped(self):
+        get_recent_notifications(self.student.id)
+        for index in range(7):
+            self.notify(f'n{index}')
+        recent = get_recent_notifications(self.student.id)
+        self.assertEqual([n.title for n in recent], ['n6', 'n5', 'n4', 'n3', 'n2'])
+        self.assertEqual(recent, list(Notification.objects.filter(recipient=self.student)[:5]))
+
+    def test_miss_falls_back_to_database(self):
+        self.notify()
+        event = NotificationEvent.objects.create(notification_type='room_update', title='direct', message='')
+        Notification.objects.create(recipient=self.student, event=event)
+        cache.clear()
+        self.assertEqual(get_unread_count(self.student.id), 2)
+        self.assertEqual(len(get_recent_notifications(self.student.id)), 2)
+
+    def test_context_processor_is_lazy(self):
+        self.notify()
+        cache.clear()
+        request = RequestFactory().get('/')
+        request.user = self.student
+        with self.assertNumQueries(0):
+            context = notification_context(request)
+        with self.assertNumQueries(2):
+            self.assertTrue(context['notification_count'] > 0)
+            self.assertEqual(len(context['recent_notifications']), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(notification_context(request)['notification_count'], 1)
+
+
+@override_settings(NOTIFICATION_FANOUT_WORKERS=0)
+class NotificationFanoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher()
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.students = [make_student(f'student{index}') for index in range(7)]
+        self.room.students.add(*self.students)
+        self.activity = Activity.objects.create(room=self.room, title='Lab', total_marks=10)
+
+    def queue(self, **kwargs):
+        return queue_room_notifications(self.room, 'new_activity', 'Lab', 'message', activity=self.activity, **kwargs)
+
+    @override_settings(NOTIFICATION_FANOUT_BATCH_SIZE=3)
+    def test_inserts_in_bounded_batches(self):
+        job = self.queue()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.recipients_done, 7)
+        self.assertEqual([size for size, _ in job.batch_timings], [3, 3, 1])
+        self.assertEqual(job.event.receipts.count(), 7)
+
+    def test_retry_does_not_duplicate(self):
+        job = self.queue()
+        NotificationFanout.objects.filter(id=job.id).update(
+            status='running', last_recipient_id=0, claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        resume_fanouts()
+        self.assertEqual(job.event.receipts.count(), 7)
+        self.assertEqual(NotificationFanout.objects.get(id=job.id).status, 'done')
+
+    def queue_without_running(self):
+        with self.settings(NOTIFICATION_FANOUT_WORKERS=1), self.captureOnCommitCallbacks():
+            return self.queue()
+
+    def test_live_claims_are_not_resumed(self):
+        job = self.queue_without_running()
+        NotificationFanout.objects.filter(id=job.id).update(status='running', claimed_at=timezone.now())
+        resume_fanouts()
+        self.assertFalse(job.event.receipts.exists())
+
+        NotificationFanout.objects.filter(id=job.id).update(claimed_at=timezone.now() - timedelta(hours=1))
+        resume_fanouts()
+        self.assertEqual(job.event.receipts.count(), 7)
+        self.assertEqual(run_fanout(job.id).status, 'done')
+        self.assertEqual(job.event.receipts.count(), 7)
+
+    def test_worker_stops_once_its_claim_is_taken_over(self):
+        job = self.queue_without_running()
+
+        def take_over(notifications):
+            NotificationFanout.objects.filter(id=job.id).update(claimed_at=timezone.now() + timedelta(seconds=1))
+
+        with patch('room.fanout.record_new_notifications', side_effect=take_over):
+            job = run_fanout(job.id, batch_size=3)
+        self.assertEqual(job.status, 'running')
+        self.assertEqual(job.event.receipts.count(), 3)
+
+    def test_batch_refreshes_counters_in_one_round_trip(self):
+        for student in self.students:
+            get_unread_count(student.id)
+        with patch('room.inbox.cache', wraps=cache) as tracked:
+            self.queue()
+        self.assertEqual(tracked.get_many.call_count, 1)
+        self.assertEqual(tracked.set_many.call_count, 1)
+        tracked.incr.assert_not_called()
+        self.assertEqual([get_unread_count(student.id) for student in self.students], [1] * 7)
+
+    def test_pending_audience_skips_submitters(self):
+        Submission.objects.create(activity=self.activity, student=self.students[0].student)
+        job = self.queue(audience='pending')
+        self.assertEqual(set(job.event.receipts.values_list('recipient_id', flat=True)), {s.id for s in self.students[1:]})
+
+    @override_settings(NOTIFICATION_FANOUT_WORKERS=1)
+    def test_announcement_request_only_queues(self):
+        self.client.force_login(self.teacher)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('create_announcement'), {'title': 'Hi', 'content': 'x', 'room_id': self.room.id})
+        # the dashboards also clear their snapshots again once the announcement is committed
+        callbacks = [callback for callback in callbacks if callback.__module__ != 'dashboard.snapshots']
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(Notification.objects.exists())
+        job = NotificationFanout.objects.get()
+        self.assertEqual(job.status, 'queued')
+
+        call_command('run_notification_fanouts', stdout=StringIO())
+        self.assertEqual(Notification.objects.filter(event__notification_type='new_announcement').count(), 7)
+        self.assertEqual(NotificationEvent.objects.count(), 1)
+
+
+class NotificationEventMigrationTests(TransactionTestCase):
+    migrate_from = [('room', '0010_notificationfanout')]
+    migrate_to = [('room', '0013_remove_notification_content')]
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def test_rows_become_shared_events_and_receipts(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        OldUser = apps.get_model('auth', 'User')
+        OldNotification = apps.get_model('room', 'Notification')
+        users = [OldUser.objects.create(username=f'user{index}') for index in range(3)]
+        for user in users:
+            OldNotification.objects.create(recipient=user, notification_type='new_announcement', title='Hi', message='Long text')
+        OldNotification.objects.create(recipient=users[0], notification_type='new_announcement', title='Hi', message='Long text', is_read=True)
+        OldNotification.objects.create(recipient=users[1], notification_type='student_left', title='Bye', message='')
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        apps = executor.loader.project_state(self.migrate_to).apps
+        Event = apps.get_model('room', 'NotificationEvent')
+        Receipt = apps.get_model('room', 'Notification')
+
+        self.assertEqual(Receipt.objects.count(), 5)
+        self.assertEqual(Event.objects.count(), 3)
+        self.assertEqual(Event.objects.get(title='Bye').receipts.get().recipient_id, users[1].id)
+        self.assertEqual(Receipt.objects.filter(event__title='Hi', is_read=True).count(), 1)
+
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_student('student1')
+
+    def notify(self, title='Hello'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.create_notification(self.student, 'room_update', title, 'message')
+
+    def write_from_other_worker(self, title):
+        event = NotificationEvent.objects.create(notification_type='room_update', title=title, message='')
+        return Notification.objects.create(recipient=self.student, event=event)
+
+    async def test_pushes_new_notifications_and_unread_counts(self):
+        stream = stream_notifications(self.student.id)
+        self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+        self.assertEqual(await anext(stream), 'event: unread\ndata: {"count": 0}\n\n')
+
+        notification = await sync_to_async(self.notify)('Graded')
+        pushed = await asyncio.wait_for(anext(stream), 1)
+        self.assertTrue(pushed.startswith(f'event: notification\nid: {notification.id}\n'))
+        self.assertIn('"title": "Graded"', pushed)
+        self.assertEqual(await asyncio.wait_for(anext(stream), 1), 'event: unread\ndata: {"count": 1}\n\n')
+        await stream.aclose()
+        self.assertFalse(hub.is_subscribed(self.student.id))
+
+    async def test_resumes_after_last_event_id(self):
+        first = await sync_to_async(self.notify)('one')
+        await sync_to_async(self.notify)('two')
+        await sync_to_async(self.notify)('three')
+        stream = stream_notifications(self.student.id, last_event_id=first.id)
+        events = [await anext(stream) for _ in range(4)]
+        await stream.aclose()
+        self.assertIn('"title": "two"', events[1])
+        self.assertIn('"title": "three"', events[2])
+        self.assertIn('"count": 3', events[3])
+
+    async def test_heartbeat_on_silence(self):
+        stream = stream_notifications(self.student.id, heartbeat=0.01)
+        await anext(stream)
+        await anext(stream)
+        self.assertEqual(await anext(stream), ': heartbeat\n\n')
+        await stream.aclose()
+
+    @override_settings(NOTIFICATION_STREAM_QUEUE_SIZE=1)
+    async def test_slow_client_is_disconnected(self):
+        stream = stream_notifications(self.student.id)
+        await anext(stream)
+        await anext(stream)
+        for index in range(3):
+            hub.publish(self.student.id, 'notification', {'id': index})
+        await asyncio.sleep(0)
+        self.assertEqual([event async for event in stream], [])
+        self.assertFalse(hub.is_subscribed(self.student.id))
+
+    async def test_database_relay_republishes_other_workers_receipts(self):
+        subscription = hub.subscribe(self.student.id)
+        relay = DatabaseRelay()
+        try:
+            await sync_to_async(self.write_from_other_worker)('old')
+            self.assertEqual(await sync_to_async(relay.poll)(), 0)
+            await sync_to_async(self.write_from_other_worker)('new')
+            self.assertEqual(await sync_to_async(relay.poll)(), 1)
+            self.assertEqual(await sync_to_async(relay.poll)(), 0)
+            await asyncio.sleep(0)
+            kind, payload = subscription.queue.get_nowait()
+            self.assertEqual((kind, payload['title']), ('notification', 'new'))
+        finally:
+            hub.unsubscribe(subscription)
+
+    def test_view_is_off_unless_enabled(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('notification_stream')).status_code, 204)
+        response = self.client.get(reverse('all_room'))
+        self.assertNotContains(response, 'data-notification-stream')
+        self.assertNotContains(response, 'notification_stream.js')
+        with self.settings(NOTIFICATION_STREAM_ENABLED=True):
+            self.assertContains(self.client.get(reverse('all_room')), 'data-notification-stream')
+
+    @override_settings(NOTIFICATION_STREAM_ENABLED=True)
+    def test_view_requires_login_and_streams_events(self):
+        self.assertEqual(self.client.get(reverse('notification_stream')).status_code, 401)
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('notification_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        response.close()
+
+
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher()
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.activity = Activity.objects.create(room=self.room, title='Lab 4', total_marks=10)
+        self.students = [make_student(f'student{index}') for index in range(3)]
+
+    def submit(self, student):
+        submission = Submission.objects.create(activity=self.activity, student=student.student)
+        notify_student_submission(submission)
+        return submission
+
+    def age(self, notification, days):
+        Notification.objects.filter(id=notification.id).update(created_at=timezone.now() - timedelta(days=days))
+
+    def test_repeat_submissions_collapse_into_one_row(self):
+        for student in self.students:
+            self.submit(student)
+        receipt = Notification.objects.get(recipient=self.teacher)
+        self.assertEqual(receipt.event.count, 3)
+        self.assertEqual(receipt.title, '3 New Submissions for Lab 4')
+        self.assertEqual(receipt.related_user, self.students[2])
+        self.assertEqual(get_unread_count(self.teacher.id), 1)
+        self.assertEqual(get_recent_notifications(self.teacher.id)[0].title, '3 New Submissions for Lab 4')
+
+    def test_read_or_stale_notifications_are_not_collapsed(self):
+        self.submit(self.students[0])
+        Notification.objects.filter(recipient=self.teacher).update(is_read=True)
+        self.submit(self.students[1])
+        self.age(Notification.objects.get(recipient=self.teacher, is_read=False), 1)
+        self.submit(self.students[2])
+        self.assertEqual(Notification.objects.filter(recipient=self.teacher).count(), 3)
+
+    def test_prune_deletes_old_read_and_archives_old_unread(self):
+        old_read = Notification.create_notification(self.students[0], 'room_update', 'old read', '')
+        old_unread = Notification.create_notification(self.students[0], 'room_update', 'old unread', '')
+        fresh = Notification.create_notification(self.students[0], 'room_update', 'fresh', '')
+        Notification.objects.filter(id=old_read.id).update(is_read=True)
+        self.age(old_read, 40)
+        self.age(old_unread, 200)
+        NotificationEvent.objects.filter(id__in=[old_read.event_id, old_unread.event_id]).update(
+            created_at=timezone.now() - timedelta(days=200)
+        )
+        self.assertEqual(get_unread_count(self.students[0].id), 2)
+
+        result = prune_notifications(batch_size=1)
+        self.assertEqual((result.deleted, result.archived, result.events), (1, 1, 2))
+        self.assertEqual(list(Notification.objects.values_list('id', flat=True)), [fresh.id])
+        self.assertEqual(ArchivedNotification.objects.get().title, 'old unread')
+        self.assertEqual(get_unread_count(self.students[0].id), 1)
+
+    @override_settings(NOTIFICATION_FANOUT_WORKERS=1)
+    def test_prune_keeps_events_of_pending_fanouts(self):
+        self.room.students.add(*self.students)
+        with self.captureOnCommitCallbacks():
+            job = queue_room_notifications(self.room, 'new_activity', 'Lab', '')
+        NotificationEvent.objects.filter(id=job.event_id).update(created_at=timezone.now() - timedelta(days=200))
+        prune_notifications()
+        self.assertTrue(NotificationEvent.objects.filter(id=job.event_id).exists())
+
+
+class NotificationFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher()
+        self.student = make_student('student1')
+        self.room = Room.objects.create(name='Physics', teacher=self.teacher.teacher)
+        self.other_room = Room.objects.create(name='Chemistry', teacher=self.teacher.teacher)
+        self.room.students.add(self.student)
+        now = timezone.now()
+        self.notifications = []
+        for index in range(45):
+            notification = Notification.create_notification(
+                self.student, 'new_activity' if index % 3 else 'room_update', f'n{index}', '',
+                room=self.room if index % 2 else self.other_room
+            )
+            self.notifications.append(notification)
+        # ties on created_at must still page without gaps or repeats
+        Notification.objects.filter(recipient=self.student).update(created_at=now)
+        self.client.force_login(self.student)
+
+    def walk(self, **params):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse('notifications_feed'), {**params, **({'cursor': cursor} if cursor else {})})
+            page = response.json()
+            seen += [item['id'] for item in page['results']]
+            cursor = page['next_cursor']
+            if not cursor:
+                return seen
+
+    def test_feed_pages_through_everything_once(self):
+        ids = self.walk()
+        self.assertEqual(ids, sorted((n.id for n in self.notifications), reverse=True))
+
+    def test_filters(self):
+        Notification.objects.filter(id=self.notifications[1].id).update(is_read=True)
+        self.assertEqual(len(self.walk(type='room_update')), 15)
+        self.assertEqual(len(self.walk(room=self.room.id)), 22)
+        self.assertEqual(self.walk(read='read'), [self.notifications[1].id])
+        self.assertEqual(len(self.walk(read='unread', type='bogus')), 44)
+
+    def test_deep_pages_cost_the_same(self):
+        first = self.client.get(reverse('notifications_feed')).json()
+        second = self.client.get(reverse('notifications_feed'), {'cursor': first['next_cursor']}).json()
+        with CaptureQueriesContext(connection) as shallow:
+            self.client.get(reverse('notifications_feed'))
+        with CaptureQueriesContext(connection) as deep:
+            self.client.get(reverse('notifications_feed'), {'cursor': second['next_cursor']})
+        self.assertEqual(len(shallow), len(deep))
+        self.assertNotIn('OFFSET', deep.captured_queries[-1]['sql'])
+
+    def test_page_renders_first_page_and_load_more(self):
+        response = self.client.get(reverse('notifications'), {'room': self.room.id})
+        self.assertEqual(len(response.context['notifications']), 20)
+        self.assertContains(response, 'id="loadMoreNotifications"')
+        self.assertContains(response, f'room={self.room.id}&amp;cursor=')
+
+    def test_malformed_cursor_starts_from_the_top(self):
+        page = self.client.get(reverse('notifications_feed'), {'cursor': '!!not-a-cursor'}).json()
+        self.assertEqual(page['results'][0]['id'], self.notifications[-1].id)
+
+
+class ReminderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        teacher = make_teacher()
+        self.room = Room.objects.create(name='Physics', teacher=teacher.teacher)
+        self.done = make_student('done')
+        self.pending = make_student('pending')
+        self.room.students.add(self.done, self.pending)
+        self.now = timezone.now()
+        self.due_soon = Activity.objects.create(room=self.room, title='Lab', total_marks=10, due_date=self.now + timedelta(hours=3))
+        self.overdue = Activity.objects.create(room=self.room, title='Quiz', total_marks=10, due_date=self.now - timedelta(hours=3))
+        for activity in (self.due_soon, self.overdue):
+            Submission.objects.create(activity=activity, student=self.done.student)
+
+    def test_only_pending_students_are_reminded(self):
+        results = send_all_reminders(self.now)
+        self.assertEqual([(r.kind, r.activities, r.notifications) for r in results], [('due_soon', 1, 1), ('overdue', 1, 1)])
+        self.assertFalse(Notification.objects.filter(recipient=self.done).exists())
+        titles = set(Notification.objects.filter(recipient=self.pending).values_list('event__title', flat=True))
+        self.assertEqual(titles, {'Activity Due Soon: Lab', 'Activity Overdue: Quiz'})
+        self.assertEqual(get_unread_count(self.pending.id), 2)
+
+    def test_rerunning_a_sweep_sends_nothing_new(self):
+        send_all_reminders(self.now)
+        results = send_all_reminders(self.now + timedelta(minutes=5))
+        self.assertEqual([r.notifications for r in results], [0, 0])
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(ActivityReminder.objects.count(), 2)
+
+    def test_closed_activities_get_no_due_soon_reminder(self):
+        Activity.objects.filter(id=self.due_soon.id).update(status='closed')
+        self.assertEqual(send_reminders('due_soon', self.now).activities, 0)
+
+    def test_queries_do_not_grow_with_activities(self):
+        def sweep_queries(count, offset):
+            activities = Activity.objects.bulk_create([
+                Activity(room=self.room, title=f'A{i}', total_marks=10, due_date=self.now + timedelta(hours=offset))
+                for i in range(count)
+            ])
+            with CaptureQueriesContext(connection) as queries:
+                result = send_reminders('due_soon', self.now)
+            self.assertEqual(result.notifications, len(activities) * 2)
+            return len(queries)
+
+        ActivityReminder.objects.create(activity=self.due_soon, kind='due_soon')
+        self.assertEqual(sweep_queries(2, 1), sweep_queries(40, 2))
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), "set RUN_BENCHMARKS=1 to run benchmarks")
+class ReminderBenchmark(TestCase):
+    activities = 10000
+    students = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = make_teacher()
+        cls.now = timezone.now()
+        rooms = [Room.objects.create(name=f'Room {i}', teacher=teacher.teacher) for i in range(cls.activities // 100)]
+        users = [make_student(f'bench{i}') for i in range(cls.students)]
+        for room in rooms:
+            room.students.add(*users)
+        Activity.objects.bulk_create([
+            Activity(room=rooms[i % len(rooms)], title=f'Activity {i}', total_marks=10,
+                     due_date=cls.now + timedelta(minutes=i % 600 + 1))
+            for i in range(cls.activities)
+        ], batch_size=2000)
+
+    def test_reminder_benchmark(self):
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            result = send_reminders('due_soon', self.now)
+        elapsed = time.perf_counter() - started
+        print(
+            f"\nreminders for {self.activities} activities x {self.students} students: "
+            f"{elapsed:.2f}s, {len(queries)} queries, {result.notifications} notifications"
+        )
+        self.assertEqual(result.notifications, self.activities * self.students)
+        # SQLite's bound-parameter limit splits each bulk insert into a few hundred rows per statement
+        self.assertLess(len(queries), 500)
+        self.assertLess(elapsed, 30)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        teacher = make_teacher()
+        self.student = make_student('student')
+        self.physics = Room.objects.create(name='Physics', teacher=teacher.teacher, description='Mechanics and waves')
+        self.chemistry = Room.objects.create(name='Chemistry', teacher=teacher.teacher)
+        self.physics.students.add(self.student)
+        self.lab = Activity.objects.create(room=self.physics, title='Pendulum lab', description='Measure the oscillation period', total_marks=10)
+        self.notice = Announcement.objects.create(room=self.physics, title='Lab safety', content='Bring goggles to the pendulum lab')
+        Activity.objects.create(room=self.chemistry, title='Titration lab', description='Oscillation reactions', total_marks=10)
+
+    def titles(self, user, q, **kwargs):
+        return [document.title for document in search(user, q, **kwargs)]
+
+    def test_finds_descriptions_and_content_by_prefix(self):
+        self.assertEqual(self.titles(self.student, 'oscill'), ['Pendulum lab'])
+        self.assertEqual(self.titles(self.student, 'goggles'), ['Lab safety'])
+        self.assertEqual(self.titles(self.student, 'mechanics'), ['Physics'])
+
+    def test_ranks_title_matches_first(self):
+        self.assertEqual(self.titles(self.student, 'pendulum'), ['Pendulum lab', 'Lab safety'])
+        self.assertEqual(self.titles(self.student, 'pendulum', kinds=['announcement']), ['Lab safety'])
+
+    def test_only_rooms_the_user_can_see(self):
+        self.assertEqual(self.titles(self.student, 'titration'), [])
+        self.assertEqual(self.titles(self.physics.teacher.user, 'titration'), ['Titration lab'])
+        self.assertEqual(self.titles(make_student('outsider'), 'pendulum'), [])
+        self.assertEqual(self.titles(self.student, '"* OR ('), [])
+
+    def test_signals_keep_the_index_in_sync(self):
+        self.lab.title = 'Spring lab'
+        self.lab.save()
+        self.assertEqual(self.titles(self.student, 'spring'), ['Spring lab'])
+        self.notice.delete()
+        self.assertEqual(self.titles(self.student, 'goggles'), [])
+        self.chemistry.delete()
+        self.assertFalse(SearchDocument.objects.filter(room_id=self.chemistry.id).exists())
+
+    def test_rebuild_and_room_list(self):
+        Activity.objects.bulk_create([Activity(room=self.chemistry, title='Buffer solutions', total_marks=10)])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 6 documents', out.getvalue())
+        self.assertEqual(self.titles(self.physics.teacher.user, 'buffer'), ['Buffer solutions'])
+
+        self.client.force_login(self.physics.teacher.user)
+        response = self.client.get(reverse('all_room'), {'q': 'buffer'})
+        self.assertEqual([room.name for room in response.context['rooms']], ['Chemistry'])
+        results = self.client.get(reverse('room_search'), {'q': 'lab', 'kind': 'activity'}).json()['results']
+        self.assertEqual({result['title'] for result in results}, {'Pendulum lab', 'Titration lab'})
+
+    def test_room_list_matches_codes_and_every_room(self):
+        Activity.objects.bulk_create([
+            Activity(room=self.physics, title=f'Wave drill {i}', total_marks=10) for i in range(250)
+        ])
+        call_command('rebuild_search_index', stdout=StringIO())
+        Activity.objects.create(room=self.chemistry, title='Wave equations', total_marks=10)
+
+        self.client.force_login(self.physics.teacher.user)
+        response = self.client.get(reverse('all_room'), {'q': 'wave'})
+        self.assertCountEqual([room.name for room in response.context['rooms']], ['Physics', 'Chemistry'])
+        response = self.client.get(reverse('all_room'), {'q': self.chemistry.room_code[1:4]})
+        self.assertIn('Chemistry', [room.name for room in response.context['rooms']])
+
+
+class SearchIndexMigrationTests(TransactionTestCase):
+    migrate_from = [('room', '0017_searchdocument')]
+    migrate_to = [('room', '0018_backfill_searchdocument')]
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def test_existing_rows_are_indexed(self):
+        cache.clear()
+        teacher = make_teacher()
+        room = Room.objects.create(name='Physics', teacher=teacher.teacher)
+        Activity.objects.create(room=room, title='Pendulum lab', total_marks=10)
+        Announcement.objects.create(room=room, title='Lab safety', content='Bring goggles')
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.assertFalse(SearchDocument.objects.exists())
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+
+        self.assertEqual(SearchDocument.objects.count(), 3)
+        self.assertEqual([document.title for document in search(teacher, 'goggles')], ['Lab safety'])
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), "set RUN_BENCHMARKS=1 to run benchmarks")
+class SearchBenchmark(TestCase):
+    documents = 100000
+    rooms = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        # a Zipf-distributed vocabulary, like real text, plus a stop word in every document
+        random = Random(24)
+        cls.vocabulary = [f'{a}{b}{c}' for a in ('ka', 'lo', 'mi', 'ne', 'po', 'ru', 'si', 'ta', 'vu', 'ze')
+                          for b in ('ber', 'cal', 'dor', 'fen', 'gil', 'hum', 'jor', 'kes', 'lin', 'mor')
+                          for c in ('ate', 'ion', 'ics', 'ent', 'ure', 'ism', 'ity', 'ous', 'ive', 'al')]
+        weights = [1 / rank for rank in range(1, len(cls.vocabulary) + 1)]
+
+        def text(words):
+            return 'the ' + ' '.join(random.choices(cls.vocabulary, weights, k=words))
+
+        teacher = make_teacher()
+        cls.student = make_student('reader')
+        rooms = [Room.objects.create(name=f'Room {i}', teacher=teacher.teacher) for i in range(cls.rooms)]
+        for room in rooms[:5]:
+            room.students.add(cls.student)
+        cls.visible = {room.id for room in rooms[:5]}
+        SearchDocument.objects.bulk_create([
+            SearchDocument(kind='activity', object_id=i, room=rooms[i % cls.rooms], title=text(4), body=text(30))
+            for i in range(cls.documents)
+        ], batch_size=5000)
+
+    def test_search_benchmark(self):
+        cache.clear()
+        queries = [f'the {word}' for word in self.vocabulary[20:220:20]] + [self.vocabulary[40][:5]]
+        search(self.student, queries[0])
+        timings = []
+        for q in queries:
+            started = time.perf_counter()
+            results = search(self.student, q)
+            timings.append(time.perf_counter() - started)
+            self.assertTrue(results)
+            self.assertTrue({document.room_id for document in results} <= self.visible)
+        timings.sort()
+        median = timings[len(timings) // 2]
+        print(f"\nsearch over {self.documents} documents: median {median * 1000:.1f}ms, worst {timings[-1] * 1000:.1f}ms")
+        self.assertLess(median, 0.02)
@@ -20,13 +20,25 @@ urlpatterns = [
 
     path('activity/submit/', views.submit_activity, name='submit_activity'),
     path('activity/grade/', views.grade_submission, name='grade_submission'),
+    path('activity/uploads/', views.start_chunked_upload, name='start_chunked_upload'),
+    path('activity/uploads/<uuid:upload_id>/', views.chunked_upload_status, name='chunked_upload_status'),
+    path('activity/uploads/<uuid:upload_id>/chunks/<int:index>/', views.upload_chunk, name='upload_chunk'),
+    path('activity/uploads/<uuid:upload_id>/finalize/', views.finalize_chunked_upload, name='finalize_chunked_upload'),
+    path('activity/<int:activity_id>/submissions/download/', views.download_activity_submissions, name='download_activity_submissions'),
 
     path('export/grades/<int:room_id>/', views.export_grades, name='export_grades'),
+    path('export/jobs/', views.start_export_job, name='start_export_job'),
+    path('export/jobs/<int:job_id>/', views.export_job_status, name='export_job_status'),
+    path('export/jobs/<int:job_id>/download/', views.download_export_job, name='download_export_job'),
 
     path('files/activity/<int:activity_id>/', views.serve_activity_resource, name='serve_activity_resource'),
     path('files/submission/<int:submission_id>/', views.serve_submission_file, name='serve_submission_file'),
 
+    path('search/', views.search_view, name='room_search'),
+
     path('notifications/', views.notifications_view, name='notifications'),
+    path('notifications/feed/', views.notifications_feed, name='notifications_feed'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
     path('notifications/mark-read/<int:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
     path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
     path('notifications/clear-all/', views.clear_all_notifications, name='clear_all_notifications'),
@@ -0,0 +1,68 @@
+import io
+import os
+import zipfile
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """
+        write-only sink for zipfile; it never seeks, so entries get data descriptors
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def unique_arcname(name, used_names):
+    """
+        flattens path separators and numbers repeats: "a.pdf", "a (2).pdf"
+    """
+    name = name.replace('/', '-').replace('\\', '-')
+    base, extension = os.path.splitext(name)
+    counter = 1
+    while name in used_names:
+        counter += 1
+        name = f'{base} ({counter}){extension}'
+    used_names.add(name)
+    return name
+
+
+def stream_zip(entries, chunk_size=64 * 1024):
+    """
+        yields a ZIP archive chunk by chunk from (arcname, opener, date_time) entries,
+        where opener() returns a binary file; entries are stored, not recompressed
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, opener, date_time in entries:
+            info = zipfile.ZipInfo(arcname, date_time=date_time)
+            info.compress_type = zipfile.ZIP_STORED
+            with opener() as source, archive.open(info, 'w', force_zip64=True) as target:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = buffer.pop()
+                    if data:
+                        yield data
+            data = buffer.pop()
+            if data:
+                yield data
+    yield buffer.pop()
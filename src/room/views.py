@@ -1,30 +1,45 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, Http404, FileResponse
+from django.http import HttpResponse, Http404, FileResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
+from django.utils.http import content_disposition_header, urlencode
 from datetime import timezone as dt_timezone, timedelta
+from django.db import transaction
 from django.db.models import Q
 from django.template.loader import render_to_string
 from django.conf import settings
-import mimetypes
-import openpyxl
-from openpyxl.utils import get_column_letter
+import os
 
-from .models import Room, Activity, Submission, Notification, Announcement
+from .models import Room, Activity, Submission, Notification, NotificationEvent, Announcement, ExportJob, ChunkedUpload
 from user.models import StudentProfile, TeacherProfile
+from core.delivery import serve_image
 from .notifications import notify_student_enrolled, notify_student_left, notify_student_submission, notify_activity_graded, notify_new_activity
 
 from .utils.grades import calculate_grade
+from .gradebook import build_students_with_grades, refresh_standing
+from .fragments import get_room_fragments
+from .inbox import get_unread_count, record_read, record_cleared
+from .fanout import queue_room_notifications
+from .live import notification_payload, stream_notifications
+from .feed import notification_page, parse_filters
+from .search import matching_room_ids, search
+from .access import can_read_room, can_read_activity, can_read_submission, can_teach_room, is_enrolled, get_room_access
+from .exports import XLSX_CONTENT_TYPE, CONTENT_TYPES
+from .submission_archive import ARCHIVE_FILTERS, archive_submissions, record_archive_download, stream_submission_archive, submission_archive_filename
+from .chunked_uploads import ChunkError, AssembledUpload, write_chunk, missing_chunks, discard_chunks
+from .export_jobs import open_room_artifact, create_export_job, artifacts_available, artifact_path, stream_job_archive
 
 
 @login_required
 def room_view(request, room_id):
-    Activity.close_past_due_bulk()
     if request.user.is_authenticated:
-        room = get_object_or_404(Room, id=room_id)
+        room = get_object_or_404(Room.objects.select_related('teacher__user'), id=room_id)
+        if not can_read_room(request.user, room.id):
+            raise Http404("Room not found")
         
         breadcrumb_items = [
             {'text': 'Dashboard', 'url': '/dashboard/', 'icon': 'bi bi-house'},
@@ -34,122 +49,108 @@ def room_view(request, room_id):
         
         context = {
             'room': room,
-            'activities': Activity.objects.filter(room=room).order_by('-created_at'),
-            'announcements': Announcement.objects.filter(room=room).order_by('-created_at'),
             'breadcrumb_items': breadcrumb_items
         }
 
-        if hasattr(request.user, 'teacher'):
-            students_with_grades = []
-            for student in room.students.all():
-                try:
-                    student_profile = StudentProfile.objects.get(user=student)
-                    submissions = Submission.objects.filter(student=student_profile, activity__room=room)
-                    total_score = 0
-                    total_possible = 0
-                    
-                    for submission in submissions:
-                        if submission.score is not None:
-                            total_score += submission.score
-                            total_possible += submission.activity.total_marks
-                    
-                    overall_percent, overall_grade = calculate_grade(total_score, total_possible, base_passing=room.base_passing)
-                    
-                    students_with_grades.append({
-                        'id': student.id,
-                        'student': student,
-                        'grade': overall_percent,
-                        'submissions_count': submissions.count(),
-                        'graded_submissions': submissions.filter(score__isnull=False).count()
-                    })
-                except StudentProfile.DoesNotExist:
-                    students_with_grades.append({
-                        'id': student.id,
-                        'student': student,
-                        'grade': 0,
-                        'submissions_count': 0,
-                        'graded_submissions': 0
-                    })
-            
-            students_content = render_to_string('room/components/student_list.html', {
-                'students_with_grades': students_with_grades,
-                'user_type': 'teacher'
-            })
-            
-            activities_content = render_to_string('room/components/activities_list.html', {
-                'activities': context['activities'],
-                'user_type': 'teacher'
-            })
-            
-            announcements_content = render_to_string('room/components/announcements_list.html', {
-                'announcements': context['announcements'],
-                'user_type': 'teacher'
-            })
-            
-            context.update({
-                'students_with_grades': students_with_grades,
-                'students_content': students_content,
-                'activities_content': activities_content,
-                'announcements_content': announcements_content
-            })
+        if can_teach_room(request.user, room.id):
+            context.update(get_room_fragments(room, 'teacher', lambda: build_teacher_room_fragments(room)))
             return render(request, 'room/teacher.html', context)
         
-        elif hasattr(request.user, 'student'):
-            try:
-                student_profile = StudentProfile.objects.get(user=request.user)
-            except StudentProfile.DoesNotExist:
-                student_profile = None
-
-            activities = context['activities']
-            submissions = []
-            if student_profile:
-                submissions = list(Submission.objects.filter(activity__in=activities, student=student_profile))
-            submissions_by_activity = {s.activity_id: s for s in submissions}
-
-            pending_count = 0
-            scored_sum = 0
-            possible_sum = 0
-            for activity in activities:
-                submission = submissions_by_activity.get(activity.id)
-                if submission is None or submission.score is None:
-                    pending_count += 1
-                if submission is not None and submission.score is not None:
-                    scored_sum += int(submission.score)
-                    possible_sum += int(activity.total_marks or 0)
-
-            overall_percent, overall_grade = calculate_grade(scored_sum, possible_sum, base_passing=room.base_passing)
-
-            students_with_grades = [{
-                'student': request.user,
-                'grade': overall_percent,
-                'submissions_count': len(submissions),
-                'graded_submissions': len([s for s in submissions if s.score is not None])
-            }]
-
-            activities_content = render_to_string('room/components/activities_list.html', {
-                'activities': context['activities'],
-                'user_type': 'student',
-                'submissions_by_activity': submissions_by_activity
-            })
-            
-            announcements_content = render_to_string('room/components/announcements_list.html', {
-                'announcements': context['announcements'],
-                'user_type': 'student'
-            })
-
-            context.update({
-                'student_pending_activities': pending_count,
-                'student_overall_percent': overall_percent,
-                'students_with_grades': students_with_grades,
-                'activities_content': activities_content,
-                'announcements_content': announcements_content,
-                'submissions_by_activity': submissions_by_activity,
-            })
-
+        else:
+            context.update(get_room_fragments(
+                room, 'student', lambda: build_student_room_fragments(room, request.user), student=request.user
+            ))
             return render(request, 'room/student.html', context)
         
     return redirect('home')
 
+
+def get_room_activities(room):
+    """
+        past-due activities read as closed even before the due-date closer reaches them
+    """
+    activities = list(Activity.objects.filter(room=room).order_by('-created_at'))
+    for activity in activities:
+        activity.close_if_past_due(save=False)
+    return activities
+
+
+def next_status_change(activities):
+    due_dates = [a.due_date for a in activities if a.due_date and a.status != 'closed']
+    return min(due_dates) if due_dates else None
+
+
+def build_teacher_room_fragments(room):
+    activities = get_room_activities(room)
+    announcements = list(Announcement.objects.filter(room=room).order_by('-created_at'))
+    students_with_grades = build_students_with_grades(room)
+
+    students_content = render_to_string('room/components/student_list.html', {
+        'students_with_grades': students_with_grades,
+        'room': room,
+        'user_type': 'teacher'
+    })
+    
+    activities_content = render_to_string('room/components/activities_list.html', {
+        'activities': activities,
+        'user_type': 'teacher'
+    })
+    
+    announcements_content = render_to_string('room/components/announcements_list.html', {
+        'announcements': announcements,
+        'user_type': 'teacher'
+    })
+
+    return {
+        'valid_until': next_status_change(activities),
+        'student_count': len(students_with_grades),
+        'activity_count': len(activities),
+        'announcement_count': len(announcements),
+        'students_content': students_content,
+        'activities_content': activities_content,
+        'announcements_content': announcements_content
+    }
+
+
+def build_student_room_fragments(room, user):
+    activities = get_room_activities(room)
+    announcements = list(Announcement.objects.filter(room=room).order_by('-created_at'))
+
+    submissions = list(Submission.objects.filter(activity__room=room, student__user=user))
+    submissions_by_activity = {s.activity_id: s for s in submissions}
+
+    pending_count = 0
+    scored_sum = 0
+    possible_sum = 0
+    for activity in activities:
+        submission = submissions_by_activity.get(activity.id)
+        if submission is None or submission.score is None:
+            pending_count += 1
+        if submission is not None and submission.score is not None:
+            scored_sum += int(submission.score)
+            possible_sum += int(activity.total_marks or 0)
+
+    overall_percent, overall_grade = calculate_grade(scored_sum, possible_sum, base_passing=room.base_passing)
+
+    activities_content = render_to_string('room/components/activities_list.html', {
+        'activities': activities,
+        'user_type': 'student',
+        'submissions_by_activity': submissions_by_activity
+    })
+    
+    announcements_content = render_to_string('room/components/announcements_list.html', {
+        'announcements': announcements,
+        'user_type': 'student'
+    })
+
+    return {
+        'valid_until': next_status_change(activities),
+        'student_pending_activities': pending_count,
+        'student_overall_percent': overall_percent,
+        'activities_content': activities_content,
+        'announcements_content': announcements_content,
+    }
+
 @login_required
 def view_all_room(request):
     if request.user.is_authenticated:
@@ -163,8 +164,8 @@ def view_all_room(request):
             return redirect('role_selection')
         
         if q:
-            from django.db.models import Q
-            room = room.filter(Q(name__icontains=q) | Q(room_code__icontains=q))
+            # a room matches on its name or code, or on the text of any of its activities and announcements
+            room = room.filter(Q(name__icontains=q) | Q(room_code__icontains=q) | Q(id__in=matching_room_ids(request.user, q)))
 
         breadcrumb_items = [
             {'text': 'Dashboard', 'url': '/dashboard/', 'icon': 'bi bi-house'},
@@ -187,8 +188,9 @@ def enroll_student(request):
         room = Room.objects.filter(room_code=room_code.strip()).first()
 
         if room and hasattr(request.user, 'student'):
-            room.students.add(request.user)
-            room.save()
+            with transaction.atomic():
+                room.students.add(request.user)
+                room.save()
             notify_student_enrolled(room, request.user)
             messages.success(request, f"You have successfully enrolled in {room.name}.")
             return redirect('room', room_id=room.id)
@@ -199,7 +201,9 @@ def enroll_student(request):
 
 @login_required
 def activity_view(request, activity_id):
-    activity = get_object_or_404(Activity, id=activity_id)
+    activity = get_object_or_404(Activity.objects.select_related('room'), id=activity_id)
+    if not can_read_activity(request.user, activity):
+        raise Http404("Activity not found")
     room = activity.room
     breadcrumb_items = [
         {'text': 'Dashboard', 'url': '/dashboard/', 'icon': 'bi bi-house'},
@@ -208,9 +212,7 @@ def activity_view(request, activity_id):
         {'text': 'Activity', 'url': '', 'icon': 'bi bi-journal-text'},
     ]
 
-    if activity.due_date and activity.due_date < timezone.now() and activity.status != 'closed':
-        activity.status = 'closed'
-        activity.save(update_fields=['status'])
+    activity.close_if_past_due(save=False)
 
     context = {
         'breadcrumb_items': breadcrumb_items,
@@ -218,23 +220,19 @@ def activity_view(request, activity_id):
         'activity': activity,
     }
 
-    if hasattr(request.user, 'student'):
-        try:
-            student = StudentProfile.objects.get(user=request.user)
-            submission = Submission.objects.get(activity=activity, student=student)
-            context['submission'] = submission
-        except Submission.DoesNotExist:
-            context['submission'] = None
-        return render(request, 'activity/student.html', context)
-    elif hasattr(request.user, 'teacher'):
+    if can_teach_room(request.user, room.id):
         submissions = Submission.objects.filter(activity=activity)
         context['submissions'] = submissions
         return render(request, 'activity/teacher.html', context)
-    return redirect('all_room')
+
+    context['submission'] = Submission.objects.filter(activity=activity, student__user=request.user).first()
+    return render(request, 'activity/student.html', context)
 
 @login_required
 def announcement_view(request, announcement_id):
-    announcement = get_object_or_404(Announcement, id=announcement_id)
+    announcement = get_object_or_404(Announcement.objects.select_related('room'), id=announcement_id)
+    if not can_read_room(request.user, announcement.room_id):
+        raise Http404("Announcement not found")
     room = announcement.room
     breadcrumb_items = [
         {'text': 'Dashboard', 'url': '/dashboard/', 'icon': 'bi bi-house'},
@@ -271,10 +269,8 @@ def create_room(request):
 
 @login_required
 def delete_room(request, room_id):
-    if request.user.is_authenticated and hasattr(request.user, 'teacher'):
-        room = Room.objects.get(id=room_id)
-        if room.teacher.user == request.user:
-            room.delete()
+    if can_teach_room(request.user, room_id):
+        get_object_or_404(Room, id=room_id).delete()
     return redirect('all_room')
 
 @login_required
@@ -287,7 +283,9 @@ def create_activity(request):
         total_marks = request.POST.get('total_points')
         resource_file = request.FILES.get('resource')
 
-        room = Room.objects.get(id=room_id)
+        if not can_teach_room(request.user, room_id):
+            return redirect('all_room')
+        room = get_object_or_404(Room, id=room_id)
 
         due_date_value = None
         if due_date_input:
@@ -327,7 +325,9 @@ def create_announcement(request):
             content = request.POST.get('content')
             room_id = request.POST.get('room_id')
 
-            room = Room.objects.get(id=room_id)
+            if not can_teach_room(request.user, room_id):
+                return redirect('all_room')
+            room = get_object_or_404(Room, id=room_id)
 
             announcement = Announcement.objects.create(
                 title=title,
@@ -336,19 +336,58 @@ def create_announcement(request):
             )
             announcement.save()
             
-            from .notifications import create_student_notifications
-            create_student_notifications(
-                students=room.students.all(),
+            queue_room_notifications(
+                room=room,
                 notification_type='new_announcement',
                 title=f'New Announcement: {title}',
-                message=f'A new announcement has been posted in {room.name}',
-                room=room
+                message=f'A new announcement has been posted in {room.name}'
             )
             
             return redirect('room', room_id=room.id)
 
     return redirect('all_room')
 
+def activity_accepts_submissions(activity, started_at=None):
+    """
+        started_at lets an upload that began before the deadline finish within CHUNKED_UPLOAD_GRACE seconds after it
+    """
+    now = timezone.now()
+    if activity.due_date and activity.due_date <= (started_at or now):
+        return False
+    if activity.due_date and activity.due_date + timedelta(seconds=settings.CHUNKED_UPLOAD_GRACE) <= now:
+        return False
+    if activity.status == 'closed':
+        # the closer marks activities closed once they are past due, which a late finisher is exempt from
+        return started_at is not None and activity.due_date is not None and activity.due_date <= now
+    return True
+
+
+def attach_submission_file(activity, user, student, submission_file):
+    with transaction.atomic():
+        submission, created = Submission.objects.get_or_create(
+            activity=activity,
+            student=student,
+            defaults={'submission_file': submission_file}
+        )
+
+        if not created:
+            if submission.submission_file:
+                submission.submission_file.delete(save=False)
+            submission.submission_file = submission_file
+            submission.submitted_at = timezone.now()
+            submission.save()
+
+        if activity.status != 'closed':
+            submission.status = 'submitted'
+            submission.save()
+
+        refresh_standing(activity.room, user)
+
+    if activity.status != 'closed':
+        notify_student_submission(submission)
+    return submission
+
+
 @login_required
 def submit_activity(request):
     if request.method == 'POST':
@@ -360,44 +399,129 @@ def submit_activity(request):
                 activity = get_object_or_404(Activity, id=activity_id)
                 student = get_object_or_404(StudentProfile, user=request.user)
 
-                if (activity.due_date and activity.due_date <= timezone.now()) or activity.status == 'closed':
+                if not is_enrolled(request.user, activity.room_id) or not activity_accepts_submissions(activity):
                     return redirect('activity_view', activity_id=activity_id)
 
-                submission, created = Submission.objects.get_or_create(
-                    activity=activity,
-                    student=student,
-                    defaults={'submission_file': submission_file}
-                )
-
-                if not created:
-                    if submission.submission_file:
-                        submission.submission_file.delete(save=False)
-                    submission.submission_file = submission_file
-                    submission.save()
-
-                if activity.status != 'closed':
-                    submission.status = 'submitted'
-                    submission.save()
-                    
-                    notify_student_submission(submission)
+                attach_submission_file(activity, request.user, student, submission_file)
                 
                 return redirect('activity_view', activity_id=activity_id)
 
     return redirect('all_room')
 
+def chunked_upload_payload(upload):
+    payload = {
+        'upload_id': str(upload.id),
+        'status': upload.status,
+        'filename': upload.filename,
+        'chunk_size': upload.chunk_size,
+        'total_chunks': upload.total_chunks,
+        'status_url': reverse('chunked_upload_status', kwargs={'upload_id': upload.id}),
+        'finalize_url': reverse('finalize_chunked_upload', kwargs={'upload_id': upload.id}),
+    }
+    if upload.status == 'complete':
+        payload['redirect_url'] = reverse('activity_view', kwargs={'activity_id': upload.activity_id})
+    else:
+        payload['missing'] = missing_chunks(upload)
+    return payload
+
+
+@login_required
+def start_chunked_upload(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': "Use POST to start an upload."}, status=405)
+    if not hasattr(request.user, 'student'):
+        return JsonResponse({'error': "Only students can submit work."}, status=403)
+
+    activity = get_object_or_404(Activity, id=request.POST.get('activity_id'))
+    if not is_enrolled(request.user, activity.room_id):
+        raise Http404("Activity not found")
+    if not activity_accepts_submissions(activity):
+        return JsonResponse({'error': "This activity is closed for submissions."}, status=409)
+
+    filename = os.path.basename(request.POST.get('filename', '').replace('\\', '/'))
+    try:
+        total_size = int(request.POST.get('size', ''))
+    except ValueError:
+        total_size = -1
+    if not filename or total_size <= 0:
+        return JsonResponse({'error': "A file name and size are required."}, status=400)
+    if total_size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+        return JsonResponse({'error': "This file is too large."}, status=413)
+
+    upload = ChunkedUpload.objects.create(
+        user=request.user,
+        activity=activity,
+        filename=filename[:255],
+        total_size=total_size,
+        chunk_size=settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+    )
+    return JsonResponse(chunked_upload_payload(upload), status=201)
+
+
+@login_required
+def chunked_upload_status(request, upload_id):
+    upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user)
+    return JsonResponse(chunked_upload_payload(upload))
+
+
+@login_required
+def upload_chunk(request, upload_id, index):
+    if request.method != 'PUT':
+        return JsonResponse({'error': "Use PUT to send a chunk."}, status=405)
+    upload = get_object_or_404(
+        ChunkedUpload.objects.select_related('activity'), id=upload_id, user=request.user, status='uploading'
+    )
+    if not activity_accepts_submissions(upload.activity, started_at=upload.created_at):
+        return JsonResponse({'error': "This activity is closed for submissions.", 'index': index}, status=409)
+
+    try:
+        write_chunk(upload, index, request, request.headers.get('X-Chunk-SHA256'))
+    except ChunkError as error:
+        return JsonResponse({'error': str(error), 'index': index}, status=error.status)
+    return JsonResponse({'index': index, 'received': True})
+
+
+@login_required
+def finalize_chunked_upload(request, upload_id):
+    if request.method != 'POST':
+        return JsonResponse({'error': "Use POST to finish an upload."}, status=405)
+    upload = get_object_or_404(ChunkedUpload.objects.select_related('activity'), id=upload_id, user=request.user)
+    if upload.status == 'complete':
+        return JsonResponse(chunked_upload_payload(upload))
+
+    missing = missing_chunks(upload)
+    if missing:
+        return JsonResponse({'error': "Some chunks have not arrived yet.", 'missing': missing}, status=409)
+
+    activity = upload.activity
+    if not is_enrolled(request.user, activity.room_id):
+        raise Http404("Activity not found")
+    if not activity_accepts_submissions(activity, started_at=upload.created_at):
+        return JsonResponse({'error': "This activity is closed for submissions."}, status=409)
+
+    student = get_object_or_404(StudentProfile, user=request.user)
+    with transaction.atomic():
+        submission = attach_submission_file(activity, request.user, student, AssembledUpload(upload))
+        upload.status = 'complete'
+        upload.submission = submission
+        upload.save(update_fields=['status', 'submission', 'updated_at'])
+    discard_chunks(upload)
+    return JsonResponse(chunked_upload_payload(upload))
+
+
 @login_required
 def grade_submission(request):
     if request.method == 'POST':
-        if request.user.is_authenticated and hasattr(request.user, 'teacher'):
+        if request.user.is_authenticated:
             submission_id = request.POST.get('submission_id')
             score = request.POST.get('score')
             feedback = request.POST.get('feedback')
 
-            submission = get_object_or_404(Submission, id=submission_id)
+            submission = get_object_or_404(Submission.objects.select_related('activity__room', 'student'), id=submission_id)
             activity = submission.activity
             room = activity.room
 
-            if room.teacher.user == request.user:
+            if can_teach_room(request.user, room.id):
                 try:
                     score_value = int(score) if score else 0
                     max_score = activity.total_marks
@@ -409,10 +533,12 @@ def grade_submission(request):
                         messages.error(request, f"Score cannot exceed the maximum score of {max_score} points.")
                         return redirect('activity_view', activity_id=activity.id)
                     
-                    submission.score = score_value
-                    submission.feedback = feedback
-                    submission.status = 'graded'
-                    submission.save()
+                    with transaction.atomic():
+                        submission.score = score_value
+                        submission.feedback = feedback
+                        submission.status = 'graded'
+                        submission.save()
+                        refresh_standing(room, submission.student.user)
                     
                     notify_activity_graded(submission)
                     
@@ -426,27 +552,28 @@ def grade_submission(request):
 
 @login_required
 def leave_room(request, room_id):
-    if request.user.is_authenticated and hasattr(request.user, 'student'):
-        room = Room.objects.get(id=room_id)
-        room.students.remove(request.user)
-        room.save()
+    if is_enrolled(request.user, room_id):
+        room = get_object_or_404(Room, id=room_id)
+        with transaction.atomic():
+            room.students.remove(request.user)
+            room.save()
         notify_student_left(room, request.user)
-        return redirect('all_room')
-    return redirect('home')
+    return redirect('all_room')
 
 @login_required
 def unenroll_student(request):
     if request.method == 'POST':
-        if hasattr(request.user, 'teacher'):
-            room_id = request.POST.get('room_id')
+        room_id = request.POST.get('room_id')
+        if can_teach_room(request.user, room_id):
             student_id = request.POST.get('student_id')
 
-            room = Room.objects.get(id=room_id)
+            room = get_object_or_404(Room, id=room_id)
             student = User.objects.get(id=student_id)
 
-            if student in room.students.all():
-                room.students.remove(student)
-                room.save()
+            if Room.students.through.objects.filter(room_id=room.id, user_id=student.id).exists():
+                with transaction.atomic():
+                    room.students.remove(student)
+                    room.save()
                 notify_student_left(room, student)
                 messages.success(request, f"Student {student.username} has been unenrolled from the room.")
                 return redirect('room', room_id=room.id)
@@ -457,171 +584,150 @@ def unenroll_student(request):
 
 @login_required
 def export_grades(request, room_id):
-    if not hasattr(request.user, 'teacher'):
-        messages.error(request, "Only teachers can export grades.")
+    if not can_teach_room(request.user, room_id):
+        if not Room.objects.filter(id=room_id).exists():
+            raise Http404("Room not found")
+        messages.error(request, "You had no access to export grades from this room!")
         return redirect('all_room')
 
-    try:
-        room = Room.objects.get(id=room_id)
-    except Room.DoesNotExist:
-        raise Http404("Room not found")
+    room = get_object_or_404(Room, id=room_id)
 
-    if room.teacher.user != request.user:
-        messages.error(request, "You had no access to export grades from this room!")
-        return redirect('all_room')
+    artifact, fileobj = open_room_artifact(room, 'xlsx')
+    return FileResponse(
+        fileobj,
+        as_attachment=True,
+        filename=artifact.filename,
+        content_type=XLSX_CONTENT_TYPE
+    )
 
-    work_book = openpyxl.Workbook()
-    work_sheet = work_book.active
-    work_sheet.title = room.name.title()
-
-    headers = [
-        'Student ID',
-        'Last Name',
-        'First Name',
-        'Middle Name',
-        'Course',
-        'Year Level',
-        'Subject',
-    ]
-    for activity in room.activities.all():
-        headers.append(activity.title)
-    headers += ['Total Score', 'Max Score', 'Average %']
-
-    work_sheet.append(headers)
-
-    for user in sorted(room.students.all(), key=lambda user: (user.last_name.lower(), user.first_name.lower())):
-        student = user.student
-        row = [
-            student.student_id,
-            user.last_name,
-            user.first_name,
-            student.middle_name if student.middle_name else '-',
-            student.course,
-            student.year_level.split(' ')[0],
-            room.name,
-        ]
 
-        total_score = 0
-        max_score = 0
-
-        for activity in room.activities.all():
-            submission = Submission.objects.filter(activity=activity, student=student).first()
-            score = submission.score if submission else 0
-            row.append(score if score != 0 else "-")
-
-            total_score += score
-            max_score += activity.total_marks
-
-        row.append(total_score)
-        row.append(max_score)
-        average_percent = (total_score / max_score * 100) if max_score > 0 else 0
-        row.append(round(average_percent, 2))
-
-        work_sheet.append(row)
-
-    for col in work_sheet.columns:
-        max_length = 0
-        column = col[0].column
-        for cell in col:
-            try:
-                if cell.value:
-                    cell_length = len(str(cell.value))
-                    if cell_length > max_length:
-                        max_length = cell_length
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        work_sheet.column_dimensions[get_column_letter(column)].width = adjusted_width
-
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+def export_job_payload(job):
+    return {
+        'id': job.id,
+        'status': job.status,
+        'format': job.file_format,
+        'rooms_total': job.rooms_total,
+        'rooms_done': job.rooms_done,
+        'progress': job.progress(),
+        'error': job.error,
+        'status_url': reverse('export_job_status', kwargs={'job_id': job.id}),
+        'download_url': reverse('download_export_job', kwargs={'job_id': job.id}) if job.status == 'done' else None,
+    }
+
+
+@login_required
+def start_export_job(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': "Use POST to start an export."}, status=405)
+    if not hasattr(request.user, 'teacher'):
+        return JsonResponse({'error': "Only teachers can export grades."}, status=403)
+
+    file_format = request.POST.get('format', 'xlsx')
+    if file_format not in CONTENT_TYPES:
+        return JsonResponse({'error': "Unsupported export format."}, status=400)
+
+    rooms = Room.objects.filter(id__in=request.POST.getlist('room_ids'), teacher__user=request.user)
+    if not rooms.exists():
+        return JsonResponse({'error': "Select at least one of your rooms to export."}, status=400)
+
+    job = create_export_job(request.user, rooms, file_format)
+    return JsonResponse(export_job_payload(job), status=202)
+
+
+@login_required
+def export_job_status(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, requested_by=request.user)
+    return JsonResponse(export_job_payload(job))
+
+
+@login_required
+def download_export_job(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, requested_by=request.user)
+    if job.status != 'done':
+        return JsonResponse(export_job_payload(job), status=409)
+    if not artifacts_available(job):
+        raise Http404("This export has expired, please export again")
+
+    if len(job.artifacts) == 1:
+        artifact = job.artifacts[0]
+        return FileResponse(
+            open(artifact_path(artifact), 'rb'),
+            as_attachment=True,
+            filename=artifact['filename'],
+            content_type=CONTENT_TYPES[job.file_format]
+        )
+
+    response = StreamingHttpResponse(stream_job_archive(job), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="grades-export-{job.id}.zip"'
+    return response
+
+
+@login_required
+def download_activity_submissions(request, activity_id):
+    activity = get_object_or_404(Activity.objects.select_related('room'), id=activity_id)
+    if not can_teach_room(request.user, activity.room_id):
+        raise Http404("Activity not found")
+
+    archive_filter = request.GET.get('filter', 'all')
+    if archive_filter not in ARCHIVE_FILTERS:
+        return HttpResponse("Unknown filter", status=400)
+
+    started_at = timezone.now()
+    submissions = archive_submissions(activity, request.user, archive_filter)
+    archive = stream_submission_archive(
+        submissions, on_complete=lambda: record_archive_download(activity, request.user, started_at)
     )
-    response["Content-Disposition"] = f'attachment; filename="{room.name.upper()} - grades.xlsx"'
-    work_book.save(response)
 
+    response = StreamingHttpResponse(archive, content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(
+        True, submission_archive_filename(activity, archive_filter)
+    )
     return response
 
 
 @login_required
 def serve_activity_resource(request, activity_id):
     activity = get_object_or_404(Activity, id=activity_id)
-    
-    if hasattr(request.user, 'teacher'):
-        if activity.room.teacher.user != request.user:
-            raise Http404("File not found")
-    elif hasattr(request.user, 'student'):
-        if request.user not in activity.room.students.all():
-            raise Http404("File not found")
-    else:
+    if not can_read_activity(request.user, activity):
         raise Http404("File not found")
     
     if not activity.resource_file:
         raise Http404("No resource file available")
     
-    try:
-        file_path = activity.resource_file.path
-        
-        content_type, _ = mimetypes.guess_type(file_path)
-        if content_type is None:
-            content_type = 'application/octet-stream'
-        
-        response = FileResponse(
-            open(file_path, 'rb'),
-            content_type=content_type
-        )
-        
-        filename = activity.get_resource_filename()
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-        
-        return response
-    except FileNotFoundError:
-        raise Http404("File not found")
+    return serve_image(
+        request, activity.resource_file.name, activity.get_resource_filename(), storage=activity.resource_file.storage
+    )
 
 
 @login_required
 def serve_submission_file(request, submission_id):
-    submission = get_object_or_404(Submission, id=submission_id)
-    
-    if hasattr(request.user, 'teacher'):
-        if submission.activity.room.teacher.user != request.user:
-            raise Http404("File not found")
-    elif hasattr(request.user, 'student'):
-        if submission.student.user != request.user:
-            raise Http404("File not found")
-    else:
+    submission = get_object_or_404(Submission.objects.select_related('activity', 'student'), id=submission_id)
+    if not can_read_submission(request.user, submission):
         raise Http404("File not found")
     
     if not submission.submission_file:
         raise Http404("No submission file available")
     
-    try:
-        file_path = submission.submission_file.path
-        
-        content_type, _ = mimetypes.guess_type(file_path)
-        if content_type is None:
-            content_type = 'application/octet-stream'
-        
-        response = FileResponse(
-            open(file_path, 'rb'),
-            content_type=content_type
-        )
-        
-        filename = submission.get_submission_filename()
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-        
-        return response
-    except FileNotFoundError:
-        raise Http404("File not found")
+    return serve_image(
+        request, submission.submission_file.name, submission.get_submission_filename(),
+        storage=submission.submission_file.storage
+    )
 
 
 @login_required
 def notifications_view(request):
-    notifications = Notification.objects.filter(recipient=request.user)
-    unread_count = notifications.filter(is_read=False).count()
+    filters = parse_filters(request.GET)
+    page = notification_page(request.user, request.GET.get('cursor'), filters)
+    access = get_room_access(request.user)
     
     context = {
-        'notifications': notifications,
-        'unread_count': unread_count,
+        'notifications': page.notifications,
+        'next_cursor': page.next_cursor,
+        'unread_count': get_unread_count(request.user.id),
+        'filters': filters,
+        'filter_query': urlencode(filters),
+        'notification_types': NotificationEvent.NOTIFICATION_TYPES,
+        'filter_rooms': Room.objects.filter(id__in=access.taught | access.enrolled).only('id', 'name').order_by('name'),
         'breadcrumb_items': [
             {'text': 'Dashboard', 'url': '/dashboard/', 'icon': 'bi bi-house'},
             {'text': 'Notifications', 'url': '', 'icon': 'bi bi-bell'}
@@ -630,12 +736,69 @@ def notifications_view(request):
     return render(request, 'notifications.html', context)
 
 
+@login_required
+def notifications_feed(request):
+    page = notification_page(request.user, request.GET.get('cursor'), parse_filters(request.GET))
+    results = []
+    for notification in page.notifications:
+        payload = notification_payload(notification)
+        payload.update({
+            'type': notification.notification_type,
+            'room_id': notification.event.room_id,
+            'activity_id': notification.event.activity_id,
+        })
+        results.append(payload)
+    return JsonResponse({
+        'results': results,
+        'next_cursor': page.next_cursor,
+        'html': render_to_string('components/notification_items.html', {'notifications': page.notifications}, request=request),
+    })
+
+
+@login_required
+def search_view(request):
+    results = search(request.user, request.GET.get('q'), kinds=request.GET.getlist('kind'))
+    return JsonResponse({
+        'results': [{
+            'kind': document.kind,
+            'id': document.object_id,
+            'title': document.title,
+            'room_id': document.room_id,
+            'room': document.room.name,
+            'url': document.get_url(),
+            'rank': document.rank,
+        } for document in results],
+    })
+
+
+async def notification_stream(request):
+    if not settings.NOTIFICATION_STREAM_ENABLED:
+        # an EventSource stops reconnecting on 204
+        return HttpResponse(status=204)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(stream_notifications(user.id, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def mark_notification_read(request, notification_id):
     try:
-        notification = Notification.objects.get(id=notification_id, recipient=request.user)
-        notification.is_read = True
-        notification.save()
+        notification = Notification.objects.select_related('event').get(id=notification_id, recipient=request.user)
+        if not notification.is_read:
+            notification.is_read = True
+            notification.save()
+            record_read(request.user.id, [notification.id])
         
         target_url = notification.get_url()
         if target_url and target_url != '/room/all/':
@@ -649,6 +812,7 @@ def mark_notification_read(request, notification_id):
 @login_required
 def mark_all_notifications_read(request):
     Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+    record_read(request.user.id)
     messages.success(request, "All notifications marked as read.")
     return redirect('notifications')
 
@@ -658,5 +822,6 @@ def clear_all_notifications(request):
     if request.method == 'POST':
         count = Notification.objects.filter(recipient=request.user).count()
         Notification.objects.filter(recipient=request.user).delete()
+        record_cleared(request.user.id)
         messages.success(request, f"All {count} notifications have been cleared.")
     return redirect('notifications')
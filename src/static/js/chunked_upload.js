@@ -0,0 +1,93 @@
+async function sha256Hex(blob) {
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function sendChunk(upload, file, index, csrfToken) {
+    const start = index * upload.chunk_size;
+    const blob = file.slice(start, Math.min(start + upload.chunk_size, file.size));
+    const checksum = await sha256Hex(blob);
+
+    for (let attempt = 0; attempt < 5; attempt++) {
+        try {
+            const response = await fetch(`${upload.status_url}chunks/${index}/`, {
+                method: 'PUT',
+                headers: { 'X-CSRFToken': csrfToken, 'X-Chunk-SHA256': checksum },
+                body: blob,
+            });
+            if (response.ok) return;
+            if (response.status < 500 && response.status !== 422) {
+                throw new Error((await response.json()).error || 'Upload failed.');
+            }
+        } catch (error) {
+            if (attempt === 4 || !(error instanceof TypeError)) throw error;
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+    }
+    throw new Error('Upload failed, please try again.');
+}
+
+async function chunkedUpload(form, file, progressEl) {
+    const csrfToken = form.querySelector('[name=csrfmiddlewaretoken]').value;
+    const storageKey = `chunked-upload:${form.activity_id.value}:${file.name}:${file.size}:${file.lastModified}`;
+    let upload = null;
+
+    const savedStatusUrl = localStorage.getItem(storageKey);
+    if (savedStatusUrl) {
+        const response = await fetch(savedStatusUrl, { headers: { 'Accept': 'application/json' } });
+        if (response.ok) upload = await response.json();
+    }
+    if (!upload || upload.status !== 'uploading') {
+        const body = new FormData();
+        body.append('activity_id', form.activity_id.value);
+        body.append('filename', file.name);
+        body.append('size', file.size);
+        const response = await fetch(form.dataset.chunkedUpload, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': csrfToken },
+            body,
+        });
+        upload = await response.json();
+        if (!response.ok) throw new Error(upload.error || 'Could not start the upload.');
+        localStorage.setItem(storageKey, upload.status_url);
+    }
+
+    const missing = upload.missing;
+    let sent = upload.total_chunks - missing.length;
+    for (const index of missing) {
+        await sendChunk(upload, file, index, csrfToken);
+        sent += 1;
+        progressEl.textContent = `Uploading ${Math.round(sent / upload.total_chunks * 100)}%`;
+    }
+
+    progressEl.textContent = 'Finishing upload...';
+    const response = await fetch(upload.finalize_url, { method: 'POST', headers: { 'X-CSRFToken': csrfToken } });
+    const result = await response.json();
+    if (!response.ok) throw new Error(result.error || 'Could not finish the upload.');
+    localStorage.removeItem(storageKey);
+    return result;
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    if (!window.crypto || !crypto.subtle || !window.fetch) return;
+
+    document.querySelectorAll('form[data-chunked-upload]').forEach(form => {
+        form.addEventListener('submit', async function (e) {
+            const file = form.querySelector('input[type="file"]').files[0];
+            if (!file) return;
+            e.preventDefault();
+
+            const button = form.querySelector('button[type="submit"]');
+            const progressEl = form.querySelector('.chunked-upload-progress');
+            button.disabled = true;
+            try {
+                const result = await chunkedUpload(form, file, progressEl);
+                window.location.href = result.redirect_url;
+            } catch (error) {
+                button.disabled = false;
+                progressEl.textContent = '';
+                showToast('error', 'Error', error.message);
+            }
+        });
+    });
+});
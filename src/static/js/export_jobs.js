@@ -0,0 +1,53 @@
+function pollExportJob(statusUrl, progressEl, button) {
+    fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+        .then(response => response.json())
+        .then(job => {
+            progressEl.textContent = `${job.progress}% (${job.rooms_done}/${job.rooms_total} rooms)`;
+
+            if (job.status === 'done') {
+                button.disabled = false;
+                progressEl.textContent = 'Ready';
+                window.location.href = job.download_url;
+            } else if (job.status === 'failed') {
+                button.disabled = false;
+                progressEl.textContent = '';
+                showToast('error', 'Error', job.error || 'Export failed.');
+            } else {
+                setTimeout(() => pollExportJob(statusUrl, progressEl, button), 1000);
+            }
+        })
+        .catch(() => {
+            button.disabled = false;
+            showToast('error', 'Error', 'Could not check the export status.');
+        });
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const form = document.getElementById('exportJobForm');
+    if (!form) return;
+
+    form.addEventListener('submit', function (e) {
+        e.preventDefault();
+
+        const button = form.querySelector('button[type="submit"]');
+        const progressEl = document.getElementById('exportJobProgress');
+        button.disabled = true;
+        progressEl.textContent = 'Queued';
+
+        fetch(form.action, { method: 'POST', body: new FormData(form) })
+            .then(response => response.json().then(job => ({ ok: response.ok, job })))
+            .then(({ ok, job }) => {
+                if (!ok) {
+                    button.disabled = false;
+                    progressEl.textContent = '';
+                    showToast('error', 'Error', job.error || 'Export failed.');
+                    return;
+                }
+                pollExportJob(job.status_url, progressEl, button);
+            })
+            .catch(() => {
+                button.disabled = false;
+                showToast('error', 'Error', 'Could not start the export.');
+            });
+    });
+});
@@ -0,0 +1,28 @@
+document.addEventListener('DOMContentLoaded', () => {
+    const bell = document.querySelector('[data-notification-stream]');
+    if (!bell || !window.EventSource) return;
+
+    const badge = bell.querySelector('.notification-badge');
+    const countEl = bell.querySelector('.notification-count');
+
+    function escapeText(text) {
+        const el = document.createElement('div');
+        el.textContent = text;
+        return el.innerHTML;
+    }
+
+    function setCount(count) {
+        countEl.textContent = count;
+        badge.classList.toggle('d-none', count <= 0);
+    }
+
+    const source = new EventSource(bell.dataset.notificationStream);
+
+    source.addEventListener('unread', e => setCount(JSON.parse(e.data).count));
+
+    source.addEventListener('notification', e => {
+        const notification = JSON.parse(e.data);
+        if (!notification.is_read && notification.count === 1) setCount(parseInt(countEl.textContent, 10) + 1);
+        showToast('info', escapeText(notification.title), escapeText(notification.message));
+    });
+});
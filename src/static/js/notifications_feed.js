@@ -0,0 +1,43 @@
+document.addEventListener('DOMContentLoaded', () => {
+    const button = document.getElementById('loadMoreNotifications');
+    const list = document.getElementById('notificationList');
+    if (!button || !list) return;
+
+    let loading = false;
+
+    function loadMore() {
+        if (loading || !button.dataset.cursor) return;
+        loading = true;
+        button.classList.add('disabled');
+
+        const url = new URL(button.dataset.feedUrl, window.location.origin);
+        url.searchParams.set('cursor', button.dataset.cursor);
+        fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(page => {
+                list.insertAdjacentHTML('beforeend', page.html);
+                if (page.next_cursor) {
+                    button.dataset.cursor = page.next_cursor;
+                    button.classList.remove('disabled');
+                } else {
+                    button.remove();
+                    observer.disconnect();
+                }
+            })
+            .catch(() => {
+                button.classList.remove('disabled');
+                showToast('error', 'Error', 'Could not load more notifications.');
+            })
+            .finally(() => { loading = false; });
+    }
+
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) loadMore();
+    });
+    observer.observe(button);
+
+    button.addEventListener('click', e => {
+        e.preventDefault();
+        loadMore();
+    });
+});